@@ -0,0 +1,555 @@
+"""
+Pluggable data sources behind the sentiment and event-page endpoints.
+
+Every source implements the same async interface (DataSource):
+
+- MemoryDataSource reads the in-process EventStore and its indexes. It is
+  the default, and it answers inline because nothing in it blocks.
+- SQLiteDataSource and BigQueryDataSource run blocking client calls on a
+  bounded thread pool, so the event loop keeps serving other requests
+  while a query is in flight. All SQL is parameterised.
+- SegmentDataSource reads day-partitioned segment files (see segments),
+  memory-mapped, on the same kind of thread pool: page faults block too.
+
+The executor-backed sources coalesce identical in-flight queries
+(single-flight): when 50 dashboards open "dissatisfied" at once, the first
+request starts the query and the other 49 await its result.
+"""
+
+import asyncio
+import functools
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from bitmap_index import LABEL_FIELDS, LabelIndex, LabelQuery
+from event_store import TIMESTAMP_FORMAT, EventStore, SortKey, sort_key
+from segments import SegmentStore
+
+try:
+    from google.cloud import bigquery
+except ImportError:  # optional: only needed for ORACLE_DATA_SOURCE=bigquery
+    bigquery = None
+
+EVENT_COLUMNS = (
+    "event_timestamp",
+    "request_id",
+    "user_curr_message",
+    "agent_prev_message",
+    "user_intent",
+    "user_sentiment",
+)
+
+# Array columns a label filter may name. Column names cannot be query
+# parameters, so they are checked against this list before reaching SQL.
+_ARRAY_COLUMNS = frozenset(LABEL_FIELDS)
+
+DEFAULT_MAX_WORKERS = 8
+
+Page = Tuple[List[dict], Optional[SortKey]]
+
+
+class DataSource:
+    """Interface shared by every data source"""
+
+    kind = "abstract"
+
+    async def sentiment_counts(self) -> List[dict]:
+        """[{"sentiment", "count"}, ...] (plus "unique_users" when the source counts them), largest first"""
+        raise NotImplementedError
+
+    def has_sentiment(self, sentiment: str) -> bool:
+        """False only when the sentiment is known not to exist (drives 404s)"""
+        return True
+
+    async def events_page(
+        self,
+        sentiment: Optional[str] = None,
+        limit: int = 20,
+        before: Optional[SortKey] = None,
+        labels: Optional[LabelQuery] = None,
+        since: Optional[str] = None,
+    ) -> Page:
+        """
+        Newest `limit` events (for one sentiment, or all when None) strictly
+        below the `before` key, at or after `since` (a normalized timestamp)
+        and matching `labels`, plus the key to resume from (None on the last
+        page).
+        """
+        raise NotImplementedError
+
+    async def get_event(self, request_id: str) -> Optional[dict]:
+        """The full event with this request_id, or None"""
+        raise NotImplementedError
+
+    async def insert_many(self, events: List[dict]) -> int:
+        """Insert validated events, skipping known request_ids; returns how many were new"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"kind": self.kind}
+
+    def before_fork(self):
+        """Release what a forked worker must not inherit (prefork.py calls this in the parent)"""
+
+    def after_fork(self):
+        """Reopen, in a forked worker, what before_fork released"""
+
+    async def close(self):
+        pass
+
+
+class MemoryDataSource(DataSource):
+    """The in-process EventStore, with live sentiment counts and label bitmaps"""
+
+    kind = "memory"
+
+    def __init__(self, store: EventStore, labels: LabelIndex, counts):
+        self.store = store
+        self.labels = labels
+        self.counts = counts
+
+    async def sentiment_counts(self) -> List[dict]:
+        return self.counts.categories()
+
+    def has_sentiment(self, sentiment: str) -> bool:
+        return self.store.has_sentiment(sentiment)
+
+    async def events_page(self, sentiment=None, limit=20, before=None, labels=None, since=None) -> Page:
+        matching = self.labels.match(labels) if labels else None
+        return self.store.page(sentiment, limit, before=before, matching=matching, since=since)
+
+    async def get_event(self, request_id: str) -> Optional[dict]:
+        return self.store.get(request_id)
+
+    async def insert_many(self, events: List[dict]) -> int:
+        return await asyncio.to_thread(self.store.add_many, events)
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers asking for the same key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        # Shielded: a caller that goes away must not cancel the shared query
+        return await asyncio.shield(future)
+
+
+class ExecutorDataSource(DataSource):
+    """
+    Base for sources whose client blocks: queries run on a bounded thread
+    pool, and identical concurrent reads are coalesced.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{self.kind}-query")
+        self._flights = SingleFlight()
+
+    async def _run(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    async def _read(self, key: Hashable, fn: Callable, *args):
+        return await self._flights.do(key, lambda: self._run(fn, *args))
+
+    async def sentiment_counts(self) -> List[dict]:
+        return await self._read(("sentiment_counts",), self._sentiment_counts)
+
+    async def events_page(self, sentiment=None, limit=20, before=None, labels=None, since=None) -> Page:
+        key = ("events_page", sentiment, limit, before, _label_key(labels), since)
+        rows = await self._read(key, self._events_page, sentiment, limit + 1, before, labels or LabelQuery(), since)
+        next_key = sort_key(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_key
+
+    async def get_event(self, request_id: str) -> Optional[dict]:
+        return await self._read(("get_event", request_id), self._get_event, request_id)
+
+    async def insert_many(self, events: List[dict]) -> int:
+        return await self._run(self._insert_many, events)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "queries": self._flights.executions,
+            "coalesced": self._flights.coalesced,
+        }
+
+    def after_fork(self):
+        # A fork keeps only the calling thread: the inherited pool's threads are gone
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.kind}-query")
+        self._flights = SingleFlight()
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+    # Blocking implementations, called on the executor
+
+    def _sentiment_counts(self) -> List[dict]:
+        raise NotImplementedError
+
+    def _events_page(self, sentiment: Optional[str], limit: int, before: Optional[SortKey],
+                     labels: LabelQuery, since: Optional[str]) -> List[dict]:
+        raise NotImplementedError
+
+    def _get_event(self, request_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def _insert_many(self, events: List[dict]) -> int:
+        raise NotImplementedError
+
+
+def _label_key(labels: Optional[LabelQuery]) -> Hashable:
+    if not labels:
+        return None
+    return (
+        tuple(sorted((field, tuple(sorted(values))) for field, values in labels.include.items())),
+        tuple(sorted((field, tuple(sorted(values))) for field, values in labels.exclude.items())),
+        labels.match,
+    )
+
+
+def _array_column(field: str) -> str:
+    if field not in _ARRAY_COLUMNS:
+        raise ValueError(f"Unknown label field: {field!r}")
+    return field
+
+
+class SQLiteDataSource(ExecutorDataSource):
+    """
+    Offline stand-in for BigQuery with the same table shape. Array columns
+    are stored as JSON text and unnested with json_each. Sentiments are also
+    kept in a side table indexed on (sentiment, event_timestamp, request_id),
+    so a sentiment page is an index range scan. Each executor thread has its
+    own connection.
+    """
+
+    kind = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS intent_classification_events (
+            event_timestamp TEXT NOT NULL,
+            request_id TEXT PRIMARY KEY,
+            user_curr_message TEXT,
+            agent_prev_message TEXT,
+            user_intent TEXT NOT NULL DEFAULT '[]',
+            user_sentiment TEXT NOT NULL DEFAULT '[]',
+            work_category TEXT NOT NULL DEFAULT '[]'
+        );
+        CREATE INDEX IF NOT EXISTS events_by_time ON intent_classification_events (event_timestamp, request_id);
+        CREATE TABLE IF NOT EXISTS event_sentiments (
+            sentiment TEXT NOT NULL,
+            event_timestamp TEXT NOT NULL,
+            request_id TEXT NOT NULL,
+            PRIMARY KEY (sentiment, event_timestamp, request_id)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, database: str = "file:oracle?mode=memory&cache=shared", max_workers: int = DEFAULT_MAX_WORKERS):
+        super().__init__(max_workers)
+        self.database = database
+        self._local = threading.local()
+        # Every connection this process opened, for before_fork
+        self._connections: List[sqlite3.Connection] = []
+        # Held open so a shared in-memory database outlives the worker connections
+        self._keepalive = self._connect()
+        self._keepalive.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.database, uri=self.database.startswith("file:"), check_same_thread=False)
+        self._connections.append(connection)
+        connection.row_factory = sqlite3.Row
+        if "mode=memory" in self.database:
+            # Shared-cache connections lock tables against each other;
+            # let readers see the last committed state instead of waiting.
+            connection.execute("PRAGMA read_uncommitted = true")
+        else:
+            connection.execute("PRAGMA journal_mode = WAL")
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _sentiment_counts(self) -> List[dict]:
+        rows = self._connection().execute(
+            "SELECT sentiment, COUNT(*) AS count FROM event_sentiments GROUP BY sentiment ORDER BY count DESC"
+        )
+        return [{"sentiment": row["sentiment"], "count": row["count"]} for row in rows]
+
+    def _events_page(self, sentiment, limit, before, labels, since) -> List[dict]:
+        where, params = [], []
+        if sentiment is not None:
+            source = "event_sentiments s JOIN intent_classification_events e USING (request_id)"
+            where.append("s.sentiment = ?")
+            params.append(sentiment)
+            order = "s.event_timestamp DESC, s.request_id DESC"
+            key_columns = "s.event_timestamp", "s.request_id"
+        else:
+            source = "intent_classification_events e"
+            order = "e.event_timestamp DESC, e.request_id DESC"
+            key_columns = "e.event_timestamp", "e.request_id"
+        if before is not None:
+            where.append(f"({key_columns[0]}, {key_columns[1]}) < (?, ?)")
+            params.extend(before)
+        if since is not None:
+            where.append(f"{key_columns[0]} >= ?")
+            params.append(since)
+        for clause, values in self._label_clauses(labels):
+            where.append(clause)
+            params.extend(values)
+        sql = f"SELECT e.* FROM {source}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        return [self._event(row) for row in self._connection().execute(sql, params)]
+
+    def _get_event(self, request_id: str) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT * FROM intent_classification_events e WHERE request_id = ?", (request_id,)
+        ).fetchone()
+        return None if row is None else self._event(row)
+
+    @staticmethod
+    def _label_clauses(labels: LabelQuery):
+        for field, values in labels.include.items():
+            column = _array_column(field)
+            if labels.match == "any":
+                marks = ", ".join("?" * len(values))
+                yield f"EXISTS (SELECT 1 FROM json_each(e.{column}) WHERE value IN ({marks}))", values
+            else:
+                for value in values:
+                    yield f"EXISTS (SELECT 1 FROM json_each(e.{column}) WHERE value = ?)", [value]
+        for field, values in labels.exclude.items():
+            column = _array_column(field)
+            marks = ", ".join("?" * len(values))
+            yield f"NOT EXISTS (SELECT 1 FROM json_each(e.{column}) WHERE value IN ({marks}))", values
+
+    @staticmethod
+    def _event(row: sqlite3.Row) -> dict:
+        event = {column: row[column] for column in EVENT_COLUMNS}
+        event["user_intent"] = json.loads(event["user_intent"])
+        event["user_sentiment"] = json.loads(event["user_sentiment"])
+        work_category = json.loads(row["work_category"])
+        if work_category:
+            event["work_category"] = work_category
+        return event
+
+    def _insert_many(self, events: List[dict]) -> int:
+        connection = self._connection()
+        with connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO intent_classification_events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        event["event_timestamp"],
+                        event["request_id"],
+                        event.get("user_curr_message"),
+                        event.get("agent_prev_message"),
+                        json.dumps(event.get("user_intent") or []),
+                        json.dumps(event.get("user_sentiment") or []),
+                        json.dumps(event.get("work_category") or []),
+                    )
+                    for event in events
+                ],
+            )
+            inserted = connection.total_changes - before
+            connection.executemany(
+                "INSERT OR IGNORE INTO event_sentiments VALUES (?, ?, ?)",
+                [
+                    (sentiment, event["event_timestamp"], event["request_id"])
+                    for event in events
+                    for sentiment in event.get("user_sentiment") or ()
+                ],
+            )
+        return inserted
+
+    def insert_many_sync(self, events: List[dict]) -> int:
+        """Blocking insert, for seeding before the event loop starts"""
+        return self._insert_many(events)
+
+    def is_empty(self) -> bool:
+        return self._keepalive.execute("SELECT 1 FROM intent_classification_events LIMIT 1").fetchone() is None
+
+    def before_fork(self):
+        # SQLite connections must not be used across a fork: close them all,
+        # including the one preloading opened on this thread
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._local = threading.local()
+
+    def after_fork(self):
+        super().after_fork()
+        self._keepalive = self._connect()
+
+    async def close(self):
+        await super().close()
+        self._keepalive.close()
+
+
+class SegmentDataSource(ExecutorDataSource):
+    """
+    A directory of per-day columnar segments (see segments.SegmentStore).
+    Opening it maps the files and reads their headers, so it is ready in
+    milliseconds however many events it holds; sentiment counts come from
+    the headers, and pages only read the days between since and the cursor.
+    Ingest adds a run to each day it touches (see SegmentStore.add_many).
+    """
+
+    kind = "segments"
+
+    def __init__(self, directory: str, max_workers: int = DEFAULT_MAX_WORKERS):
+        super().__init__(max_workers)
+        self.store = SegmentStore(directory)
+
+    def has_sentiment(self, sentiment: str) -> bool:
+        return sentiment in self.store.label_counts("user_sentiment")
+
+    def _sentiment_counts(self) -> List[dict]:
+        ranked = sorted(self.store.label_counts("user_sentiment").items(), key=lambda item: item[1], reverse=True)
+        return [{"sentiment": sentiment, "count": count} for sentiment, count in ranked]
+
+    def _events_page(self, sentiment, limit, before, labels, since) -> List[dict]:
+        return self.store.page(sentiment, limit, before, since, labels)
+
+    def _get_event(self, request_id: str) -> Optional[dict]:
+        return self.store.get(request_id)
+
+    def _insert_many(self, events: List[dict]) -> int:
+        return self.store.add_many(events)
+
+    def insert_many_sync(self, events: List[dict]) -> int:
+        """Blocking insert, for seeding before the event loop starts"""
+        return self._insert_many(events)
+
+    def is_empty(self) -> bool:
+        return not self.store.days
+
+    def stats(self) -> dict:
+        return {**super().stats(), **self.store.stats()}
+
+
+class BigQueryDataSource(ExecutorDataSource):
+    """
+    agent_analytics.intent_classification_events via google-cloud-bigquery.
+    The client is thread-safe, so one instance is shared by the executor
+    threads. Every value reaches BigQuery as a query parameter.
+    """
+
+    kind = "bigquery"
+
+    def __init__(
+        self,
+        table: str = "agent_analytics.intent_classification_events",
+        client=None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        if bigquery is None:
+            raise RuntimeError("ORACLE_DATA_SOURCE=bigquery needs google-cloud-bigquery (pip install google-cloud-bigquery)")
+        super().__init__(max_workers)
+        self.table = table
+        self.client = client or bigquery.Client()
+
+    def _query(self, sql: str, parameters: list) -> List[dict]:
+        job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+        return [dict(row) for row in self.client.query(sql, job_config=job_config).result()]
+
+    def _sentiment_counts(self) -> List[dict]:
+        rows = self._query(
+            f"""
+            SELECT sentiment, COUNT(*) AS count, APPROX_COUNT_DISTINCT(user_id) AS unique_users
+            FROM `{self.table}`, UNNEST(user_sentiment) AS sentiment
+            GROUP BY sentiment
+            ORDER BY count DESC
+            """,
+            [],
+        )
+        return [
+            {"sentiment": row["sentiment"], "count": row["count"], "unique_users": row["unique_users"]} for row in rows
+        ]
+
+    def _events_page(self, sentiment, limit, before, labels, since) -> List[dict]:
+        where = []
+        parameters = [bigquery.ScalarQueryParameter("limit", "INT64", limit)]
+        if sentiment is not None:
+            where.append("@sentiment IN UNNEST(user_sentiment)")
+            parameters.append(bigquery.ScalarQueryParameter("sentiment", "STRING", sentiment))
+        if before is not None:
+            where.append("(event_timestamp < @ts OR (event_timestamp = @ts AND request_id < @request_id))")
+            parameters.append(bigquery.ScalarQueryParameter("ts", "TIMESTAMP", _parse_timestamp(before[0])))
+            parameters.append(bigquery.ScalarQueryParameter("request_id", "STRING", before[1]))
+        if since is not None:
+            # A bound on the partition column, so BigQuery prunes older partitions
+            where.append("event_timestamp >= @since")
+            parameters.append(bigquery.ScalarQueryParameter("since", "TIMESTAMP", _parse_timestamp(since)))
+        for i, (field, values) in enumerate(labels.include.items()):
+            column = _array_column(field)
+            if labels.match == "any":
+                where.append(f"EXISTS (SELECT 1 FROM UNNEST({column}) AS v WHERE v IN UNNEST(@include_{i}))")
+                parameters.append(bigquery.ArrayQueryParameter(f"include_{i}", "STRING", values))
+            else:
+                for j, value in enumerate(values):
+                    where.append(f"@include_{i}_{j} IN UNNEST({column})")
+                    parameters.append(bigquery.ScalarQueryParameter(f"include_{i}_{j}", "STRING", value))
+        for i, (field, values) in enumerate(labels.exclude.items()):
+            column = _array_column(field)
+            where.append(f"NOT EXISTS (SELECT 1 FROM UNNEST({column}) AS v WHERE v IN UNNEST(@exclude_{i}))")
+            parameters.append(bigquery.ArrayQueryParameter(f"exclude_{i}", "STRING", values))
+        sql = f"""
+            SELECT {", ".join(EVENT_COLUMNS)}
+            FROM `{self.table}`
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY event_timestamp DESC, request_id DESC
+            LIMIT @limit
+        """
+        return self._events(self._query(sql, parameters))
+
+    def _get_event(self, request_id: str) -> Optional[dict]:
+        rows = self._query(
+            f"SELECT {', '.join(EVENT_COLUMNS)} FROM `{self.table}` WHERE request_id = @request_id LIMIT 1",
+            [bigquery.ScalarQueryParameter("request_id", "STRING", request_id)],
+        )
+        return self._events(rows)[0] if rows else None
+
+    @staticmethod
+    def _events(rows: List[dict]) -> List[dict]:
+        for row in rows:
+            # TIMESTAMP comes back as datetime; keep the API's string format (and cursor keys)
+            if isinstance(row["event_timestamp"], datetime):
+                row["event_timestamp"] = row["event_timestamp"].astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+        return rows
+
+    def _insert_many(self, events: List[dict]) -> int:
+        rows = [{column: event.get(column) for column in EVENT_COLUMNS} for event in events]
+        for row in rows:
+            row["event_timestamp"] = _parse_timestamp(row["event_timestamp"]).isoformat()
+        # row_ids let BigQuery drop retried duplicates (best effort)
+        errors = self.client.insert_rows_json(self.table, rows, row_ids=[row["request_id"] for row in rows])
+        if errors:
+            raise RuntimeError(f"BigQuery insert failed: {errors[:3]}")
+        return len(rows)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.strptime(value, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
@@ -0,0 +1,187 @@
+"""
+Columnar storage for HITL events.
+
+A stored event is not a dict. Each field lives in a column indexed by doc
+id (the event's insertion ordinal):
+
+- event_timestamp: array('q') of epoch microseconds, parsed once at insert
+- user_intent / user_sentiment / work_category: integer codes into a
+  per-field Vocabulary, one flat array('H') per field plus an array('I') of
+  end offsets, so a label costs 2 bytes instead of a list slot and a string
+- user_curr_message / agent_prev_message: plain lists, kept apart from the
+  sort and filter columns above
+- request_id stays a str (it is also the store's lookup key); any other
+  columns go into a per-event dict, None for the usual event without any
+
+EventColumns.event(doc) builds the dict view on demand, with the same
+fields and values that were inserted (in FIELD_ORDER, then any others).
+"""
+
+from array import array
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MICROS_PER_DAY = 86_400_000_000
+
+LABEL_COLUMNS = ("user_intent", "user_sentiment", "work_category")
+TEXT_COLUMNS = ("user_curr_message", "agent_prev_message")
+
+# Field order of rebuilt events (as in the mock data); other columns follow
+FIELD_ORDER = ("event_timestamp", "request_id") + TEXT_COLUMNS + LABEL_COLUMNS
+_FIELDS = frozenset(FIELD_ORDER)
+
+# Label code for "this event has no such field"; vocabulary codes start at 1
+ABSENT = 0
+
+# Text column value for "this event has no such field" (None is a real value)
+_NO_TEXT = object()
+
+# "2026-01-21 " by days since the epoch; one entry per distinct day formatted
+_DAY_PREFIXES: Dict[int, str] = {}
+
+
+def timestamp_micros(timestamp: str) -> int:
+    """Epoch microseconds of a stored-format timestamp ("2026-01-21 11:12:52.685284 UTC")"""
+    parsed = datetime.fromisoformat(timestamp[:26])
+    seconds = parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+    return (parsed.toordinal() - EPOCH_ORDINAL) * MICROS_PER_DAY + seconds * 1_000_000 + parsed.microsecond
+
+
+def format_micros(micros: int) -> str:
+    """Inverse of timestamp_micros"""
+    days, rest = divmod(micros, MICROS_PER_DAY)
+    day = _DAY_PREFIXES.get(days)
+    if day is None:
+        day = _DAY_PREFIXES[days] = date.fromordinal(EPOCH_ORDINAL + days).isoformat() + " "
+    seconds, fraction = divmod(rest, 1_000_000)
+    return f"{day}{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{fraction:06d} UTC"
+
+
+class Vocabulary:
+    """Interned label values: one code per distinct string, starting at 1"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values) - 1
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            if not isinstance(value, str):
+                raise TypeError(f"Label values must be strings, got {value!r}")
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class LabelColumn:
+    """Per-event lists of label values, stored as vocabulary codes"""
+
+    def __init__(self):
+        self.vocabulary = Vocabulary()
+        self._codes = array("H")
+        self._ends = array("I")
+
+    def extend(self, rows: List[Optional[list]]) -> List[int]:
+        """
+        Add the values of the next events, one row per event; None means the
+        event has no such field. Rows that are not lists of strings are
+        stored as absent, and their positions returned.
+        """
+        vocabulary = self.vocabulary
+        known, code = vocabulary.codes, vocabulary.code
+        codes, ends = self._codes, self._ends
+        rejected = []
+        for i, values in enumerate(rows):
+            if values is None:
+                codes.append(ABSENT)
+            elif type(values) is list:
+                try:
+                    new = [known.get(value) or code(value) for value in values]
+                except TypeError:
+                    new = [ABSENT]
+                    rejected.append(i)
+                if len(vocabulary.values) > 0x10000 and codes.typecode == "H":
+                    codes = self._codes = array("I", codes)
+                codes.extend(new)
+            else:
+                codes.append(ABSENT)
+                rejected.append(i)
+            ends.append(len(codes))
+        return rejected
+
+    def get(self, doc: int) -> Optional[List[str]]:
+        codes, values = self._codes, self.vocabulary.values
+        start, end = self._ends[doc - 1] if doc else 0, self._ends[doc]
+        if end - start == 1:
+            code = codes[start]
+            return None if code == ABSENT else [values[code]]
+        return [values[codes[i]] for i in range(start, end)]
+
+
+class EventColumns:
+    """Append-only event table; doc ids are insertion ordinals"""
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.request_ids: List[str] = []
+        self.labels: Dict[str, LabelColumn] = {field: LabelColumn() for field in LABEL_COLUMNS}
+        self.texts: Dict[str, list] = {field: [] for field in TEXT_COLUMNS}
+        # Per-event dict of any other columns (or of label columns holding
+        # something other than a list of strings); None for most events
+        self.extras: List[Optional[dict]] = []
+
+    def __len__(self) -> int:
+        return len(self.request_ids)
+
+    def extend(self, events: List[dict]) -> int:
+        """
+        Store events whose event_timestamp is in the stored format; returns
+        the doc id of the first. Columns are filled one at a time, and
+        request_ids (whose length is the table's) last, so a concurrent
+        reader never sees a partly stored event.
+        """
+        first = len(self.request_ids)
+        extras: List[Optional[dict]] = [None] * len(events)
+        self.timestamps.extend([timestamp_micros(event["event_timestamp"]) for event in events])
+        for field, column in self.labels.items():
+            rows = [event.get(field) for event in events]
+            # Kept as-is: values that are not lists of strings, and explicit nulls
+            kept = column.extend(rows)
+            if None in rows:
+                kept += [i for i, values in enumerate(rows) if values is None and field in events[i]]
+            for i in kept:
+                extras[i] = extras[i] or {}
+                extras[i][field] = rows[i]
+        for field, column in self.texts.items():
+            column.extend([event.get(field, _NO_TEXT) for event in events])
+        for i, event in enumerate(events):
+            if not _FIELDS.issuperset(event):
+                extra = extras[i] = extras[i] or {}
+                extra.update((field, value) for field, value in event.items() if field not in _FIELDS)
+        self.extras.extend(extras)
+        self.request_ids.extend([event["request_id"] for event in events])
+        return first
+
+    def timestamp(self, doc: int) -> str:
+        return format_micros(self.timestamps[doc])
+
+    def event(self, doc: int) -> dict:
+        """The event as inserted, as a new dict (fields in FIELD_ORDER, then any others)"""
+        fields = {"event_timestamp": format_micros(self.timestamps[doc]), "request_id": self.request_ids[doc]}
+        for field, column in self.texts.items():
+            value = column[doc]
+            if value is not _NO_TEXT:
+                fields[field] = value
+        for field, column in self.labels.items():
+            values = column.get(doc)
+            if values is not None:
+                fields[field] = values
+        extra = self.extras[doc]
+        if extra is not None:
+            fields.update(extra)
+        return fields
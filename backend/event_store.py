@@ -0,0 +1,361 @@
+"""
+In-memory HITL event store.
+
+Events are kept once per request_id, in columns (see event_columns), and
+every sentiment holds an array of doc ids ordered by (event_timestamp,
+request_id). Reading a sentiment walks its array backwards (newest first);
+reading "all" lazily k-way merges the per-sentiment arrays, so no request
+ever copies or re-sorts the dataset. Internally timestamps are compared as
+epoch microseconds; SortKeys and cursors at the API keep the string form.
+"""
+
+import base64
+import heapq
+import json
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bitmap_index import bitmap_bytes, has_bit, iter_bits
+from event_columns import EventColumns, timestamp_micros
+
+# (event_timestamp, request_id) - timestamps share one fixed-width format, so
+# plain string comparison gives chronological order.
+SortKey = Tuple[str, str]
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f UTC"
+STORED_TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{6} UTC")
+
+# (epoch microseconds, request_id): what the store compares internally
+_Key = Tuple[int, str]
+
+
+def sort_key(event: dict) -> SortKey:
+    return (event["event_timestamp"], event["request_id"])
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    Parse a user-supplied date or timestamp ("2026-01-21", "2026-01-21T11:00:00Z",
+    "2026-01-21 11:00:00.5 UTC", ...) into the event_timestamp string format,
+    so it can be compared directly against stored sort keys.
+    """
+    text = value.strip()
+    if text.endswith(" UTC"):
+        text = text[:-4]
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError as e:
+        raise ValueError(f"Invalid timestamp: {value!r}") from e
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    # Not strftime, whose %Y drops the zero padding of years before 1000
+    return parsed.isoformat(sep=" ", timespec="microseconds") + " UTC"
+
+
+def encode_cursor(key: SortKey) -> str:
+    """Opaque page token for the position just after `key` (in newest-first order)"""
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> SortKey:
+    """Inverse of encode_cursor; raises ValueError on anything it did not produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, request_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(timestamp, str) or not isinstance(request_id, str) or not STORED_TIMESTAMP.fullmatch(timestamp):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return (timestamp, request_id)
+
+
+class BackgroundIndex:
+    """
+    Feeds a slow secondary index from a worker thread, so add_many returns
+    without waiting for it. Attach this instead of the index itself; the
+    index then trails the store by `pending` events until the worker
+    catches up. Doc ids reach the index in order, one thread at a time.
+    """
+
+    def __init__(self, index, name: Optional[str] = None):
+        self.index = index
+        self._queue: deque = deque()
+        self._pending = 0
+        self._changed = threading.Condition()
+        worker = threading.Thread(target=self._run, name=name or f"index-{type(index).__name__}", daemon=True)
+        worker.start()
+
+    @property
+    def pending(self) -> int:
+        """Events handed over but not yet in the index"""
+        return self._pending
+
+    def add(self, doc: int, event: dict):
+        with self._changed:
+            self._queue.append((doc, event))
+            self._pending += 1
+            self._changed.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the index has caught up; False if `timeout` ran out first"""
+        with self._changed:
+            return self._changed.wait_for(lambda: not self._pending, timeout)
+
+    def _run(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._queue)
+                batch = list(self._queue)
+                self._queue.clear()
+            for doc, event in batch:
+                self.index.add(doc, event)
+            with self._changed:
+                self._pending -= len(batch)
+                self._changed.notify_all()
+
+
+class EventStore:
+    """Events indexed by sentiment, pre-sorted by timestamp and de-duplicated by request_id"""
+
+    def __init__(self, sentiments: Iterable[str] = ()):
+        # Doc ids are insertion ordinals into _columns, and secondary
+        # indexes (see attach) refer to events by doc id.
+        self._columns = EventColumns()
+        self._doc_ids: Dict[str, int] = {}
+        self._indexes: list = []
+        # Writers are serialised; readers never lock (see _extend)
+        self._write_lock = threading.Lock()
+        # Doc ids ascending by (timestamp, request_id)
+        self._docs_by_sentiment: Dict[str, array] = {s: array("I") for s in sentiments}
+
+    @classmethod
+    def from_sentiment_map(cls, events_by_sentiment: Dict[str, List[dict]]) -> "EventStore":
+        """Build a store from the {sentiment: [event, ...]} layout used by the mock data"""
+        store = cls(events_by_sentiment.keys())
+        for sentiment, events in events_by_sentiment.items():
+            store.add_many(events, sentiment=sentiment)
+        return store
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    @property
+    def columns(self) -> EventColumns:
+        return self._columns
+
+    @property
+    def sentiments(self) -> List[str]:
+        return list(self._docs_by_sentiment)
+
+    def has_sentiment(self, sentiment: str) -> bool:
+        return sentiment in self._docs_by_sentiment
+
+    def get(self, request_id: str) -> Optional[dict]:
+        doc = self._doc_ids.get(request_id)
+        return None if doc is None else self._columns.event(doc)
+
+    def doc_id(self, request_id: str) -> Optional[int]:
+        return self._doc_ids.get(request_id)
+
+    def doc(self, doc: int) -> dict:
+        """The event with this doc id, as a new dict"""
+        return self._columns.event(doc)
+
+    def sort_key(self, doc: int) -> SortKey:
+        return (self._columns.timestamp(doc), self._columns.request_ids[doc])
+
+    def _key(self, doc: int) -> _Key:
+        return (self._columns.timestamps[doc], self._columns.request_ids[doc])
+
+    def attach(self, index, replay: bool = True):
+        """
+        Register a secondary index. `index.add(doc, event)` is called for every
+        stored event now (unless replay=False) and for every new event from
+        then on.
+        """
+        with self._write_lock:
+            if replay:
+                for doc in range(len(self._columns)):
+                    index.add(doc, self._columns.event(doc))
+            self._indexes.append(index)
+
+    def add_many(self, events: Iterable[dict], sentiment: Optional[str] = None) -> int:
+        """
+        Insert events, filing each one under every value of its user_sentiment
+        (plus `sentiment`, when given). An event whose request_id is already
+        stored is only filed under sentiments it was missing from.
+        Returns the number of new events.
+        """
+        with self._write_lock:
+            return self._add_many(events, sentiment)
+
+    def _add_many(self, events: Iterable[dict], sentiment: Optional[str]) -> int:
+        columns = self._columns
+        first_doc = len(columns)
+        fresh: List[dict] = []
+        # (doc, event labels) per event, in batch order; a new event's doc id
+        # is first_doc + its position in `fresh`
+        placed = []
+        batch_ids: Dict[str, int] = {}
+        for event in events:
+            request_id = event["request_id"]
+            doc = self._doc_ids.get(request_id)
+            if doc is None:
+                doc = batch_ids.get(request_id)
+            if doc is None:
+                if not STORED_TIMESTAMP.fullmatch(event["event_timestamp"]):
+                    event = dict(event, event_timestamp=normalize_timestamp(event["event_timestamp"]))
+                doc = batch_ids[request_id] = first_doc + len(fresh)
+                fresh.append(event)
+                placed.append((doc, event.get("user_sentiment")))
+            else:
+                placed.append((doc, None))
+        if fresh:
+            columns.extend(fresh)
+            self._doc_ids.update(batch_ids)
+
+        pending: Dict[str, List[int]] = {}
+        filed = set()
+        for doc, labels in placed:
+            labels = list(labels or columns.labels["user_sentiment"].get(doc) or [])
+            if sentiment is not None and sentiment not in labels:
+                labels.append(sentiment)
+            for label in labels:
+                if (label, doc) in filed:
+                    continue
+                filed.add((label, doc))
+                # Docs from this batch are not filed anywhere yet
+                if doc >= first_doc or not self._is_filed(label, doc):
+                    pending.setdefault(label, []).append(doc)
+        for label, docs in pending.items():
+            self._extend(label, docs)
+        for doc, event in enumerate(fresh, first_doc):
+            for index in self._indexes:
+                index.add(doc, event)
+        return len(fresh)
+
+    def _is_filed(self, sentiment: str, doc: int) -> bool:
+        docs = self._docs_by_sentiment.get(sentiment)
+        if not docs:
+            return False
+        i = bisect_left(docs, self._key(doc), key=self._key)
+        return i < len(docs) and docs[i] == doc
+
+    def _extend(self, sentiment: str, docs: List[int]):
+        key = self._key
+        docs.sort(key=key)
+        current = self._docs_by_sentiment.get(sentiment) or array("I")
+        # New events are usually newer than everything filed, so the merge
+        # only has to touch the tail from the oldest new key on
+        split = bisect_left(current, key(docs[0]), key=key)
+        merged = current[:split]
+        merged.extend(heapq.merge(current[split:], docs, key=key) if split < len(current) else docs)
+        # Swap in a new array rather than changing it in place, so an
+        # iterator already walking the old one keeps a consistent snapshot.
+        self._docs_by_sentiment[sentiment] = merged
+
+    def iter_docs(
+        self,
+        sentiment: Optional[str] = None,
+        before: Optional[SortKey] = None,
+        since: Optional[str] = None,
+        matching: Optional[int] = None,
+    ) -> Iterator[int]:
+        """
+        Yield doc ids newest first, for one sentiment or (sentiment=None)
+        across all of them, strictly below `before` and with event_timestamp
+        >= `since` (a normalized timestamp) when given. Both bounds are
+        binary searches, so deep pages cost the same as the first one.
+        `matching` is a doc-id bitmap (see bitmap_index) that docs must be in.
+        """
+        below = None if before is None else (timestamp_micros(before[0]), before[1])
+        start = None if since is None else (timestamp_micros(since), "")
+        if sentiment is not None:
+            docs = self._run(self._docs_by_sentiment.get(sentiment, array("I")), below, start)
+        else:
+            docs = self._merged_docs(below, start)
+        if matching is None:
+            return docs
+        return self._filter_matching(docs, matching)
+
+    def iter_keys(self, *args, **kwargs) -> Iterator[SortKey]:
+        """Yield sort keys newest first; see iter_docs"""
+        return map(self.sort_key, self.iter_docs(*args, **kwargs))
+
+    def iter_events(self, *args, **kwargs) -> Iterator[dict]:
+        """Yield events newest first; see iter_docs"""
+        return map(self._columns.event, self.iter_docs(*args, **kwargs))
+
+    def _filter_matching(self, docs: Iterator[int], matching: int) -> Iterator[int]:
+        data = bitmap_bytes(matching, len(self._columns))
+        for doc in docs:
+            if has_bit(data, doc):
+                yield doc
+
+    def _run(self, docs: array, before: Optional[_Key], since: Optional[_Key]) -> Iterator[int]:
+        stop = len(docs) if before is None else bisect_left(docs, before, key=self._key)
+        start = 0 if since is None else bisect_left(docs, since, key=self._key)
+        for i in range(stop - 1, start - 1, -1):
+            yield docs[i]
+
+    def _merged_docs(self, before: Optional[_Key], since: Optional[_Key]) -> Iterator[int]:
+        # Every sentiment array is sorted on the same key, so an event filed
+        # under several sentiments comes out of the merge as adjacent
+        # duplicates and is dropped without keeping a seen-set.
+        runs = [self._run(docs, before, since) for docs in self._docs_by_sentiment.values()]
+        previous = None
+        for doc in heapq.merge(*runs, key=self._key, reverse=True):
+            if doc != previous:
+                yield doc
+                previous = doc
+
+    def page(
+        self,
+        sentiment: Optional[str] = None,
+        limit: int = 20,
+        before: Optional[SortKey] = None,
+        matching: Optional[int] = None,
+        since: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[SortKey]]:
+        """
+        Newest `limit` events below `before` and at or after `since` (and in
+        the `matching` bitmap, when given), plus the key to resume from (None
+        on the last page).
+        """
+        if matching is None:
+            docs = list(islice(self.iter_docs(sentiment, before, since), limit + 1))
+        else:
+            docs = self._newest_matching(matching, sentiment, before, limit + 1, since)
+        next_key = self.sort_key(docs[limit - 1]) if len(docs) > limit and limit > 0 else None
+        return [self._columns.event(doc) for doc in docs[:limit]], next_key
+
+    def _newest_matching(
+        self, matching: int, sentiment: Optional[str], before: Optional[SortKey], count: int,
+        since: Optional[str] = None,
+    ) -> List[int]:
+        matches = matching.bit_count()
+        if not matches:
+            return []
+        # Walking the time-ordered docs and testing bits finds `count` hits
+        # after roughly count * N / matches docs, which is cheap for common
+        # labels. For rare ones it is cheaper to materialise the matches and
+        # keep the newest `count`.
+        if count * len(self._columns) <= matches * matches:
+            return list(islice(self.iter_docs(sentiment, before, since, matching=matching), count))
+        docs = iter_bits(matching)
+        if before is not None:
+            below = (timestamp_micros(before[0]), before[1])
+            docs = (doc for doc in docs if self._key(doc) < below)
+        if since is not None:
+            start = timestamp_micros(since)
+            docs = (doc for doc in docs if self._columns.timestamps[doc] >= start)
+        if sentiment is not None:
+            docs = (doc for doc in docs if self._is_filed(sentiment, doc))
+        return heapq.nlargest(count, docs, key=self._key)
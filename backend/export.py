@@ -0,0 +1,73 @@
+"""
+Chunked NDJSON / CSV encoders for streaming HITL event exports.
+
+Each encoder consumes an event iterator lazily and yields one encoded chunk
+per `chunk_rows` events, so an export only ever holds a single chunk in
+memory regardless of how many rows it covers.
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+from typing import Iterable, Iterator
+
+EXPORT_CHUNK_ROWS = 500
+
+EXPORT_COLUMNS = [
+    "event_timestamp",
+    "request_id",
+    "user_intent",
+    "user_sentiment",
+    "user_curr_message",
+    "agent_prev_message",
+]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _chunks(events: Iterable[dict], chunk_rows: int) -> Iterator[list]:
+    events = iter(events)
+    while True:
+        chunk = list(islice(events, chunk_rows))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_ndjson(events: Iterable[dict], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """One JSON object per line, restricted to EXPORT_COLUMNS"""
+    for chunk in _chunks(events, chunk_rows):
+        lines = [
+            json.dumps({column: event.get(column) for column in EXPORT_COLUMNS}, ensure_ascii=False)
+            for event in chunk
+        ]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_csv(events: Iterable[dict], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Header row then one row per event; array columns are written as JSON lists"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in _chunks(events, chunk_rows):
+        for event in chunk:
+            writer.writerow([
+                json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+                for value in (event.get(column) for column in EXPORT_COLUMNS)
+            ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        # No events at all: still emit the header
+        yield buffer.getvalue().encode("utf-8")
+
+
+EXPORT_ENCODERS = {
+    "ndjson": iter_ndjson,
+    "csv": iter_csv,
+}
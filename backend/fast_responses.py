@@ -0,0 +1,204 @@
+"""
+Fast response path (opt-in, ORACLE_FAST_RESPONSES=1).
+
+FastAPI turns a returned dict into a response in two passes:
+jsonable_encoder walks and copies every value, then the json module encodes
+the copy. Event payloads are already plain JSON types, so FastJSONResponse
+skips the first pass when an endpoint returns it directly, and encodes
+with orjson when it is installed (about 10x faster than json on pages of
+long agent messages).
+
+CompressionMiddleware gzip- or brotli-encodes responses of at least
+COMPRESS_MIN_BYTES when the client accepts it. A compressed response with
+an ETag (every response from the response cache has one) is a pre-encoded
+payload: the ETag is a hash of the body, so its compressed bytes are kept
+in a small LRU and reused until the data changes. The ETag is sent weak,
+as the compressed bytes are a different representation of the same body;
+the response cache compares If-None-Match weakly, so 304s keep working.
+"""
+
+import gzip
+import json
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the json module
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Smaller bodies fit in a packet or two; compressing them gains nothing
+COMPRESS_MIN_BYTES = 1024
+# Level 1 is about 3x faster than the default 6 on event pages, for ~15% more bytes
+GZIP_LEVEL = 1
+BROTLI_QUALITY = 4
+COMPRESSED_CACHE_BYTES = 16 * 1024 * 1024
+
+COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"text/")
+
+
+def dumps(content) -> bytes:
+    """JSON bytes; values of other types (e.g. Decimal from BigQuery) go through jsonable_encoder"""
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=jsonable_encoder
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse for content that is already JSON-serialisable (no jsonable_encoder pass)"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Supported content codings, most preferred first"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def describe() -> str:
+    """The JSON encoder and content codings in use, for the startup log"""
+    encoder = "orjson" if orjson is not None else "json (orjson not installed)"
+    codings = ", ".join(available_encodings())
+    if brotli is None:
+        codings += " (brotli not installed)"
+    return f"JSON encoder {encoder}; content codings {codings}"
+
+
+def negotiate(accept_encoding: Optional[bytes]) -> Optional[str]:
+    """The content coding to use for an Accept-Encoding header, or None for identity"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.decode("latin-1").lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip()] = weight
+    best, best_weight = None, 0.0
+    for coding in available_encodings():
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    """Byte-bounded LRU of compressed bodies, keyed on (ETag, coding)"""
+
+    def __init__(self, max_bytes: int = COMPRESSED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._bodies: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self.counters = {"hits": 0, "misses": 0}
+
+    def get(self, etag: bytes, coding: str, body: bytes) -> bytes:
+        key = (etag, coding)
+        compressed = self._bodies.get(key)
+        if compressed is not None:
+            self._bodies.move_to_end(key)
+            self.counters["hits"] += 1
+            return compressed
+        self.counters["misses"] += 1
+        compressed = compress(body, coding)
+        if len(compressed) <= self.max_bytes:
+            self._bodies[key] = compressed
+            self._bytes += len(compressed)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._bodies.popitem(last=False)
+                self._bytes -= len(evicted)
+        return compressed
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._bodies), "bytes": self._bytes}
+
+
+class CompressionMiddleware:
+    """
+    Compress complete (non-streamed) responses of a compressible type and at
+    least `min_bytes`. Streamed responses such as exports pass through as-is.
+    Add it after ResponseCacheMiddleware, so that it wraps the cache and
+    cached entries stay uncompressed (one entry serves every coding).
+    """
+
+    def __init__(self, app, min_bytes: int = COMPRESS_MIN_BYTES, cache: Optional[CompressedCache] = None):
+        self.app = app
+        self.min_bytes = min_bytes
+        self.cache = cache if cache is not None else CompressedCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(_header(scope["headers"], b"accept-encoding"))
+        start = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if message.get("more_body", False) or not self._compressible(start, body):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                await self._send_body(send, start, body, coding)
+            else:
+                await send(message)
+
+        await self.app(scope, receive, compressing_send)
+
+    def _compressible(self, start: dict, body: bytes) -> bool:
+        if start["status"] != 200 or len(body) < self.min_bytes:
+            return False
+        headers = start.get("headers", [])
+        content_type = _header(headers, b"content-type") or b""
+        return content_type.startswith(COMPRESSIBLE_TYPES) and _header(headers, b"content-encoding") is None
+
+    async def _send_body(self, send, start: dict, body: bytes, coding: Optional[str]):
+        headers = [(key, value) for key, value in start.get("headers", []) if key.lower() != b"vary"]
+        vary = _header(start.get("headers", []), b"vary")
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if coding is not None:
+            etag = _header(headers, b"etag")
+            body = self.cache.get(etag, coding, body) if etag else compress(body, coding)
+            headers = [
+                (key, value) for key, value in headers if key.lower() not in (b"content-length", b"etag")
+            ] + [(b"content-encoding", coding.encode()), (b"content-length", str(len(body)).encode())]
+            if etag:
+                headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
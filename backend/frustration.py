@@ -0,0 +1,215 @@
+"""
+Streaming frustrated-user detection.
+
+The knowledge base's "Frustrated User Detection" query runs as a batch job:
+
+    SELECT user_id, COUNT(*) as frustrated_events, MAX(event_timestamp) as last_frustrated_at,
+           ARRAY_AGG(DISTINCT intent) as related_intents
+    ... WHERE event_timestamp in the last 7 days AND sentiment = 'frustrated'
+    GROUP BY user_id HAVING frustrated_events >= 2 ORDER BY frustrated_events DESC
+
+FrustrationDetector is attached to the store (see EventStore.attach) and
+keeps the same answer current as events arrive, so a user is flagged by the
+event that makes them at-risk:
+
+- Time is event time. The window ends at the watermark (the newest
+  event_timestamp seen) and covers the WINDOW_HOURS hours before it, in
+  hourly buckets. Frustrated events older than that are ignored
+- Each user with a frustrated event in the window has a short list of
+  (hour, count, intents) buckets. A heap of bucket hours expires buckets
+  as the watermark advances, and a user with none left is dropped, so
+  memory is bounded by the frustrated events inside the window
+- Users are grouped by their in-window count, so the ranked at-risk list
+  is read from the highest count down without sorting every user
+- Crossing FRUSTRATED_EVENTS_THRESHOLD is recorded as a flag (user, time,
+  triggering request_id) in a bounded list of recent flags
+
+Counts are of events; the SQL above counts (event, intent) rows, since it
+unnests user_intent before COUNT(*).
+"""
+
+import heapq
+from collections import deque
+from typing import Dict, List, Optional
+
+from event_columns import timestamp_micros
+
+FRUSTRATED = "frustrated"
+FRUSTRATED_EVENTS_THRESHOLD = 2
+WINDOW_HOURS = 7 * 24
+RECENT_FLAGS = 1000
+
+MICROS_PER_HOUR = 3_600_000_000
+
+
+def _hour(timestamp: str) -> int:
+    return timestamp_micros(timestamp) // MICROS_PER_HOUR
+
+
+class _UserWindow:
+    __slots__ = ("user_id", "buckets", "total", "last_at", "last_request_id", "flagged_at")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        # [hour, count, {intent: count}], ascending by hour
+        self.buckets: List[list] = []
+        self.total = 0
+        self.last_at: Optional[str] = None
+        self.last_request_id: Optional[str] = None
+        # Timestamp of the event that took total to the threshold, while at or above it
+        self.flagged_at: Optional[str] = None
+
+    def summary(self) -> dict:
+        intents: Dict[str, int] = {}
+        for _, _, bucket_intents in self.buckets:
+            for intent, count in bucket_intents.items():
+                intents[intent] = intents.get(intent, 0) + count
+        return {
+            "user_id": self.user_id,
+            "frustrated_events": self.total,
+            "last_frustrated_at": self.last_at,
+            "last_request_id": self.last_request_id,
+            "flagged_at": self.flagged_at,
+            "related_intents": sorted(intents, key=lambda intent: (-intents[intent], intent)),
+        }
+
+
+class FrustrationDetector:
+    """Per-user sliding-window counts of frustrated events, updated as events are added to the store"""
+
+    def __init__(
+        self,
+        threshold: int = FRUSTRATED_EVENTS_THRESHOLD,
+        window_hours: int = WINDOW_HOURS,
+        recent_flags: int = RECENT_FLAGS,
+    ):
+        self.threshold = threshold
+        self.window_hours = window_hours
+        self.watermark: Optional[str] = None
+        self._cutoff: Optional[int] = None  # oldest hour inside the window
+        self._users: Dict[str, _UserWindow] = {}
+        # (hour, user_id) per bucket, for expiry
+        self._expiry: List[tuple] = []
+        # in-window count -> users with that count
+        self._by_count: Dict[int, set] = {}
+        self.flags: deque = deque(maxlen=recent_flags)
+        self.counters = dict.fromkeys(("frustrated_events", "late_events", "flags", "expired_buckets"), 0)
+
+    def add(self, doc: int, event: dict):
+        timestamp = event["event_timestamp"]
+        if self.watermark is None or timestamp > self.watermark:
+            # The cutoff only moves when the watermark enters a new hour
+            if self.watermark is None or timestamp[:13] != self.watermark[:13]:
+                self._advance(_hour(timestamp) - self.window_hours + 1)
+            self.watermark = timestamp
+        sentiments = event.get("user_sentiment")
+        if not isinstance(sentiments, list) or FRUSTRATED not in sentiments:
+            return
+        user_id = event.get("user_id")
+        if not isinstance(user_id, str) or not user_id:
+            return
+        hour = _hour(timestamp)
+        if hour < self._cutoff:
+            self.counters["late_events"] += 1
+            return
+        self.counters["frustrated_events"] += 1
+
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserWindow(user_id)
+        buckets = user.buckets
+        i = len(buckets)
+        # Usually the newest bucket, or a new one after it
+        while i and buckets[i - 1][0] > hour:
+            i -= 1
+        if i and buckets[i - 1][0] == hour:
+            bucket = buckets[i - 1]
+        else:
+            bucket = [hour, 0, {}]
+            buckets.insert(i, bucket)
+            heapq.heappush(self._expiry, (hour, user_id))
+        bucket[1] += 1
+        intents = event.get("user_intent")
+        if isinstance(intents, list):
+            for intent in intents:
+                if isinstance(intent, str):
+                    bucket[2][intent] = bucket[2].get(intent, 0) + 1
+        if user.last_at is None or timestamp > user.last_at:
+            user.last_at = timestamp
+            user.last_request_id = event.get("request_id")
+
+        self._recount(user, user.total + 1)
+        if user.total == self.threshold:
+            user.flagged_at = timestamp
+            self.counters["flags"] += 1
+            self.flags.append({
+                "user_id": user_id,
+                "flagged_at": timestamp,
+                "request_id": event.get("request_id"),
+                "frustrated_events": user.total,
+            })
+
+    def _recount(self, user: _UserWindow, total: int):
+        by_count = self._by_count
+        if user.total:
+            members = by_count[user.total]
+            members.discard(user.user_id)
+            if not members:
+                del by_count[user.total]
+        user.total = total
+        if total:
+            by_count.setdefault(total, set()).add(user.user_id)
+        if total < self.threshold:
+            user.flagged_at = None
+
+    def _advance(self, cutoff: int):
+        """Move the window start to `cutoff` and expire every bucket before it"""
+        if self._cutoff is not None and cutoff <= self._cutoff:
+            return
+        self._cutoff = cutoff
+        expiry = self._expiry
+        while expiry and expiry[0][0] < cutoff:
+            _, user_id = heapq.heappop(expiry)
+            user = self._users.get(user_id)
+            if user is None:
+                continue
+            expired = 0
+            while user.buckets and user.buckets[0][0] < cutoff:
+                expired += user.buckets.pop(0)[1]
+                self.counters["expired_buckets"] += 1
+            if expired:
+                self._recount(user, user.total - expired)
+            if not user.buckets:
+                del self._users[user_id]
+
+    def at_risk(self, limit: int, min_events: Optional[int] = None) -> List[dict]:
+        """
+        Users with at least `min_events` (default: the threshold) frustrated
+        events in the window, most first, then most recently frustrated first
+        """
+        min_events = self.threshold if min_events is None else min_events
+        found = []
+        for count in sorted(list(self._by_count), reverse=True):
+            if count < min_events:
+                break
+            users = [self._users.get(user_id) for user_id in list(self._by_count.get(count, ()))]
+            users = [user for user in users if user is not None]
+            users.sort(key=lambda user: (user.last_at or "", user.user_id), reverse=True)
+            for user in users:
+                found.append(user.summary())
+                if len(found) == limit:
+                    return found
+        return found
+
+    def recent_flags(self, limit: int) -> List[dict]:
+        """The latest `limit` threshold crossings, newest first"""
+        flags = list(self.flags)
+        return flags[:-limit - 1:-1]
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "tracked_users": len(self._users),
+            "at_risk_users": sum(len(users) for count, users in list(self._by_count.items()) if count >= self.threshold),
+            "watermark": self.watermark,
+        }
@@ -0,0 +1,175 @@
+"""
+Bulk ingest of classification events and trajectory steps.
+
+A batch arrives as a JSON array or as NDJSON (one record per line) and is
+validated against HITLEventIn (or TrajectoryStepIn) with a pydantic
+TypeAdapter, which parses straight from bytes into plain dicts, so
+validation does not build model objects that would then have to be dumped
+back out. Timestamps are normalised to the stored string format, which the
+event store parses with a fixed-width fast path, and label arrays lose
+repeated values, so ["frustrated", "frustrated"] counts once.
+"""
+
+from typing import Dict, List, Optional, Union
+
+from pydantic import ConfigDict, Field, TypeAdapter, ValidationError
+from pydantic.functional_validators import AfterValidator
+from typing_extensions import Annotated, NotRequired, TypedDict
+
+from event_store import STORED_TIMESTAMP, normalize_timestamp
+
+# Largest request body accepted by the ingest endpoint
+MAX_INGEST_BYTES = 64 * 1024 * 1024
+
+# Validation errors reported back per rejected batch
+MAX_INGEST_ERRORS = 20
+
+def _event_timestamp(value: str) -> str:
+    if STORED_TIMESTAMP.fullmatch(value):
+        return value
+    return normalize_timestamp(value)
+
+
+def _distinct(values: List[str]) -> List[str]:
+    return list(dict.fromkeys(values)) if len(values) > 1 else values
+
+
+_Labels = Annotated[List[str], AfterValidator(_distinct)]
+
+
+class HITLEventIn(TypedDict):
+    """One row of agent_analytics.intent_classification_events; columns not declared here are kept as-is"""
+
+    __pydantic_config__ = ConfigDict(extra="allow")
+
+    event_timestamp: Annotated[str, AfterValidator(_event_timestamp)]
+    request_id: Annotated[str, Field(min_length=1)]
+    user_sentiment: Annotated[_Labels, Field(min_length=1)]
+    user_intent: NotRequired[_Labels]
+    user_curr_message: NotRequired[Optional[str]]
+    agent_prev_message: NotRequired[Optional[str]]
+    work_category: NotRequired[_Labels]
+    work_subcategory: NotRequired[_Labels]
+    progress_outcome: NotRequired[_Labels]
+    job_id: NotRequired[Optional[str]]
+    user_id: NotRequired[Optional[str]]
+    state_number: NotRequired[Optional[int]]
+    trajectory_ecu_consumed: NotRequired[Optional[float]]
+    execution_time: NotRequired[Optional[float]]
+
+
+_BATCH = TypeAdapter(List[HITLEventIn])
+_EVENT = TypeAdapter(HITLEventIn)
+
+
+class TrajectoryStepIn(TypedDict):
+    """One agent step of analytics.trajectories_full_view, with its job's jobs_full_view columns"""
+
+    __pydantic_config__ = ConfigDict(extra="ignore")
+
+    job_id: Annotated[str, Field(min_length=1)]
+    function_name: Annotated[str, Field(min_length=1)]
+    created_at: Annotated[str, AfterValidator(_event_timestamp)]
+    # The view holds the string 'true' / 'false'
+    env_success: NotRequired[Optional[Union[bool, str]]]
+    model_name: NotRequired[Optional[str]]
+    agent_name: NotRequired[Optional[str]]
+    prompt_name: NotRequired[Optional[str]]
+    user_id: NotRequired[Optional[str]]
+    job_created_at: NotRequired[Optional[Annotated[str, AfterValidator(_event_timestamp)]]]
+
+
+_STEP_BATCH = TypeAdapter(List[TrajectoryStepIn])
+_STEP = TypeAdapter(TrajectoryStepIn)
+
+
+# Optional columns are filled in so stored events always have the full shape
+_DEFAULTS = (("user_intent", list), ("user_curr_message", lambda: None), ("agent_prev_message", lambda: None))
+
+
+def _complete(events: List[dict]) -> List[dict]:
+    for event in events:
+        for field, default in _DEFAULTS:
+            if field not in event:
+                event[field] = default()
+    return events
+
+
+class IngestError(ValueError):
+    """A batch failed validation; `errors` lists the first MAX_INGEST_ERRORS problems"""
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"{len(errors)} invalid event(s)")
+        self.errors = errors
+
+
+def _errors(error: ValidationError, prefix: tuple = ()) -> List[dict]:
+    return [
+        {"loc": list(prefix + tuple(item["loc"])), "msg": item["msg"]}
+        for item in error.errors(include_url=False)[:MAX_INGEST_ERRORS]
+    ]
+
+
+def _validate_json(body: bytes, batch: TypeAdapter) -> List[dict]:
+    try:
+        return batch.validate_json(body)
+    except ValidationError as e:
+        raise IngestError(_errors(e))
+
+
+def _validate_ndjson(body: bytes, record: TypeAdapter) -> List[dict]:
+    records = []
+    errors = []
+    for number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(record.validate_json(line))
+        except ValidationError as e:
+            errors.extend(_errors(e, ("line", number)))
+            if len(errors) >= MAX_INGEST_ERRORS:
+                break
+    if errors:
+        raise IngestError(errors[:MAX_INGEST_ERRORS])
+    return records
+
+
+def parse_json_batch(body: bytes) -> List[dict]:
+    """Validate a JSON array of events"""
+    return _complete(_validate_json(body, _BATCH))
+
+
+def parse_ndjson_batch(body: bytes) -> List[dict]:
+    """Validate one event per line; blank lines are skipped and errors carry the 1-based line number"""
+    return _complete(_validate_ndjson(body, _EVENT))
+
+
+def parse_json_steps(body: bytes) -> List[dict]:
+    """Validate a JSON array of trajectory steps"""
+    return _validate_json(body, _STEP_BATCH)
+
+
+def parse_ndjson_steps(body: bytes) -> List[dict]:
+    """Validate one trajectory step per line, as parse_ndjson_batch"""
+    return _validate_ndjson(body, _STEP)
+
+
+class SentimentCounts:
+    """
+    Live per-sentiment event counts: seeded with the totals already known
+    (SENTIMENT_CATEGORIES) and bumped for every event added to the store
+    afterwards (attach with replay=False).
+    """
+
+    def __init__(self, seed: Optional[List[dict]] = None):
+        self._counts: Dict[str, int] = {item["sentiment"]: item["count"] for item in seed or ()}
+
+    def add(self, doc: int, event: dict):
+        counts = self._counts
+        for sentiment in event.get("user_sentiment") or ():
+            counts[sentiment] = counts.get(sentiment, 0) + 1
+
+    def categories(self) -> List[dict]:
+        """[{"sentiment", "count"}, ...], largest first"""
+        ranked = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+        return [{"sentiment": sentiment, "count": count} for sentiment, count in ranked]
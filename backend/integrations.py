@@ -0,0 +1,205 @@
+"""
+Integration demand from work_subcategory, parsed once at ingest.
+
+work_subcategory values are strings like
+
+    "integration: Stripe, gpt 4o | design: layout"
+
+that the knowledge base's "Integration Demand Analysis" query groups on as
+they are, so "Stripe", "stripe" and "integration: Stripe, PayPal" count as
+three subcategories, and splitting them means string parsing in every query.
+Here each value is parsed once into normalised (category, item) pairs:
+
+- "|" separates categories and "," items. A part without "category:"
+  takes the event's work_category when it has exactly one (the synthetic
+  and older events hold bare names such as "Stripe"), else ""
+- categories are case-folded, with spaces as underscores. An item that
+  names one of the knowledge base's standardised integrations (compared
+  case-folded, without spaces or punctuation, plus a few common aliases
+  in INTEGRATION_ALIASES) becomes that name: "gpt 4o" and "GPT-4o" are
+  both GPT-4o. Other items are case-folded
+- parses are memoised per distinct string; production has a few hundred
+
+IntegrationIndex is attached to the store (see EventStore.attach) and
+counts, per day and integration, the events mentioning it and those that
+also carry the requested_integration intent, plus the items filed under
+the integration category that match no standardised name. A window's
+demand sums its days' counts, 30 small dicts however many events they
+hold. Distinct users per integration come from UniqueUserIndex, whose
+"integration" field uses event_integrations() below.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Knowledge base "Integration Names (standardized)", by group
+INTEGRATION_GROUPS = {
+    "LLM/AI": (
+        "GPT-5.2", "GPT-4o", "GPT-4o-mini", "Gemini-3-flash", "Gemini-3-pro", "Claude Sonnet 4.5",
+        "Claude Opus 4.5", "Claude Haiku 4.5", "DeepSeek-V3", "DeepSeek-R1", "OpenAI TTS", "OpenAI STT",
+        "OpenAI Whisper", "Gemini Image", "GPT Image 1", "Sora 2",
+    ),
+    "Payment": ("Stripe", "Razorpay", "PayPal"),
+    "Communication": (
+        "Twilio SMS", "Telegram", "Slack", "Discord", "Gmail", "Resend", "SendGrid", "WhatsApp", "Baileys WhatsApp",
+    ),
+    "Media": ("YouTube", "Twitter", "Spotify", "ElevenLabs", "fal.ai", "Cloudinary", "TMDB"),
+    "Data APIs": ("Web Scraper", "CoinGecko", "Alpha Vantage", "Football API", "Open Weather"),
+    "Google": ("Google Calendar", "Google Drive", "Google Sheets", "Google OAuth", "Google Login"),
+    "Infrastructure": ("Firebase", "Supabase Auth", "Supabase Blob", "Pinecone", "WebSockets", "MongoDB"),
+    "Auth": ("JWT", "OAuth", "SSO", "Facebook Login", "Emergent Auth"),
+}
+
+# Other spellings seen for a standardised name
+INTEGRATION_ALIASES = {
+    "twilio": "Twilio SMS",
+    "whisper": "OpenAI Whisper",
+    "sora": "Sora 2",
+    "gpt image": "GPT Image 1",
+    "fal": "fal.ai",
+    "openweathermap": "Open Weather",
+    "websocket": "WebSockets",
+    "mongo": "MongoDB",
+    "google sign in": "Google Login",
+}
+
+INTEGRATION_CATEGORY = "integration"
+REQUEST_INTENT = "requested_integration"
+
+INTEGRATION_GROUP = {name: group for group, names in INTEGRATION_GROUPS.items() for name in names}
+
+_NOT_KEY = re.compile(r"[^0-9a-z.]+")
+_SPACES = re.compile(r"\s+")
+
+
+def _key(text: str) -> str:
+    return _NOT_KEY.sub("", text.casefold()).strip(".")
+
+
+_STANDARD = {_key(name): name for name in INTEGRATION_GROUP}
+_STANDARD.update((_key(alias), name) for alias, name in INTEGRATION_ALIASES.items())
+
+
+def match_integration(item: str) -> Optional[str]:
+    """The standardised integration name `item` spells, if any"""
+    return _STANDARD.get(_key(item))
+
+
+@lru_cache(maxsize=1 << 14)
+def parse_subcategory(value: str) -> Tuple[Tuple[str, str], ...]:
+    """(category, item) pairs of one work_subcategory string; category is "" where the string names none"""
+    pairs = []
+    for part in value.split("|"):
+        category, colon, items = part.partition(":")
+        if not colon:
+            category, items = "", part
+        category = _SPACES.sub("_", category.strip().casefold())
+        for item in items.split(","):
+            item = _SPACES.sub(" ", item.strip())
+            if item:
+                pair = (category, match_integration(item) or item.casefold())
+                if pair not in pairs:
+                    pairs.append(pair)
+    return tuple(pairs)
+
+
+def subcategory_pairs(event: dict) -> List[Tuple[str, str]]:
+    """Normalised (category, item) pairs of an event's work_subcategory"""
+    values = event.get("work_subcategory")
+    if isinstance(values, str):
+        values = [values]
+    elif type(values) is not list:
+        return []
+    categories = event.get("work_category")
+    default = categories[0] if type(categories) is list and len(categories) == 1 and type(categories[0]) is str else ""
+    pairs = []
+    for value in values:
+        if type(value) is not str:
+            continue
+        for category, item in parse_subcategory(value):
+            pair = (category or default.casefold(), item)
+            if pair not in pairs:
+                pairs.append(pair)
+    return pairs
+
+
+def event_integrations(event: dict) -> List[str]:
+    """Standardised integrations an event's work_subcategory names, in any category"""
+    names = []
+    for _, item in subcategory_pairs(event):
+        if item in INTEGRATION_GROUP and item not in names:
+            names.append(item)
+    return names
+
+
+class _Day:
+    __slots__ = ("mentions", "requests", "unrecognized")
+
+    def __init__(self):
+        # integration -> events naming it / of those, events with REQUEST_INTENT
+        self.mentions: Dict[str, int] = {}
+        self.requests: Dict[str, int] = {}
+        # integration-category item matching no standardised name -> events
+        self.unrecognized: Dict[str, int] = {}
+
+
+class IntegrationIndex:
+    """Per-day integration mention and request counts from parsed work_subcategory, kept as events are added"""
+
+    def __init__(self):
+        self._days: Dict[str, _Day] = {}
+
+    def add(self, doc: int, event: dict):
+        pairs = subcategory_pairs(event)
+        if not pairs:
+            return
+        day_key = event["event_timestamp"][:10]
+        day = self._days.get(day_key)
+        if day is None:
+            day = self._days[day_key] = _Day()
+        intents = event.get("user_intent")
+        requested = type(intents) is list and REQUEST_INTENT in intents
+        mentions, requests, unrecognized = day.mentions, day.requests, day.unrecognized
+        # An integration named under two categories is still one mention
+        counted = set()
+        for category, item in pairs:
+            if item in INTEGRATION_GROUP:
+                if item in counted:
+                    continue
+                counted.add(item)
+                mentions[item] = mentions.get(item, 0) + 1
+                if requested:
+                    requests[item] = requests.get(item, 0) + 1
+            elif category == INTEGRATION_CATEGORY:
+                unrecognized[item] = unrecognized.get(item, 0) + 1
+
+    def _sum(self, attribute: str, days: Iterable[str]) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for day_key in days:
+            day = self._days.get(day_key)
+            if day is None:
+                continue
+            # list() copies atomically, so an ingest adding an integration can't break the walk
+            for name, count in list(getattr(day, attribute).items()):
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def mentions(self, days: Iterable[str]) -> Dict[str, int]:
+        """Events naming each integration over `days` ("YYYY-MM-DD" labels)"""
+        return self._sum("mentions", days)
+
+    def requests(self, days: Iterable[str]) -> Dict[str, int]:
+        """Of those, events with the requested_integration intent"""
+        return self._sum("requests", days)
+
+    def unrecognized(self, days: Iterable[str]) -> Dict[str, int]:
+        """Events filing each non-standard item under the integration category"""
+        return self._sum("unrecognized", days)
+
+    def daily(self, days: Iterable[str]) -> List[Tuple[Dict[str, int], Dict[str, int]]]:
+        """(mentions, requests) for each of `days`"""
+        return [(self.mentions((day,)), self.requests((day,))) for day in days]
+
+    def stats(self) -> dict:
+        return {"days": len(self._days), "parsed_subcategories": parse_subcategory.cache_info().currsize}
@@ -0,0 +1,186 @@
+"""
+Live feed of newly ingested HITL events, as Server-Sent Events.
+
+LiveFeed is attached to the store (see EventStore.attach) and fans each new
+event out to the connected dashboards:
+
+- One broadcaster. add() runs on the ingest thread and only queues the doc
+  id and its labels; a flush scheduled on the event loop hands the queued
+  events to subscribers
+- Subscribers with the same filters and payload shape share a channel. A
+  flush matches and encodes each event once per channel, and every
+  subscriber in the channel queues the same bytes
+- Each subscriber has a bounded queue. A consumer that falls behind loses
+  its oldest queued events, and the stream tells it how many were dropped
+  (a "dropped" event) so it can refetch instead of replaying a backlog.
+  Whatever is queued goes out as one write, so a slow consumer gets fewer,
+  larger writes rather than a write per event
+- A comment line is sent after HEARTBEAT_SECONDS without events, which
+  keeps proxies from closing idle streams and finds disconnected clients
+
+Events are sent as `data: <event JSON>` messages. There is no resume from an
+event id: a client that reconnects refetches the first page instead.
+"""
+
+import asyncio
+from collections import deque
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+from fast_responses import dumps
+
+QUEUE_MESSAGES = 256
+HEARTBEAT_SECONDS = 15.0
+MAX_SUBSCRIBERS = 1000
+RETRY_MILLIS = 3000
+
+
+def _labels(values) -> FrozenSet[str]:
+    return frozenset(value for value in values if isinstance(value, str)) if isinstance(values, list) else frozenset()
+
+
+class _Channel:
+    __slots__ = ("sentiments", "intents", "render", "subscribers")
+
+    def __init__(self, sentiments: FrozenSet[str], intents: FrozenSet[str], render: Callable[[List[dict]], List[dict]]):
+        self.sentiments = sentiments
+        self.intents = intents
+        # Stored events -> the payloads this channel sends
+        self.render = render
+        self.subscribers: set = set()
+
+    def matches(self, sentiments: FrozenSet[str], intents: FrozenSet[str]) -> bool:
+        return (not self.sentiments or not self.sentiments.isdisjoint(sentiments)) and \
+            (not self.intents or not self.intents.isdisjoint(intents))
+
+
+class Subscriber:
+    """One connected client: a bounded queue of encoded messages"""
+
+    def __init__(self, feed: "LiveFeed", key: tuple, queue_messages: int):
+        self._feed = feed
+        self.key = key
+        self._queue: deque = deque(maxlen=queue_messages)
+        self._wake = asyncio.Event()
+        # Messages dropped since the last write
+        self.dropped = 0
+
+    def push(self, messages: List[bytes]):
+        overflow = len(self._queue) + len(messages) - self._queue.maxlen
+        if overflow > 0:
+            self.dropped += overflow
+            self._feed.counters["dropped"] += overflow
+        self._queue.extend(messages)
+        self._wake.set()
+
+    async def stream(self):
+        """The SSE body; unsubscribes when the client goes away"""
+        try:
+            yield b"retry: %d\n\n" % RETRY_MILLIS
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self._feed.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                self._wake.clear()
+                chunk = []
+                if self.dropped:
+                    chunk.append(b'event: dropped\ndata: {"dropped":%d}\n\n' % self.dropped)
+                    self.dropped = 0
+                queue = self._queue
+                while queue:
+                    chunk.append(queue.popleft())
+                self._feed.counters["sent"] += len(chunk)
+                yield b"".join(chunk)
+        finally:
+            self._feed.unsubscribe(self)
+
+
+class LiveFeed:
+    """Broadcasts events added to the store to subscribers, filtered by sentiment and intent"""
+
+    def __init__(
+        self,
+        doc: Callable[[int], dict],
+        queue_messages: int = QUEUE_MESSAGES,
+        heartbeat: float = HEARTBEAT_SECONDS,
+        max_subscribers: int = MAX_SUBSCRIBERS,
+    ):
+        self._doc = doc
+        self.queue_messages = queue_messages
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._channels: Dict[tuple, _Channel] = {}
+        self._subscribers = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (doc, sentiments, intents) added since the last flush
+        self._pending: deque = deque()
+        self._scheduled = False
+        self.counters = dict.fromkeys(("events", "flushes", "sent", "dropped"), 0)
+
+    def add(self, doc: int, event: dict):
+        if not self._channels:
+            return
+        self._pending.append((doc, _labels(event.get("user_sentiment")), _labels(event.get("user_intent"))))
+        # One flush per burst: later events join the queue until it runs
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._flush)
+
+    def subscribe(
+        self,
+        sentiments: FrozenSet[str],
+        intents: FrozenSet[str],
+        shape_key: tuple,
+        render: Callable[[List[dict]], List[dict]],
+    ) -> Optional[Subscriber]:
+        """
+        A subscriber for new events with any of `sentiments` and any of
+        `intents` (empty: no filter), sent as `render` shapes them. Subscribers
+        with the same filters and `shape_key` share a channel. Returns None
+        once max_subscribers are connected. Call from the event loop.
+        """
+        if self._subscribers >= self.max_subscribers:
+            return None
+        self._loop = asyncio.get_running_loop()
+        key = (sentiments, intents, shape_key)
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = _Channel(sentiments, intents, render)
+        subscriber = Subscriber(self, key, self.queue_messages)
+        channel.subscribers.add(subscriber)
+        self._subscribers += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        channel = self._channels.get(subscriber.key)
+        if channel is None or subscriber not in channel.subscribers:
+            return
+        channel.subscribers.discard(subscriber)
+        self._subscribers -= 1
+        if not channel.subscribers:
+            del self._channels[subscriber.key]
+
+    def _flush(self):
+        # Cleared before draining, so an event queued after the drain schedules another flush
+        self._scheduled = False
+        pending = self._pending
+        batch = []
+        while pending:
+            batch.append(pending.popleft())
+        if not batch:
+            return
+        self.counters["events"] += len(batch)
+        self.counters["flushes"] += 1
+        stored: Dict[int, dict] = {}
+        for channel in list(self._channels.values()):
+            docs = [doc for doc, sentiments, intents in batch if channel.matches(sentiments, intents)]
+            if not docs:
+                continue
+            events = [stored[doc] if doc in stored else stored.setdefault(doc, self._doc(doc)) for doc in docs]
+            messages = [b"data: %s\n\n" % dumps(event) for event in channel.render(events)]
+            for subscriber in list(channel.subscribers):
+                subscriber.push(messages)
+
+    def stats(self) -> dict:
+        return {**self.counters, "subscribers": self._subscribers, "channels": len(self._channels)}
@@ -0,0 +1,369 @@
+"""
+Prometheus metrics and an opt-in sampling profiler.
+
+MetricsMiddleware is plain ASGI middleware and the outermost layer, so it
+times every request as the client sees it, response cache hits and
+compression included. Per request it records:
+
+- oracle_http_requests_total{method, route, status}
+- oracle_http_request_duration_seconds{method, route}, a histogram over
+  LATENCY_BUCKETS
+- oracle_http_response_bytes_total{method, route}: body bytes sent, after
+  compression
+- oracle_http_results{route}, a histogram of the number of records
+  (events, sessions, users, tools) an endpoint returned, which endpoints
+  report through record_results(); responses served from the response
+  cache are not counted, as the endpoint does not run
+
+Routes are labelled by their template ("/api/hitl-events/{sentiment}"), so
+ids in paths do not create new series; paths no route matches are "other".
+The per-request cost is two clock reads, a dict lookup for the route
+template, a bisect into the bucket bounds and a few additions. The
+middleware runs on the event loop thread, so nothing is locked.
+
+monitor_loop_lag() sleeps LAG_INTERVAL_SECONDS at a time and records how
+late each wake-up is, as oracle_event_loop_lag_seconds: the time the loop
+was blocked by something not awaiting.
+
+Components export gauges and counters from their stats() at scrape time
+(Metrics.register_stats), so ingest and reads pay nothing for them.
+
+SamplingProfiler is off until switched on (POST /api/debug/profiler).
+While on, a thread samples the stack of every busy thread each interval;
+a request slower than the threshold keeps the samples taken while it ran,
+folded into "outer;...;inner count" stacks that flame graph tools read.
+Samples cover every thread, since a slow request is as often slowed by
+other work on the loop as by its own.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.routing import Match
+
+# Request latency bucket upper bounds, seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Records returned per request
+RESULT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 250, 500, 1000, 5000)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LAG_INTERVAL_SECONDS = 0.1
+
+# Route templates memoised per (method, path); cleared when full, since ids in paths are unbounded
+ROUTE_CACHE_SIZE = 10_000
+
+# Per-request list that record_results() appends to; None outside a request
+_RESULTS: ContextVar[Optional[list]] = ContextVar("oracle_results", default=None)
+
+
+def record_results(count: int):
+    """Report how many records the current request returns, for oracle_http_results"""
+    results = _RESULTS.get()
+    if results is not None:
+        results.append(count)
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # counts[i]: observations in (bounds[i - 1], bounds[i]]; the last one is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Family:
+    """One metric name: a counter, gauge or histogram per label value tuple"""
+
+    def __init__(self, name: str, kind: str, description: str, labels: Tuple[str, ...] = (), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.values: Dict[tuple, object] = {}
+
+    def inc(self, key: tuple, amount=1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, key: tuple, value):
+        self.values[key] = value
+
+    def observe(self, key: tuple, value: float):
+        histogram = self.values.get(key)
+        if histogram is None:
+            histogram = self.values[key] = _Histogram(self.buckets)
+        histogram.observe(value)
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.description}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        # list() copies atomically, so series added meanwhile can't break the walk
+        for key, value in sorted(list(self.values.items()), key=lambda item: tuple(map(str, item[0]))):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (None,), list(value.counts)):
+                cumulative += count
+                le = "+Inf" if bound is None else _number(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(value.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+
+
+class Metrics:
+    """Metric families plus the stats() readers sampled at scrape time"""
+
+    def __init__(self):
+        self.requests = _Family("oracle_http_requests_total", "counter", "Requests served", ("method", "route", "status"))
+        self.duration = _Family(
+            "oracle_http_request_duration_seconds", "histogram", "Request latency, first byte received to last byte sent",
+            ("method", "route"), LATENCY_BUCKETS,
+        )
+        self.response_bytes = _Family(
+            "oracle_http_response_bytes_total", "counter", "Response body bytes sent, after compression", ("method", "route"),
+        )
+        self.results = _Family(
+            "oracle_http_results", "histogram", "Records returned per request", ("route",), RESULT_BUCKETS,
+        )
+        self.loop_lag = _Family(
+            "oracle_event_loop_lag_seconds", "histogram", "How late the event loop woke from a timed sleep", (), LAG_BUCKETS,
+        )
+        self._families = [self.requests, self.duration, self.response_bytes, self.results, self.loop_lag]
+        self._collectors: List[Callable[[], Iterable[_Family]]] = []
+
+    def register_stats(
+        self, prefix: str, stats: Callable[[], dict], description: str,
+        counters: Iterable[str] = (), gauges: Iterable[str] = (),
+    ):
+        """
+        Export keys of `stats()` as `prefix_key_total` counters and `prefix_key`
+        gauges, read at every scrape; keys missing from a reading are skipped
+        """
+        counters, gauges = tuple(counters), tuple(gauges)
+
+        def collect() -> Iterable[_Family]:
+            values = stats()
+            for keys, kind, suffix in ((counters, "counter", "_total"), (gauges, "gauge", "")):
+                for key in keys:
+                    value = values.get(key)
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        family = _Family(f"{prefix}_{key}{suffix}", kind, f"{description}: {key}")
+                        family.set((), value)
+                        yield family
+
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """The Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        for family in self._families:
+            family.render(lines)
+        for collect in self._collectors:
+            for family in collect():
+                family.render(lines)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Per-route request counts, latency, response bytes and result counts; add it last so it is outermost"""
+
+    def __init__(self, app, metrics: Metrics, router, profiler: Optional["SamplingProfiler"] = None):
+        self.app = app
+        self.metrics = metrics
+        self.router = router
+        self.profiler = profiler
+        self._routes: Dict[Tuple[str, str], str] = {}
+
+    def _route(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        route = self._routes.get(key)
+        if route is None:
+            route = "other"
+            for candidate in self.router.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    route = candidate.path
+                    break
+                # Right path, other method: keep looking for a full match
+                if match == Match.PARTIAL and route == "other":
+                    route = candidate.path
+            if len(self._routes) >= ROUTE_CACHE_SIZE:
+                self._routes.clear()
+            self._routes[key] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+        sent = [0]
+        results = []
+        token = _RESULTS.set(results)
+
+        async def measure(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                sent[0] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, measure)
+        finally:
+            _RESULTS.reset(token)
+            elapsed = time.perf_counter() - started
+            metrics = self.metrics
+            method = scope["method"]
+            route = self._route(scope)
+            metrics.requests.inc((method, route, status[0]))
+            metrics.duration.observe((method, route), elapsed)
+            metrics.response_bytes.inc((method, route), sent[0])
+            if results:
+                metrics.results.observe((route,), results[-1])
+            profiler = self.profiler
+            if profiler is not None and profiler.enabled and elapsed >= profiler.slow_seconds:
+                profiler.capture(method, scope["path"], started, elapsed)
+
+
+async def monitor_loop_lag(metrics: Metrics, interval: float = LAG_INTERVAL_SECONDS):
+    """Record event-loop wake-up lateness until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        began = loop.time()
+        await asyncio.sleep(interval)
+        metrics.loop_lag.observe((), max(loop.time() - began - interval, 0.0))
+
+
+# Innermost frames of threads that are waiting, not working: the loop in
+# select(), pool workers waiting for a job. Their samples are dropped
+_IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait"), ("thread.py", "_worker"), ("queue.py", "get")}
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples busy threads' stacks every `interval_seconds` while enabled, and
+    keeps the folded stacks sampled during the `keep` latest requests slower
+    than `slow_seconds`
+    """
+
+    def __init__(self, max_samples: int = 100_000, keep: int = 20):
+        self.enabled = False
+        self.interval_seconds = 0.005
+        self.slow_seconds = 0.5
+        self.samples_taken = 0
+        # (perf_counter, thread name, code objects innermost first)
+        self._samples: deque = deque(maxlen=max_samples)
+        self._samples_lock = threading.Lock()
+        self._captures: deque = deque(maxlen=keep)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._control = threading.Lock()
+
+    def start(self, interval_seconds: Optional[float] = None, slow_seconds: Optional[float] = None):
+        with self._control:
+            if interval_seconds is not None:
+                self.interval_seconds = interval_seconds
+            if slow_seconds is not None:
+                self.slow_seconds = slow_seconds
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+            self.enabled = True
+
+    def stop(self):
+        with self._control:
+            self.enabled = False
+            if self._thread is not None:
+                self._stop.set()
+                self._thread.join()
+                self._thread = None
+            with self._samples_lock:
+                self._samples.clear()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            taken = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                taken.append((now, names.get(ident, str(ident)), tuple(codes)))
+            with self._samples_lock:
+                self._samples.extend(taken)
+            self.samples_taken += len(taken)
+
+    def capture(self, method: str, path: str, started: float, elapsed: float):
+        """Keep the samples taken between `started` and `started + elapsed` (perf_counter seconds)"""
+        with self._samples_lock:
+            window = []
+            for sample in reversed(self._samples):
+                if sample[0] < started:
+                    break
+                window.append(sample)
+        stacks: Dict[str, int] = {}
+        for _, thread, codes in window:
+            folded = ";".join([thread] + [_frame_label(code) for code in reversed(codes)])
+            stacks[folded] = stacks.get(folded, 0) + 1
+        self._captures.append({
+            "method": method,
+            "path": path,
+            "at": time.time() - (time.perf_counter() - started),
+            "duration_ms": round(elapsed * 1000, 2),
+            "samples": len(window),
+            "stacks": [
+                {"stack": stack, "count": count}
+                for stack, count in sorted(stacks.items(), key=lambda item: -item[1])[:100]
+            ],
+        })
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval_ms": self.interval_seconds * 1000,
+            "slow_ms": self.slow_seconds * 1000,
+            "samples_taken": self.samples_taken,
+            "captures": list(self._captures),
+        }
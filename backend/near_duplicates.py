@@ -0,0 +1,323 @@
+"""
+Near-duplicate user messages: MinHash signatures with LSH banding.
+
+Each event's user_curr_message is normalised as for search (case-folded,
+accents stripped, punctuation dropped) and cut into overlapping 5-character
+shingles. Two messages' similarity is the Jaccard similarity of their
+shingle sets, which MinHash estimates without comparing texts:
+
+- a signature is SIGNATURE_SIZE minimums, computed with one hash per
+  shingle (one-permutation hashing): the hash's low bits pick a bin and
+  each bin keeps the smallest of the rest. The hash is the shingle's
+  crc32 spread by a Fibonacci multiply, so signatures don't depend on the
+  process (str hash() is salted per process) and stay cheap to compute. A bin no shingle fell in (most
+  of them, for a short message) copies the first filled bin along its own
+  fixed, random probe order. Two messages' signatures agree at each
+  position with probability equal to their Jaccard similarity, as with
+  SIGNATURE_SIZE separate hash functions, at a 40th of the cost in Python
+- LSH splits the signature into BANDS bands of ROWS values. Messages with
+  an identical band land in the same bucket, and only messages sharing a
+  bucket are ever compared. A pair with similarity s shares a bucket with
+  probability 1 - (1 - s^ROWS)^BANDS: 0.64 at 0.5, 0.89 at 0.6, 0.99 at 0.7
+  and above, with the steepest rise at (1 / BANDS)^(1 / ROWS) = 0.5
+
+Events with the same normalised message (keyed by its blake2b digest)
+share one signature and one entry per band, so repeated complaints
+("still not working") cost a doc id each.
+Signatures keep the low 16 bits of each minimum, in one flat array: two
+different minimums then agree by chance once in 65,536 positions. Each
+band is a sorted array of (32-bit band hash, text id) pairs, 8 bytes per
+message, with the messages added since the last MERGE_EVERY in a dict
+until they are merged into it.
+
+Clustering a selection of events looks each message up in its BANDS
+buckets, checks every bucket once (each member against the bucket's first
+member in the selection, by signature agreement) and joins the pairs that
+reach the threshold with union-find. The work grows with the number of
+selected messages times BANDS, not with their square.
+"""
+
+import operator
+import random
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from zlib import crc32
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from search_index import tokenize
+
+SIMILARITY_FIELD = "user_curr_message"
+SHINGLE_CHARS = 5
+# Only the start of long messages (pasted logs and code) is shingled
+MAX_SHINGLED_CHARS = 2000
+
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+# New messages per merge of the bands' recent entries into their sorted arrays
+MERGE_EVERY = 8192
+
+# Estimated Jaccard similarity for two messages to count as near duplicates
+DEFAULT_THRESHOLD = 0.6
+
+_HASH_BITS = 0xFFFFFFFFFFFFFFFF
+# 2^64 / golden ratio: multiplying spreads crc32's bits over the product's high half
+_MIX = 0x9E3779B97F4A7C15
+_BIN_BITS = (SIGNATURE_SIZE - 1).bit_length()
+_VALUE_BITS = 0xFFFF
+_KEY_BITS = 0xFFFFFFFF
+
+
+def _probe_orders(seed: int = 2375) -> Tuple[Tuple[int, ...], ...]:
+    """Per bin, every other bin in a random order, for filling the bin when it is empty"""
+    rng = random.Random(seed)
+    orders = []
+    for slot in range(SIGNATURE_SIZE):
+        others = [other for other in range(SIGNATURE_SIZE) if other != slot]
+        rng.shuffle(others)
+        orders.append(tuple(others))
+    return tuple(orders)
+
+
+_PROBES = _probe_orders()
+_NO_TEXT = -1
+
+
+def normalize(text: Optional[str]) -> str:
+    """A message's normalised words (as for search), from its first MAX_SHINGLED_CHARS characters"""
+    return " ".join(tokenize(text[:MAX_SHINGLED_CHARS] if text else text))
+
+
+def _shingles(words: str) -> set:
+    if len(words) <= SHINGLE_CHARS:
+        return {words} if words else set()
+    return {words[i:i + SHINGLE_CHARS] for i in range(len(words) - SHINGLE_CHARS + 1)}
+
+
+def shingles(text: Optional[str]) -> set:
+    """The 5-character shingles of a message's normalised words; a shorter message is its own shingle"""
+    return _shingles(normalize(text))
+
+
+def signature(shingle_set: Iterable[str]) -> List[int]:
+    """MinHash signature of a non-empty shingle set: SIGNATURE_SIZE 16-bit values"""
+    bins: List[Optional[int]] = [None] * SIGNATURE_SIZE
+    for value in map(crc32, map(str.encode, shingle_set)):
+        value = (value * _MIX & _HASH_BITS) >> 32
+        slot = value & (SIGNATURE_SIZE - 1)
+        value >>= _BIN_BITS
+        current = bins[slot]
+        if current is None or value < current:
+            bins[slot] = value
+    if None in bins:
+        filled = bins[:]
+        for slot, value in enumerate(filled):
+            if value is None:
+                for probe in _PROBES[slot]:
+                    if filled[probe] is not None:
+                        bins[slot] = filled[probe]
+                        break
+    return [value & _VALUE_BITS for value in bins]
+
+
+class _UnionFind:
+    __slots__ = ("parent",)
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, item: int) -> int:
+        parent = self.parent
+        root = item
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while item != root:
+            following = parent[item]
+            parent[item] = root
+            item = following
+        return root
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+class NearDuplicateIndex:
+    """MinHash / LSH index of user_curr_message, fed by EventStore.attach (through a BackgroundIndex)"""
+
+    def __init__(self, field: str = SIMILARITY_FIELD):
+        self.field = field
+        # doc -> text id (one per distinct normalised message), _NO_TEXT without one
+        self._text_of_doc = array("i")
+        # text id -> its doc, or a list of docs once it has several
+        self._docs_of_text: List[object] = []
+        # blake2b digest of the normalised message -> text id
+        self._text_ids: Dict[bytes, int] = {}
+        # SIGNATURE_SIZE values per text id
+        self._signatures = array("H")
+        # per band: sorted band key << 32 | text id, for the text ids up to the last merge
+        self._merged: List[array] = [array("Q") for _ in range(BANDS)]
+        # per band: band key -> text id, or a list of text ids, for the text ids since
+        self._recent: List[Dict[int, object]] = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._text_of_doc)
+
+    def add(self, doc: int, event: dict):
+        text = event.get(self.field)
+        words = normalize(text) if isinstance(text, str) else ""
+        text_id = _NO_TEXT
+        if words:
+            key = blake2b(words.encode(), digest_size=16).digest()
+            text_id = self._text_ids.get(key, _NO_TEXT)
+            if text_id == _NO_TEXT:
+                text_id = self._add_text(key, signature(_shingles(words)), doc)
+            else:
+                docs = self._docs_of_text[text_id]
+                if isinstance(docs, list):
+                    docs.append(doc)
+                else:
+                    self._docs_of_text[text_id] = [docs, doc]
+        while len(self._text_of_doc) < doc:
+            self._text_of_doc.append(_NO_TEXT)
+        # Set last, so readers only ever see complete entries
+        if len(self._text_of_doc) == doc:
+            self._text_of_doc.append(text_id)
+        else:
+            self._text_of_doc[doc] = text_id
+
+    def _add_text(self, key: bytes, values: List[int], doc: int) -> int:
+        text_id = len(self._docs_of_text)
+        self._signatures.extend(values)
+        self._docs_of_text.append(doc)
+        for band, buckets in zip(self._band_keys(values), self._recent):
+            bucket = buckets.get(band)
+            if bucket is None:
+                buckets[band] = text_id
+            elif isinstance(bucket, list):
+                bucket.append(text_id)
+            else:
+                buckets[band] = [bucket, text_id]
+        self._text_ids[key] = text_id
+        if (text_id + 1) % MERGE_EVERY == 0:
+            self._merge()
+        return text_id
+
+    def _merge(self):
+        """Move every band's recent entries into its sorted array"""
+        for band, recent in enumerate(self._recent):
+            entries = list(self._merged[band])
+            for key, bucket in recent.items():
+                if isinstance(bucket, list):
+                    entries.extend(key << 32 | text_id for text_id in bucket)
+                else:
+                    entries.append(key << 32 | bucket)
+            # Two sorted runs: the sort merges them in linear time
+            entries.sort()
+            # The array before the dict: a reader between the two finds entries twice, never not at all
+            self._merged[band] = array("Q", entries)
+            self._recent[band] = {}
+
+    @staticmethod
+    def _band_keys(values) -> List[int]:
+        """Each band's crc32 (stable across processes, unlike hash() of a tuple)"""
+        values = array("H", values)
+        return [crc32(values[start:start + ROWS]) for start in range(0, SIGNATURE_SIZE, ROWS)]
+
+    def _bucket(self, band: int, key: int) -> List[int]:
+        """Text ids whose band `band` hashes to `key`"""
+        recent = self._recent[band].get(key)
+        merged = self._merged[band]
+        found = []
+        i = bisect_left(merged, key << 32)
+        while i < len(merged) and merged[i] >> 32 == key:
+            found.append(merged[i] & _KEY_BITS)
+            i += 1
+        if isinstance(recent, list):
+            found.extend(recent)
+        elif recent is not None:
+            found.append(recent)
+        return found
+
+    def _signature(self, text_id: int) -> array:
+        return self._signatures[text_id * SIGNATURE_SIZE:(text_id + 1) * SIGNATURE_SIZE]
+
+    def _docs(self, text_id: int) -> List[int]:
+        docs = self._docs_of_text[text_id]
+        return list(docs) if isinstance(docs, list) else [docs]
+
+    def _text_id(self, doc: int) -> int:
+        return self._text_of_doc[doc] if 0 <= doc < len(self._text_of_doc) else _NO_TEXT
+
+    def _candidates(self, values) -> set:
+        """Text ids sharing at least one band with a signature"""
+        found = set()
+        for band, key in enumerate(self._band_keys(values)):
+            found.update(self._bucket(band, key))
+        return found
+
+    def similarity(self, a: int, b: int) -> float:
+        """Estimated Jaccard similarity of two docs' messages (0.0 when either has none or isn't indexed yet)"""
+        first, second = self._text_id(a), self._text_id(b)
+        if first == _NO_TEXT or second == _NO_TEXT:
+            return 0.0
+        if first == second:
+            return 1.0
+        return sum(map(operator.eq, self._signature(first), self._signature(second))) / SIGNATURE_SIZE
+
+    def similar(self, doc: int, threshold: float = DEFAULT_THRESHOLD, limit: int = 20) -> List[Tuple[int, float]]:
+        """Up to `limit` (doc, estimated similarity) pairs for `doc`'s near duplicates, most similar first, then newest"""
+        text_id = self._text_id(doc)
+        if text_id == _NO_TEXT:
+            return []
+        own = self._signature(text_id)
+        found = []
+        for other in self._candidates(own):
+            if other == text_id:
+                score = 1.0
+            else:
+                score = sum(map(operator.eq, own, self._signature(other))) / SIGNATURE_SIZE
+                if score < threshold:
+                    continue
+            found.extend((match, score) for match in self._docs(other) if match != doc)
+        found.sort(key=lambda item: (-item[1], -item[0]))
+        return found[:limit]
+
+    def clusters(self, docs: Iterable[int], threshold: float = DEFAULT_THRESHOLD, min_size: int = 2) -> List[List[int]]:
+        """
+        Groups of near-duplicate docs among `docs`, largest first: each a list
+        of doc ids in the order of `docs`. Groups under `min_size` docs are left out
+        """
+        text_ids = [(doc, self._text_id(doc)) for doc in docs]
+        selected = dict.fromkeys(text_id for _, text_id in text_ids if text_id != _NO_TEXT)
+        groups = _UnionFind()
+        checked = set()
+        for text_id in selected:
+            values = self._signature(text_id)
+            for band, key in enumerate(self._band_keys(values)):
+                if (band, key) in checked:
+                    continue
+                checked.add((band, key))
+                members = [member for member in dict.fromkeys(self._bucket(band, key)) if member in selected]
+                if len(members) < 2:
+                    continue
+                head = values if members[0] == text_id else self._signature(members[0])
+                for member in members[1:]:
+                    agreement = sum(map(operator.eq, head, self._signature(member))) / SIGNATURE_SIZE
+                    if agreement >= threshold:
+                        groups.union(members[0], member)
+        merged: Dict[int, List[int]] = {}
+        for doc, text_id in text_ids:
+            if text_id != _NO_TEXT:
+                merged.setdefault(groups.find(text_id), []).append(doc)
+        found = [group for group in merged.values() if len(group) >= min_size]
+        found.sort(key=len, reverse=True)
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "indexed": len(self._text_of_doc),
+            "distinct_messages": len(self._docs_of_text),
+        }
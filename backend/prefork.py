@@ -0,0 +1,219 @@
+"""
+Multi-worker serving of one preloaded, shared dataset.
+
+    python prefork.py --workers 4 --preload events.ndjson --preload-trajectories steps.ndjson
+
+The parent process imports the app, which builds the event store and its
+indexes, loads the --preload files into them through the ingest
+validators, waits for the background indexes to catch up, and only then binds
+the port and forks the workers. Every worker serves from the parent's
+memory, copy-on-write:
+
+- the event columns are arrays of machine integers (see event_columns.py),
+  which reads never write to, so their pages stay shared
+- gc.freeze() moves every object built so far out of the collector's
+  generations. A worker's collections then never walk (and write the GC
+  headers of) the dataset's objects, which would copy every page holding
+  one. Only pages whose objects a request touches, and so increfs, get
+  copied
+- with ORACLE_DATA_SOURCE=segments the segment files are memory-mapped
+  read-only, so the workers share the page cache
+- the data source releases what must not cross a fork (SQLite closes its
+  connections) before the first fork, and each worker reopens it
+
+The workers accept on the one listening socket, and the kernel spreads
+connections over them. A worker that dies is forked again from the
+loaded parent, without reloading anything. SIGINT / SIGTERM stop them all.
+
+Ingest would reach one worker only, so the workers are read-only:
+POST /api/ingest/* returns 409. Response caches and /api/metrics are per
+worker. Tool usage shards stay in-process (ORACLE_TOOL_USAGE_PROCESSES is
+forced to 0): the workers are already separate processes.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Dict, Iterator, List
+
+import uvicorn
+
+# Lines per validated batch when preloading NDJSON
+PRELOAD_BATCH_LINES = 10_000
+
+# A worker that exits sooner than this after its fork is restarted after a
+# pause, so a worker that cannot start doesn't fork in a tight loop
+MIN_WORKER_SECONDS = 1.0
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def _batches(path: str, parse_ndjson: Callable, parse_json: Callable) -> Iterator[List[dict]]:
+    """Validated records of a JSON array file (*.json) or an NDJSON file, a batch at a time"""
+    from ingest import IngestError
+
+    if path.endswith(".json"):
+        with open(path, "rb") as f:
+            body = f.read()
+        chunks = [(1, body, parse_json)]
+    else:
+        chunks = _ndjson_chunks(path, parse_ndjson)
+    for first_line, body, parse in chunks:
+        try:
+            yield parse(body)
+        except IngestError as e:
+            where = f"{path}, from line {first_line}" if parse is parse_ndjson else path
+            raise SystemExit(f"Invalid records in {where}: {e.errors[:3]}")
+
+
+def _ndjson_chunks(path: str, parse: Callable):
+    with open(path, "rb") as f:
+        first_line = 1
+        while True:
+            lines = f.readlines(PRELOAD_BATCH_LINES * 1024)
+            if not lines:
+                return
+            yield first_line, b"".join(lines), parse
+            first_line += len(lines)
+
+
+def preload_events(path: str) -> int:
+    """Add the events of `path` to the store (and to a SQLite or segment data source); returns the new ones"""
+    import server
+    from ingest import parse_json_batch, parse_ndjson_batch
+
+    inserted = 0
+    for events in _batches(path, parse_ndjson_batch, parse_json_batch):
+        inserted += server.EVENT_STORE.add_many(events)
+        if hasattr(server.DATA_SOURCE, "insert_many_sync"):
+            server.DATA_SOURCE.insert_many_sync(events)
+    return inserted
+
+
+def preload_trajectories(path: str) -> int:
+    """Add the trajectory steps of `path` to the tool usage engine; returns the new ones"""
+    import server
+    from ingest import parse_json_steps, parse_ndjson_steps
+
+    return sum(server.TOOL_USAGE.add_many(steps) for steps in _batches(path, parse_ndjson_steps, parse_json_steps))
+
+
+def load(event_paths: List[str], trajectory_paths: List[str]):
+    """Import the app and build its dataset, ready to fork"""
+    # Collections during the load would only walk objects that all live on
+    gc.disable()
+    os.environ["ORACLE_TOOL_USAGE_PROCESSES"] = "0"
+    import server
+
+    source = server.DATA_SOURCE
+    if source.kind == "sqlite" and "mode=memory" in getattr(source, "database", ""):
+        raise SystemExit("An in-memory SQLite database can't be shared by workers: set ORACLE_SQLITE_PATH to a file")
+    began = time.perf_counter()
+    for path in event_paths:
+        logger.info("Preloaded %d events from %s", preload_events(path), path)
+    for path in trajectory_paths:
+        logger.info("Preloaded %d trajectory steps from %s", preload_trajectories(path), path)
+    # The indexers' threads are not forked; nothing is left for them to do
+    server.SEARCH_INDEXER.wait()
+    server.NEAR_DUPLICATE_INDEXER.wait()
+    server.RESPONSE_CACHE.invalidate()
+    server.DATA_SOURCE.before_fork()
+    server.READ_ONLY = True
+    logger.info("Dataset ready: %d events, %d steps in %.1fs",
+                len(server.EVENT_STORE), server.TOOL_USAGE.steps, time.perf_counter() - began)
+    gc.collect()
+    gc.freeze()
+    return server
+
+
+def _serve(config: uvicorn.Config, sock: socket.socket, index: int):
+    """Worker process: serve the inherited app on the inherited socket until signalled"""
+    import server
+
+    server.WORKER = index
+    server.DATA_SOURCE.after_fork()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gc.enable()
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run(workers: int, host: str, port: int, event_paths=(), trajectory_paths=(), log_level: str = "info"):
+    """Load the dataset, then fork `workers` processes serving it on host:port until SIGINT / SIGTERM"""
+    # Configures logging too; the workers import "server:app" from the modules loaded here
+    config = uvicorn.Config("server:app", host=host, port=port, log_level=log_level)
+    load(list(event_paths), list(trajectory_paths))
+    sock = config.bind_socket()
+    sock.set_inheritable(True)
+
+    children: Dict[int, tuple] = {}  # pid -> (worker index, fork time)
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _serve(config, sock, index)
+            except BaseException:
+                logger.exception("Worker %d failed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for index in range(workers):
+        spawn(index)
+    logger.info("Started %d workers (pids %s)", workers, ", ".join(map(str, children)))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, started = children.pop(pid, (None, 0.0))
+        if index is None or stopping:
+            continue
+        logger.warning("Worker %d (pid %d) exited with status %d; restarting it", index, pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < MIN_WORKER_SECONDS:
+            time.sleep(MIN_WORKER_SECONDS)
+        if not stopping:
+            spawn(index)
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ORACLE_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--preload", action="append", default=[], metavar="PATH",
+                        help="Events to load before forking, NDJSON or a JSON array (*.json); repeatable")
+    parser.add_argument("--preload-trajectories", action="append", default=[], metavar="PATH",
+                        help="Trajectory steps for /api/tool-usage, likewise")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    run(args.workers, args.host, args.port, args.preload, args.preload_trajectories, args.log_level)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
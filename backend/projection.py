@@ -0,0 +1,112 @@
+"""
+Field projection and message previews for list responses.
+
+`fields=` keeps only the named fields of each event. request_id and
+event_timestamp are always kept, because clients need them as keys and
+cursors, and so is a search `score`.
+
+`preview_chars=` cuts the long message fields to about that many characters,
+at a word boundary, with an ellipsis. The preview cut points are computed
+once at ingest by PreviewIndex (attached to the event store) for the
+default PREVIEW_CHARS, and stored as one array('I') offset per event and
+field. A list response then costs one slice per message instead of a scan
+for a word boundary, and no preview strings are kept in memory. Other
+preview sizes are cut on request.
+"""
+
+from array import array
+from typing import Iterable, List, Optional, Sequence
+
+PREVIEW_FIELDS = ("user_curr_message", "agent_prev_message")
+
+# Preview size the UI asks for; cut points for it are precomputed at ingest
+PREVIEW_CHARS = 320
+
+MAX_PREVIEW_CHARS = 10_000
+
+ELLIPSIS = "…"
+
+# Fields every projected event keeps (when present)
+ALWAYS_FIELDS = ("request_id", "event_timestamp", "score")
+
+_WHITESPACE = " \n\t\r"
+
+
+def preview_cut(text: str, chars: int) -> int:
+    """
+    Offset to cut `text` at for a preview of at most `chars` characters:
+    len(text) when it already fits, otherwise the last word boundary in the
+    final 40% of the window (a hard cut when there is none).
+    """
+    if len(text) <= chars:
+        return len(text)
+    cut = chars
+    for i in range(chars, int(chars * 0.6), -1):
+        if text[i] in _WHITESPACE:
+            cut = i
+            break
+    while cut > 0 and text[cut - 1] in _WHITESPACE:
+        cut -= 1
+    return cut
+
+
+def parse_fields(values: Optional[Sequence[str]]) -> Optional[List[str]]:
+    """`fields` query values (repeated and/or comma-separated) -> field names, or None for all fields"""
+    if not values:
+        return None
+    fields = [name.strip() for value in values for name in value.split(",") if name.strip()]
+    return list(dict.fromkeys(ALWAYS_FIELDS + tuple(fields)))
+
+
+class PreviewIndex:
+    """Precomputed PREVIEW_CHARS cut points for the PREVIEW_FIELDS of every stored event"""
+
+    def __init__(self, fields: Iterable[str] = PREVIEW_FIELDS, chars: int = PREVIEW_CHARS):
+        self.fields = tuple(fields)
+        self.chars = chars
+        self._cuts = {field: array("I") for field in self.fields}
+
+    def add(self, doc: int, event: dict):
+        for field in self.fields:
+            cuts = self._cuts[field]
+            if len(cuts) <= doc:
+                cuts.extend(bytes(4 * (doc + 1 - len(cuts))))
+            cuts[doc] = preview_cut(event.get(field) or "", self.chars)
+
+    def cut(self, doc: Optional[int], field: str, text: str, chars: int) -> int:
+        cuts = self._cuts.get(field)
+        if chars == self.chars and doc is not None and cuts is not None and doc < len(cuts) and cuts[doc] <= len(text):
+            return cuts[doc]
+        return preview_cut(text, chars)
+
+
+def project_event(
+    event: dict,
+    fields: Optional[List[str]] = None,
+    preview_chars: Optional[int] = None,
+    previews: Optional[PreviewIndex] = None,
+    doc: Optional[int] = None,
+) -> dict:
+    """
+    Copy of `event` restricted to `fields`, with PREVIEW_FIELDS cut to
+    `preview_chars`. Cut fields are listed under "truncated", so a client
+    knows to fetch the full event.
+    """
+    if fields is None:
+        shaped = dict(event)
+    else:
+        shaped = {field: event[field] for field in fields if field in event}
+    if preview_chars is None:
+        return shaped
+    truncated = []
+    for field in PREVIEW_FIELDS:
+        text = shaped.get(field)
+        if not text or len(text) <= preview_chars:
+            continue
+        cut = previews.cut(doc, field, text, preview_chars) if previews else preview_cut(text, preview_chars)
+        if cut < len(text):
+            shaped[field] = text[:cut] + ELLIPSIS
+            truncated.append(field)
+    if truncated:
+        shaped["truncated"] = truncated
+    return shaped
@@ -0,0 +1,232 @@
+"""
+Mergeable quantile sketches for ECU and execution time.
+
+The knowledge base's "Credit Concern Correlation" and "Agent Progress
+Outcomes" queries want medians and percentiles of trajectory_ecu_consumed and
+execution_time per group:
+
+    SELECT credit_flag, APPROX_QUANTILES(trajectory_ecu_consumed, 100)[OFFSET(50)] as median_ecu ...
+    GROUP BY credit_flag
+
+Exact quantiles need every value of a group, sorted. QuantileIndex instead
+keeps one QuantileSketch per (metric, grouping, day, group value), filled
+as events are added to the store (see EventStore.attach). A query over a
+window merges the window's daily sketches, so a 30-day p99 costs 30 small
+merges per group however many events those days hold.
+
+QuantileSketch puts values in logarithmic buckets: bucket i holds values in
+(gamma^(i-1), gamma^i], with gamma = (1 + a) / (1 - a), and a bucket is
+reported as the point within a relative distance `a` of both its ends.
+For a requested quantile q of n values, the answer is within a relative
+error of RELATIVE_ACCURACY (1%) of the exact value at sorted position
+floor(q * (n - 1)), at every q, p99 included. Merging adds bucket counts, so
+a merged sketch equals the sketch of all the merged values, and memory per
+sketch is bounded by the range of the values (about 700 buckets span
+0.01 to 10,000), not their number. Count, mean, min and max are exact.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Magnitudes below this count as zero
+MIN_MAGNITUDE = 1e-9
+
+QUANTILE_METRICS = ("trajectory_ecu_consumed", "execution_time")
+
+# group_by -> array column whose values are the groups ("all" and "credit_flag" are derived)
+QUANTILE_GROUPINGS = {
+    "all": None,
+    "credit_flag": None,
+    "intent": "user_intent",
+    "sentiment": "user_sentiment",
+    "work_category": "work_category",
+    "outcome": "progress_outcome",
+}
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _number(value) -> Optional[float]:
+    """A finite numeric column value, or None for anything else (bools included)"""
+    return value if type(value) is int or (type(value) is float and math.isfinite(value)) else None
+
+
+def bucket_index(value: float) -> int:
+    """The bucket of a magnitude of at least MIN_MAGNITUDE"""
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def _bucket_value(index: int) -> float:
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+def quantile_label(q: float) -> str:
+    """0.5 -> "p50", 0.999 -> "p99.9" """
+    return f"p{round(q * 100, 6):g}"
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch (RELATIVE_ACCURACY) with exact count, sum, min and max"""
+
+    __slots__ = ("count", "sum", "min", "max", "zeros", "positive", "negative")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zeros = 0
+        # bucket index -> count, for positive values and for the magnitudes of negative ones
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+
+    def add(self, value: float, index: Optional[int] = None):
+        """Add `value`; `index` is bucket_index(abs(value)) when the caller already has it"""
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        magnitude = abs(value)
+        if magnitude < MIN_MAGNITUDE:
+            self.zeros += 1
+            return
+        if index is None:
+            index = bucket_index(magnitude)
+        buckets = self.positive if value > 0 else self.negative
+        buckets[index] = buckets.get(index, 0) + 1
+
+    def merge(self, other: "QuantileSketch"):
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zeros += other.zeros
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            # list() copies atomically, so a sketch still being filled can be merged
+            for index, count in list(theirs.items()):
+                mine[index] = mine.get(index, 0) + count
+
+    def _ascending(self) -> Iterable[Tuple[float, int]]:
+        """(bucket value, count) from the lowest value up"""
+        for index in sorted(self.negative, reverse=True):
+            yield -_bucket_value(index), self.negative[index]
+        if self.zeros:
+            yield 0.0, self.zeros
+        for index in sorted(self.positive):
+            yield _bucket_value(index), self.positive[index]
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Estimates for each q in `qs` (0 <= q <= 1), in one pass; None when empty"""
+        qs = list(qs)
+        # Counted from the buckets, which a merge during ingest may leave one value behind `count`
+        total = self.zeros + sum(self.positive.values()) + sum(self.negative.values())
+        if not total:
+            return [None] * len(qs)
+        order = sorted(range(len(qs)), key=lambda i: qs[i])
+        results: List[Optional[float]] = [None] * len(qs)
+        buckets = self._ascending()
+        seen = 0
+        value = None
+        for i in order:
+            rank = qs[i] * (total - 1)
+            while seen <= rank:
+                value, count = next(buckets)
+                seen += count
+            # min and max are exact, and no estimate lies outside them
+            results[i] = min(max(value, self.min), self.max)
+        return results
+
+    def summary(self, qs: Iterable[float]) -> dict:
+        qs = list(qs)
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "quantiles": dict(zip(map(quantile_label, qs), self.quantiles(qs))),
+        }
+
+
+# (grouping, array column) for the groupings read straight from a column
+_COLUMN_GROUPINGS = tuple((grouping, field) for grouping, field in QUANTILE_GROUPINGS.items() if field is not None)
+_ALL = ("all", "all")
+_CREDIT_FLAGS = {True: ("credit_flag", "concern_raised"), False: ("credit_flag", "no_concern")}
+
+
+def _groups(event: dict) -> List[Tuple[str, str]]:
+    """(grouping, group value) pairs an event belongs to"""
+    intents = event.get("user_intent")
+    groups = [_ALL, _CREDIT_FLAGS[isinstance(intents, list) and "credit_concern" in intents]]
+    for grouping, field in _COLUMN_GROUPINGS:
+        values = event.get(field)
+        if type(values) is not list:
+            continue
+        for value in values:
+            if type(value) is str:
+                key = (grouping, value)
+                # Arrays rarely repeat a value, but a repeat must not count twice
+                if key not in groups:
+                    groups.append(key)
+    return groups
+
+
+class QuantileIndex:
+    """Daily sketches per metric and group, maintained as events are added to the store"""
+
+    def __init__(self, metrics: Iterable[str] = QUANTILE_METRICS):
+        self.metrics = tuple(metrics)
+        # (metric, day) -> (grouping, group value) -> sketch
+        self._sketches: Dict[Tuple[str, str], Dict[Tuple[str, str], QuantileSketch]] = {}
+
+    def add(self, doc: int, event: dict):
+        groups = None
+        day = event["event_timestamp"][:10]
+        for metric in self.metrics:
+            value = _number(event.get(metric))
+            if value is None:
+                continue
+            if groups is None:
+                groups = _groups(event)
+            magnitude = abs(value)
+            # Every group's sketch puts the value in the same bucket
+            index = bucket_index(magnitude) if magnitude >= MIN_MAGNITUDE else None
+            sketches = self._sketches.get((metric, day))
+            if sketches is None:
+                sketches = self._sketches[(metric, day)] = {}
+            for key in groups:
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = QuantileSketch()
+                sketch.add(value, index)
+
+    def merged(self, metric: str, grouping: str, days: Iterable[str]) -> Dict[str, QuantileSketch]:
+        """One sketch per group value, merged over `days` ("YYYY-MM-DD" labels)"""
+        merged: Dict[str, QuantileSketch] = {}
+        for day in days:
+            sketches = self._sketches.get((metric, day))
+            if not sketches:
+                continue
+            # list() copies atomically, so an ingest adding a group can't break the walk
+            for (key_grouping, group), sketch in list(sketches.items()):
+                if key_grouping != grouping:
+                    continue
+                total = merged.get(group)
+                if total is None:
+                    total = merged[group] = QuantileSketch()
+                total.merge(sketch)
+        return merged
+
+    def stats(
+        self, metric: str, grouping: str, days: Iterable[str], qs: Iterable[float] = DEFAULT_QUANTILES
+    ) -> List[dict]:
+        """Per-group count, mean, min, max and quantiles over `days`, largest group first"""
+        qs = list(qs)
+        merged = self.merged(metric, grouping, days)
+        rows = [{"group": group, **sketch.summary(qs)} for group, sketch in merged.items()]
+        rows.sort(key=lambda row: (-row["count"], row["group"]))
+        return rows
@@ -0,0 +1,207 @@
+"""
+Response cache for the dashboard's read endpoints.
+
+ResponseCacheMiddleware is plain ASGI middleware: on a hit it answers from
+the stored bytes without routing, validation or JSON encoding. Entries are
+keyed on path plus normalised query string (pairs sorted, so parameter
+order does not matter), evicted least-recently-used beyond a size bound,
+and expire after a TTL.
+
+Entries are also tagged with a data version (e.g. the number of stored and
+search-indexed events). An entry from an older version counts as a miss,
+so nothing is served from before data changed, even if the change happened
+without an explicit invalidate().
+
+Every cached response carries a strong ETag (a hash of the body) and
+`Cache-Control: no-cache`, so browsers revalidate each time and a poll
+whose data has not changed gets a body-less 304.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL_SECONDS = 30.0
+
+# Larger responses are passed through uncached
+CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+
+
+def etag_for(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode("ascii") + b'"'
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """If-None-Match comparison (RFC 9110 13.1.2: weak comparison, "*" matches anything)"""
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if candidate.startswith(b"W/"):
+            candidate = candidate[2:]
+        if candidate == b"*" or candidate == etag:
+            return True
+    return False
+
+
+class _Entry:
+    __slots__ = ("headers", "body", "etag", "expires", "version")
+
+    def __init__(self, headers: List[Tuple[bytes, bytes]], body: bytes, etag: bytes, expires: float, version):
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.expires = expires
+        self.version = version
+
+
+class ResponseCache:
+    """Size-bounded LRU of response bodies with a TTL, a data version and hit/miss counters"""
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl: float = CACHE_TTL_SECONDS,
+        version: Optional[Callable[[], Hashable]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._version = version or (lambda: None)
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self.counters: Dict[str, int] = dict.fromkeys(
+            ("hits", "misses", "not_modified", "stores", "evictions", "expirations", "invalidations"), 0
+        )
+
+    @staticmethod
+    def key(path: str, query_string: bytes) -> str:
+        pairs = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+        return path + "?" + urlencode(sorted(pairs)) if pairs else path
+
+    def get(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and (entry.expires <= self._clock() or entry.version != self._version()):
+            self._discard(key)
+            self.counters["expirations"] += 1
+            entry = None
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return entry
+
+    def put(self, key: str, headers: List[Tuple[bytes, bytes]], body: bytes, version=None) -> Optional[_Entry]:
+        """Store a response body; returns the entry, or None when the body is too large to cache"""
+        if len(body) > CACHE_MAX_ENTRY_BYTES:
+            return None
+        if key in self._entries:
+            self._discard(key)
+        entry = _Entry(headers, body, etag_for(body), self._clock() + self.ttl, version)
+        self._entries[key] = entry
+        self._bytes += len(body)
+        self.counters["stores"] += 1
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+        return entry
+
+    def version(self) -> Hashable:
+        return self._version()
+
+    def invalidate(self):
+        """Drop every entry (called when new data is ingested)"""
+        self._entries.clear()
+        self._bytes = 0
+        self.counters["invalidations"] += 1
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else None,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+        }
+
+
+class ResponseCacheMiddleware:
+    """
+    Serve GET requests under `paths` from `cache`, and answer a matching
+    If-None-Match with 304. Only 200 responses are stored; anything else
+    passes through untouched. Add it before CORSMiddleware so that CORS
+    headers are still applied to cached responses.
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths: Iterable[str]):
+        self.app = app
+        self.cache = cache
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        cache = self.cache
+        key = cache.key(scope["path"], scope["query_string"])
+        entry = cache.get(key)
+        if entry is None:
+            version = cache.version()
+            start, body = await self._capture(scope, receive)
+            if start["status"] == 200:
+                entry = cache.put(key, _cacheable_headers(start), body, version)
+            if entry is None:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+        if_none_match = _header(scope, b"if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            cache.counters["not_modified"] += 1
+            await send({"type": "http.response.start", "status": 304, "headers": _validators(entry)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": entry.headers + _validators(entry)})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _capture(self, scope, receive) -> Tuple[dict, bytes]:
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        return start, b"".join(chunks)
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _cacheable_headers(start: dict) -> List[Tuple[bytes, bytes]]:
+    return [(key, value) for key, value in start.get("headers", []) if key.lower() not in (b"etag", b"cache-control")]
+
+
+def _validators(entry: _Entry) -> List[Tuple[bytes, bytes]]:
+    return [(b"etag", entry.etag), (b"cache-control", b"no-cache")]
@@ -0,0 +1,186 @@
+"""
+Time-bucket rollups for sentiment and intent trends.
+
+Counts are kept per (bucket, sentiment), (bucket, intent) and (bucket,
+sentiment, intent) for hourly and daily buckets, and bumped as each event
+is added to the store (see EventStore.attach). A trend query then reads one
+small dict per bucket in its window, so
+
+    SELECT DATE(event_timestamp), sentiment, COUNT(*) ... GROUP BY 1, 2
+
+over 30 days costs 30 lookups however many events those days hold.
+
+Bucket keys are prefixes of the fixed-width event_timestamp string
+("2026-01-21" for days, "2026-01-21 11:00" for hours), so filing an event
+needs no datetime parsing.
+"""
+
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from event_store import TIMESTAMP_FORMAT
+
+# granularity -> (bucket label format, bucket width, default window in buckets)
+ROLLUP_GRANULARITIES = {
+    "hour": ("%Y-%m-%d %H:00", timedelta(hours=1), 48),
+    "day": ("%Y-%m-%d", timedelta(days=1), 30),
+}
+
+# Longest window a single trend query may span
+MAX_TREND_BUCKETS = 5000
+
+# Fields cleared to floor a time to the start of its bucket
+_FLOORS = {
+    "hour": {"minute": 0, "second": 0, "microsecond": 0},
+    "day": {"hour": 0, "minute": 0, "second": 0, "microsecond": 0},
+}
+
+
+def _bucket_key(granularity: str, timestamp: str) -> str:
+    if granularity == "day":
+        return timestamp[:10]
+    return timestamp[:13] + ":00"
+
+
+def _safe_divide(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def trend_metrics(events: int, sentiments: Dict[str, int], intents: Dict[str, int]) -> Dict[str, Optional[float]]:
+    """Derived rates from the knowledge base's Key Metrics Definitions (None when undefined)"""
+    bug_requests = intents.get("req_new_bugfix", 0) + intents.get("req_same_bug_fix", 0)
+    return {
+        "bug_resolution_rate": _safe_divide(intents.get("ack_bug_fixed", 0), bug_requests),
+        "bug_recurrence_rate": _safe_divide(intents.get("req_same_bug_fix", 0), bug_requests),
+        "sentiment_health": _safe_divide(sentiments.get("excited", 0) + sentiments.get("satisfied", 0), events),
+        "frustration_rate": _safe_divide(sentiments.get("frustrated", 0), events),
+    }
+
+
+class _Bucket:
+    __slots__ = ("events", "sentiments", "intents", "pairs")
+
+    def __init__(self):
+        self.events = 0
+        self.sentiments: Dict[str, int] = {}
+        self.intents: Dict[str, int] = {}
+        # (sentiment, intent) -> count, for intent trends within one sentiment
+        self.pairs: Dict[tuple, int] = {}
+
+
+class RollupIndex:
+    """Hourly and daily sentiment/intent counts, maintained as events are added to the store"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Dict[str, _Bucket]] = {granularity: {} for granularity in ROLLUP_GRANULARITIES}
+        self.latest: Optional[str] = None
+
+    def add(self, doc: int, event: dict):
+        timestamp = event["event_timestamp"]
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+        sentiments = event.get("user_sentiment") or []
+        intents = event.get("user_intent") or []
+        for granularity, buckets in self._buckets.items():
+            key = _bucket_key(granularity, timestamp)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _Bucket()
+            bucket.events += 1
+            counts, pairs = bucket.sentiments, bucket.pairs
+            for sentiment in sentiments:
+                counts[sentiment] = counts.get(sentiment, 0) + 1
+                for intent in intents:
+                    pair = (sentiment, intent)
+                    pairs[pair] = pairs.get(pair, 0) + 1
+            counts = bucket.intents
+            for intent in intents:
+                counts[intent] = counts.get(intent, 0) + 1
+
+    def window(
+        self, granularity: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[datetime]:
+        """
+        Bucket start times covering [start, end), oldest first. `end` defaults
+        to just after the latest event's bucket and `start` to the
+        granularity's default window before `end`.
+        """
+        label_format, width, default_buckets = ROLLUP_GRANULARITIES[granularity]
+        if end is None:
+            if self.latest is None:
+                return []
+            latest = _bucket_key(granularity, self.latest)
+            end = datetime.strptime(latest, label_format) + width
+        if start is None:
+            start = end - default_buckets * width
+        # Floor start to its bucket so the first bucket is complete
+        cursor = start.replace(**_FLOORS[granularity])
+        buckets = math.ceil((end - cursor) / width)
+        if buckets > MAX_TREND_BUCKETS:
+            hint = " or use granularity=day" if granularity == "hour" else ""
+            raise ValueError(
+                f"start to end spans {buckets:,} {granularity} buckets, more than the {MAX_TREND_BUCKETS:,} "
+                f"a query may cover: move start later or end earlier{hint}"
+            )
+        starts = []
+        while cursor < end:
+            starts.append(cursor)
+            cursor += width
+        return starts
+
+    def trends(self, granularity: str, starts: List[datetime], sentiment: Optional[str] = None) -> List[dict]:
+        """
+        One row per bucket of `starts` (see window(); empty buckets included),
+        with event, sentiment and intent counts. With `sentiment`, counts are
+        restricted to events carrying that sentiment.
+        """
+        label_format = ROLLUP_GRANULARITIES[granularity][0]
+        buckets = self._buckets[granularity]
+        rows = []
+        for bucket_start in starts:
+            label = bucket_start.strftime(label_format)
+            rows.append(self._row(label, buckets.get(label), sentiment))
+        return rows
+
+    @staticmethod
+    def _row(label: str, bucket: Optional[_Bucket], sentiment: Optional[str]) -> dict:
+        if bucket is None:
+            events, sentiments, intents = 0, {}, {}
+        elif sentiment is None:
+            events, sentiments, intents = bucket.events, dict(bucket.sentiments), dict(bucket.intents)
+        else:
+            events = bucket.sentiments.get(sentiment, 0)
+            sentiments = {sentiment: events} if events else {}
+            # list() copies atomically, so an ingest adding a pair can't break the walk
+            intents = {intent: n for (s, intent), n in list(bucket.pairs.items()) if s == sentiment}
+        return {
+            "bucket": label,
+            "events": events,
+            "sentiments": sentiments,
+            "intents": intents,
+            **trend_metrics(events, sentiments, intents),
+        }
+
+
+def summarize(rows: List[dict]) -> dict:
+    """Window totals and derived rates for a list of trend rows"""
+    events = 0
+    sentiments: Counter = Counter()
+    intents: Counter = Counter()
+    for row in rows:
+        events += row["events"]
+        sentiments.update(row["sentiments"])
+        intents.update(row["intents"])
+    return {
+        "events": events,
+        "sentiments": dict(sentiments.most_common()),
+        "intents": dict(intents.most_common()),
+        **trend_metrics(events, sentiments, intents),
+    }
+
+
+def parse_bucket_time(timestamp: str) -> datetime:
+    """datetime for a normalized event_timestamp string (see event_store.normalize_timestamp)"""
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
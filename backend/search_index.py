@@ -0,0 +1,246 @@
+"""
+Full-text search over user_curr_message and agent_prev_message.
+
+Messages are tokenised once, when an event is added to the store, into a
+per-field inverted index: term -> array of postings, each packed as
+`doc << 8 | term_frequency` and kept in doc order. Queries are ranked with
+BM25, summed across fields with a per-field weight, using MaxScore pruning:
+terms are scored rarest first, and once the remaining common terms can no
+longer lift an unseen doc into the top `limit`, they only re-score the
+docs already collected (by binary search) instead of walking their postings.
+
+Quoted phrases are required matches. Candidates come from intersecting the
+phrase terms' postings and are then verified against the message text, so
+no per-token positions need to be stored.
+
+Tokenisation is Unicode-aware: text is NFKC-normalised, case-folded and
+stripped of combining accents before splitting on word characters, so
+"problème", "PROBLEME" and "probleme" all index as the same term.
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bitmap_index import bitmap_bytes, has_bit
+
+SEARCH_FIELDS = {
+    "user_curr_message": 2.0,
+    "agent_prev_message": 1.0,
+}
+
+_WORD = re.compile(r"\w+")
+_PHRASE = re.compile(r'"([^"]*)"')
+# Combining diacritical mark blocks (accents left over after NFKD)
+_ACCENTS = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]")
+_MAX_TF = 0xFF
+
+
+def normalize_text(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    if text.isascii():
+        return text.lower()
+    return _ACCENTS.sub("", unicodedata.normalize("NFKD", unicodedata.normalize("NFKC", text).casefold()))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _WORD.findall(normalize_text(text))
+
+
+def parse_query(query: str) -> Tuple[List[str], List[List[str]]]:
+    """Split a query into bare terms and "quoted phrases" (each a token list)"""
+    phrases = [tokens for tokens in (tokenize(p) for p in _PHRASE.findall(query)) if tokens]
+    terms = tokenize(_PHRASE.sub(" ", query))
+    return terms, phrases
+
+
+def _tf(postings: array, doc: int) -> int:
+    """Term frequency of `doc` in a packed postings array (0 when absent)"""
+    i = bisect_left(postings, doc << 8)
+    if i < len(postings) and postings[i] >> 8 == doc:
+        return postings[i] & _MAX_TF
+    return 0
+
+
+class _FieldIndex:
+    __slots__ = ("postings", "lengths", "total_length")
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        self.lengths = array("I")
+        self.total_length = 0
+
+    def add(self, doc: int, tokens: List[str]):
+        if len(self.lengths) <= doc:
+            self.lengths.extend(bytes(4 * (doc + 1 - len(self.lengths))))
+        self.lengths[doc] = len(tokens)
+        self.total_length += len(tokens)
+        postings = self.postings
+        get = postings.get
+        packed_doc = doc << 8
+        for term, tf in Counter(tokens).items():
+            entry = get(term)
+            if entry is None:
+                entry = postings[term] = array("Q")
+            entry.append(packed_doc | (tf if tf < _MAX_TF else _MAX_TF))
+
+
+class SearchIndex:
+    """BM25 inverted index over SEARCH_FIELDS, fed by EventStore.attach"""
+
+    def __init__(
+        self,
+        documents: Callable[[int], dict],
+        fields: Optional[Dict[str, float]] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self._documents = documents
+        self.weights = dict(fields or SEARCH_FIELDS)
+        self.k1 = k1
+        self.b = b
+        self._fields = {field: _FieldIndex() for field in self.weights}
+        self._size = 0
+        # search() calls, those that found nothing, and hits returned
+        self.searches = 0
+        self.empty_searches = 0
+        self.results = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, doc: int, event: dict):
+        self._size = max(self._size, doc + 1)
+        for field, index in self._fields.items():
+            index.add(doc, tokenize(event.get(field)))
+
+    def search(self, query: str, limit: int = 20, candidates: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Top `limit` (doc, score) pairs for `query`, best first. Bare terms are
+        ORed and ranked; every quoted phrase must appear verbatim in one of the
+        fields. `candidates` is an optional doc-id bitmap (e.g. the sentiment
+        filter) that results must fall in.
+        """
+        hits = self._search(query, limit, candidates)
+        self.searches += 1
+        if hits:
+            self.results += len(hits)
+        else:
+            self.empty_searches += 1
+        return hits
+
+    def stats(self) -> dict:
+        return {"searches": self.searches, "empty_searches": self.empty_searches, "results": self.results}
+
+    def _search(self, query: str, limit: int, candidates: Optional[int]) -> List[Tuple[int, float]]:
+        terms, phrases = parse_query(query)
+        if not terms and not phrases or not self._size or limit < 1:
+            return []
+        allowed = bitmap_bytes(candidates, self._size) if candidates is not None else None
+
+        lists = self._scoring_lists(set(terms).union(*phrases))
+        if not phrases:
+            scores = self._max_score(lists, limit, allowed)
+            return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+        # Phrases: score every doc holding all phrase terms, then confirm
+        # adjacency on the text best-first, stopping after `limit` hits
+        required = None
+        for phrase in phrases:
+            docs = self._phrase_candidates(phrase, allowed)
+            required = docs if required is None else required & docs
+            if not required:
+                return []
+        scores = dict.fromkeys(required, 0.0)
+        for postings, index, weighted_idf, _ in lists:
+            self._rescore(scores, postings, index, weighted_idf)
+        patterns = [_phrase_pattern(phrase) for phrase in phrases]
+        hits = []
+        for doc, score in sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True):
+            if all(self._contains(doc, pattern) for pattern in patterns):
+                hits.append((doc, score))
+                if len(hits) == limit:
+                    break
+        return hits
+
+    def _scoring_lists(self, terms) -> List[tuple]:
+        """One (postings, field index, weight * idf, upper bound) per (term, field), highest bound first"""
+        n, k1 = self._size, self.k1
+        lists = []
+        for field, index in self._fields.items():
+            weight = self.weights[field]
+            for term in terms:
+                postings = index.postings.get(term)
+                if postings:
+                    idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                    lists.append((postings, index, weight * idf, weight * idf * (k1 + 1)))
+        lists.sort(key=lambda scorer: scorer[3], reverse=True)
+        return lists
+
+    def _max_score(self, lists: List[tuple], limit: int, allowed: Optional[bytes]) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        remaining = sum(scorer[3] for scorer in lists)
+        for postings, index, weighted_idf, bound in lists:
+            threshold = heapq.nlargest(limit, scores.values())[-1] if len(scores) >= limit else 0.0
+            if len(scores) >= limit and remaining <= threshold:
+                # An unseen doc scores at most `remaining`, so it cannot reach
+                # the top `limit`; only finish scoring the docs already held.
+                self._rescore(scores, postings, index, weighted_idf)
+            else:
+                self._scan(scores, postings, index, weighted_idf, allowed)
+            remaining -= bound
+        return scores
+
+    def _scan(self, scores: Dict[int, float], postings: array, index: _FieldIndex, weighted_idf: float,
+              allowed: Optional[bytes]):
+        k1, b = self.k1, self.b
+        k1_plus_1 = k1 + 1
+        lengths = index.lengths
+        scale = k1 * b / (index.total_length / self._size or 1.0)
+        base = k1 * (1 - b)
+        get = scores.get
+        for packed in postings:
+            doc = packed >> 8
+            if allowed is not None and not has_bit(allowed, doc):
+                continue
+            tf = packed & _MAX_TF
+            scores[doc] = get(doc, 0.0) + weighted_idf * tf * k1_plus_1 / (tf + base + scale * lengths[doc])
+
+    def _rescore(self, scores: Dict[int, float], postings: array, index: _FieldIndex, weighted_idf: float):
+        k1, b = self.k1, self.b
+        lengths = index.lengths
+        scale = k1 * b / (index.total_length / self._size or 1.0)
+        base = k1 * (1 - b)
+        for doc in scores:
+            tf = _tf(postings, doc)
+            if tf:
+                scores[doc] += weighted_idf * tf * (k1 + 1) / (tf + base + scale * lengths[doc])
+
+    def _phrase_candidates(self, phrase: List[str], allowed: Optional[bytes]) -> set:
+        """Docs holding every term of `phrase` within one field (adjacency not yet checked)"""
+        candidates = set()
+        for index in self._fields.values():
+            # Walk the rarest term's postings, probing the others by binary search
+            postings = sorted((index.postings.get(term) or array("Q") for term in set(phrase)), key=len)
+            rarest, others = postings[0], postings[1:]
+            for packed in rarest:
+                doc = packed >> 8
+                if allowed is not None and not has_bit(allowed, doc):
+                    continue
+                if all(_tf(other, doc) for other in others):
+                    candidates.add(doc)
+        return candidates
+
+    def _contains(self, doc: int, pattern) -> bool:
+        event = self._documents(doc)
+        return any(pattern.search(normalize_text(event.get(field))) for field in self._fields)
+
+
+def _phrase_pattern(phrase: List[str]):
+    return re.compile(r"(?<!\w)" + r"\W+".join(map(re.escape, phrase)) + r"(?!\w)")
@@ -0,0 +1,674 @@
+"""
+Day-partitioned columnar segments on disk, memory-mapped for reading.
+
+event_timestamp is the table's partition key, so events are stored by
+day, in one or more immutable segment files per day ("runs"), rows sorted
+by (event_timestamp, request_id). Opening a SegmentStore maps every
+segment and parses only the small JSON headers: nothing is decoded until a
+query reads it, and a query over a date range never touches other days'
+pages. The page cache holds the data, shared by every process that maps it.
+
+A segment file is an 8-byte magic, a version, the header length and the
+JSON header, followed by columns at 8-byte aligned offsets:
+
+- timestamps: int64 epoch microseconds, ascending
+- numeric columns (NUMERIC_COLUMNS): one fixed-width value per row, with a
+  sentinel for "absent" (the confidences are int16)
+- label columns (LABEL_COLUMNS): uint16 vocabulary codes plus uint32 end
+  offsets per row, as in event_columns, and one bitmap of rows per label
+  value, so label filters are a few whole-integer operations per day
+- text columns (TEXT_COLUMNS): uint64 end offsets into a UTF-8 heap per
+  column, plus a kind byte per row (absent, null or string). The messages
+  live only in their heaps, away from the columns a scan reads
+- request id lookup: 64-bit request_id hashes, sorted, with their rows
+- extras: a JSON object per row for anything the columns cannot hold
+
+The header carries the vocabularies and per-value row counts, so sentiment
+counts over any range of days come from headers alone.
+
+A day's runs hold consecutive, non-overlapping key ranges, so reading the
+day newest first reads its runs newest first. Each run is named after the
+range of batch sequence numbers it holds: <YYYY-MM-DD>.seg for a day
+written whole, <YYYY-MM-DD>.<first>-<last>.seg otherwise.
+
+Segments are never changed in place, and readers holding a mapping keep a
+consistent snapshot. A batch of events that all sort after the day's last
+row, as live ingest sends, is written as a new run on its own: only it is
+encoded and synced. The day's tail runs are then merged while the run
+before the tail holds at most MERGE_RATIO times the tail's rows, so a day
+keeps a logarithmic number of runs and each row is copied a logarithmic
+number of times (a merge copies the older run's columns as bytes and only
+decodes the newer). A batch landing inside the day's range rewrites the
+day as one run. Files a merge or rewrite replaced are deleted, and their
+mappings closed once no reader is using them.
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from hashlib import blake2b
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bitmap_index import LabelQuery
+from event_columns import FIELD_ORDER, format_micros, timestamp_micros
+from event_store import STORED_TIMESTAMP, SortKey, normalize_timestamp
+
+MAGIC = b"ORACLSEG"
+VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+SUFFIX = ".seg"
+_RUN_NAME = re.compile(r"(\d{4}-\d{2}-\d{2})(?:\.(\d+)-(\d+))?" + re.escape(SUFFIX))
+
+# A day's tail run is merged into the run before it while that run holds at
+# most this many times the tail's rows
+MERGE_RATIO = 2
+
+LABEL_COLUMNS = ("user_intent", "user_sentiment", "work_category", "work_subcategory", "progress_outcome")
+TEXT_COLUMNS = ("request_id", "job_id", "user_id", "user_curr_message", "agent_prev_message")
+# column -> (array typecode, sentinel stored for "absent")
+NUMERIC_COLUMNS = {
+    "intent_confidence": ("h", -0x8000),
+    "sentiment_confidence": ("h", -0x8000),
+    "state_number": ("q", -0x8000000000000000),
+    "trajectory_ecu_consumed": ("d", math.nan),
+    "execution_time": ("d", math.nan),
+}
+_COLUMNS = frozenset(LABEL_COLUMNS + TEXT_COLUMNS + tuple(NUMERIC_COLUMNS) + ("event_timestamp",))
+# Field order of rebuilt events: as the in-memory store, then the other columns
+_ORDER = FIELD_ORDER + tuple(field for field in TEXT_COLUMNS + LABEL_COLUMNS + tuple(NUMERIC_COLUMNS)
+                             if field not in FIELD_ORDER)
+
+# Text kinds
+_ABSENT, _NULL, _TEXT = 0, 1, 2
+_LIMITS = {"h": (-0x8000, 0x7FFF), "q": (-0x8000000000000000, 0x7FFFFFFFFFFFFFFF)}
+
+
+def request_id_hash(request_id: str) -> int:
+    return int.from_bytes(blake2b(request_id.encode(), digest_size=8).digest(), "little")
+
+
+def _numeric(typecode: str, value):
+    """The value as stored in a numeric column, or None when the column cannot hold it"""
+    if typecode == "d":
+        return value if type(value) is float and not math.isnan(value) else None
+    low, high = _LIMITS[typecode]
+    return value if type(value) is int and low < value <= high else None
+
+
+def _sorted_rows(events: List[dict]) -> List[Tuple[Tuple[int, str], dict]]:
+    return sorted(((timestamp_micros(event["event_timestamp"]), event["request_id"]), event) for event in events)
+
+
+def _encode(rows: List[Tuple[Tuple[int, str], dict]], vocabularies: Dict[str, List[str]]) -> dict:
+    """
+    Columns for sorted rows. Label codes extend `vocabularies` (changed in
+    place), so rows encoded against an existing segment's vocabularies can
+    be appended to it. Bitmaps come back as {field: {code: int}}.
+    """
+    count = len(rows)
+    extras: List[Optional[dict]] = [None] * count
+    columns: Dict[str, array] = {"timestamps": array("q", (key[0] for key, _ in rows))}
+    hashes = array("Q", (request_id_hash(key[1]) for key, _ in rows))
+
+    for field, (typecode, sentinel) in NUMERIC_COLUMNS.items():
+        column = columns[field] = array(typecode, [sentinel]) * count
+        for row, (_, event) in enumerate(rows):
+            if field in event:
+                value = _numeric(typecode, event[field])
+                if value is None:
+                    extras[row] = extras[row] or {}
+                    extras[row][field] = event[field]
+                else:
+                    column[row] = value
+
+    bitmaps: Dict[str, Dict[int, int]] = {}
+    counts: Dict[str, Dict[str, int]] = {}
+    bitmap_bytes = (count + 7) // 8
+    for field in LABEL_COLUMNS:
+        values_list = vocabularies.setdefault(field, [])
+        vocabulary = {value: code for code, value in enumerate(values_list, 1)}
+        codes, ends = array("I"), array("I")
+        # Per code: a bitmap of its rows
+        members: Dict[int, bytearray] = {}
+        for row, (_, event) in enumerate(rows):
+            values = event.get(field)
+            if type(values) is list and all(type(value) is str for value in values):
+                for value in dict.fromkeys(values) if len(values) > 1 else values:
+                    code = vocabulary.get(value)
+                    if code is None:
+                        code = vocabulary[value] = len(values_list) + 1
+                        values_list.append(value)
+                    bits = members.get(code)
+                    if bits is None:
+                        bits = members[code] = bytearray(bitmap_bytes)
+                    bits[row >> 3] |= 1 << (row & 7)
+                codes.extend(vocabulary[value] for value in values)
+            else:
+                # Absent: one code 0, as event_columns stores it
+                codes.append(0)
+                if field in event:
+                    extras[row] = extras[row] or {}
+                    extras[row][field] = values
+            ends.append(len(codes))
+        columns[f"{field}.codes"] = codes
+        columns[f"{field}.ends"] = ends
+        bitmaps[field] = {code: int.from_bytes(bits, "little") for code, bits in members.items()}
+        counts[field] = {values_list[code - 1]: bits.bit_count() for code, bits in bitmaps[field].items()}
+
+    for field in TEXT_COLUMNS:
+        heap = bytearray()
+        ends = array("Q")
+        kinds = array("B", bytes(count))
+        for row, (_, event) in enumerate(rows):
+            if field in event:
+                value = event[field]
+                if value is None:
+                    kinds[row] = _NULL
+                elif type(value) is str:
+                    kinds[row] = _TEXT
+                    heap += value.encode("utf-8", "surrogatepass")
+                else:
+                    extras[row] = extras[row] or {}
+                    extras[row][field] = value
+            ends.append(len(heap))
+        columns[f"{field}.ends"] = ends
+        columns[f"{field}.kinds"] = kinds
+        columns[f"{field}.heap"] = array("B", heap)
+
+    for row, (_, event) in enumerate(rows):
+        if not _COLUMNS.issuperset(event):
+            extras[row] = extras[row] or {}
+            extras[row].update((field, value) for field, value in event.items() if field not in _COLUMNS)
+    heap = bytearray()
+    ends = array("Q")
+    for extra in extras:
+        if extra is not None:
+            heap += json.dumps(extra, separators=(",", ":")).encode()
+        ends.append(len(heap))
+    columns["extras.ends"] = ends
+    columns["extras.heap"] = array("B", heap)
+    return {"count": count, "columns": columns, "hashes": hashes, "bitmaps": bitmaps, "counts": counts}
+
+
+def _write(path: str, day: Optional[str], count: int, columns: Dict[str, Tuple[str, bytes]],
+           vocabularies: Dict[str, List[str]], counts: Dict[str, Dict[str, int]]):
+    """Write a segment file from encoded columns ({name: (typecode, data)}), atomically"""
+    layout = {}
+    offset = 0
+    for name, (typecode, data) in columns.items():
+        layout[name] = [typecode, offset, len(data) // struct.calcsize(typecode)]
+        offset += -(-len(data) // 8) * 8
+    header = json.dumps({
+        "day": day,
+        "rows": count,
+        "byteorder": sys.byteorder,
+        "columns": layout,
+        "vocabularies": vocabularies,
+        "counts": counts,
+    }, separators=(",", ":")).encode()
+    header += b" " * (-(_PREFIX.size + len(header)) % 8)
+
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for _, data in columns.values():
+            f.write(data)
+            f.write(bytes(-len(data) % 8))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def _bitmap_column(bitmaps: Dict[int, int], codes: int, count: int) -> bytes:
+    size = (count + 7) // 8
+    return b"".join(bitmaps.get(code, 0).to_bytes(size, "little") for code in range(1, codes + 1))
+
+
+def _code_typecode(vocabulary: List[str]) -> str:
+    return "H" if len(vocabulary) < 0x10000 else "I"
+
+
+def write_segment(path: str, events: List[dict]):
+    """
+    Write one day's events (stored-format timestamps, unique request_ids) as
+    a segment at `path`, atomically: the file only appears once complete.
+    """
+    rows = _sorted_rows(events)
+    days = {event["event_timestamp"][:10] for _, event in rows}
+    if len(days) > 1:
+        raise ValueError(f"A segment holds one day, got {sorted(days)}")
+    vocabularies: Dict[str, List[str]] = {}
+    encoded = _encode(rows, vocabularies)
+    count = encoded["count"]
+    order = sorted(range(count), key=encoded["hashes"].__getitem__)
+    columns: Dict[str, Tuple[str, bytes]] = {}
+    for name, column in encoded["columns"].items():
+        if name.endswith(".codes"):
+            column = array(_code_typecode(vocabularies[name[:-6]]), column)
+        columns[name] = (column.typecode, column.tobytes())
+    columns["request_hashes"] = ("Q", array("Q", (encoded["hashes"][row] for row in order)).tobytes())
+    columns["request_rows"] = ("I", array("I", order).tobytes())
+    for field in LABEL_COLUMNS:
+        columns[f"{field}.bitmaps"] = ("B", _bitmap_column(encoded["bitmaps"][field], len(vocabularies[field]), count))
+    _write(path, days.pop() if days else None, count, columns, vocabularies, encoded["counts"])
+
+
+def append_segment(path: str, segment: "Segment", events: List[dict]) -> bool:
+    """
+    Write `segment` plus `events`, all sorting after its last row, as a new
+    segment at `path`. The existing columns are copied as bytes rather than
+    decoded, so this costs the new rows plus a copy. False (and nothing
+    written) when the events do not all sort after the segment's last row.
+    """
+    rows = _sorted_rows(events)
+    if not rows or any(event["event_timestamp"][:10] != segment.day for _, event in rows):
+        return False
+    if segment.rows and rows[0][0] <= segment.key(segment.rows - 1):
+        return False
+    old = segment.rows
+    vocabularies = {field: list(values[1:]) for field, values in segment._values.items()}
+    encoded = _encode(rows, vocabularies)
+    count = old + encoded["count"]
+    existing = segment._columns
+    columns: Dict[str, Tuple[str, bytes]] = {}
+    for name, column in encoded["columns"].items():
+        current = existing[name]
+        if name.endswith(".ends"):
+            # New rows' end offsets continue from the existing codes / heap
+            field = name[:-5]
+            base = len(existing[field + (".codes" if field in LABEL_COLUMNS else ".heap")])
+            column = array(column.typecode, (end + base for end in column))
+        elif name.endswith(".codes"):
+            typecode = _code_typecode(vocabularies[name[:-6]])
+            if typecode != current.format:
+                return False
+            column = array(typecode, column)
+        columns[name] = (column.typecode, current.tobytes() + column.tobytes())
+    pairs = list(zip(existing["request_hashes"], existing["request_rows"]))
+    pairs += ((hashed, old + row) for row, hashed in enumerate(encoded["hashes"]))
+    pairs.sort()
+    columns["request_hashes"] = ("Q", array("Q", (hashed for hashed, _ in pairs)).tobytes())
+    columns["request_rows"] = ("I", array("I", (row for _, row in pairs)).tobytes())
+    counts = {field: dict(values) for field, values in segment.counts.items()}
+    for field in LABEL_COLUMNS:
+        bitmaps = {code: segment.bitmap_of(field, code) for code in range(1, len(segment._values[field]))}
+        for code, bits in encoded["bitmaps"][field].items():
+            bitmaps[code] = bitmaps.get(code, 0) | bits << old
+        columns[f"{field}.bitmaps"] = ("B", _bitmap_column(bitmaps, len(vocabularies[field]), count))
+        field_counts = counts.setdefault(field, {})
+        for value, added in encoded["counts"][field].items():
+            field_counts[value] = field_counts.get(value, 0) + added
+    _write(path, segment.day, count, columns, vocabularies, counts)
+    return True
+
+
+def _run_path(directory: str, day: str, batches: Tuple[int, int]) -> str:
+    first, last = batches
+    name = day if batches == (0, 0) else f"{day}.{first}-{last}"
+    return os.path.join(directory, name + SUFFIX)
+
+
+class Segment:
+    """One run of a day's events, memory-mapped; rows are ordered by (event_timestamp, request_id)"""
+
+    def __init__(self, path: str, batches: Tuple[int, int] = (0, 0)):
+        self.path = path
+        # First and last batch sequence numbers the run holds (see SegmentStore)
+        self.batches = batches
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = _PREFIX.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a version {VERSION} segment")
+        header = json.loads(self._map[_PREFIX.size:_PREFIX.size + header_size])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path}: written on a {header['byteorder']}-endian machine")
+        self.day: str = header["day"]
+        self.rows: int = header["rows"]
+        self.size = len(self._map)
+        self.counts: Dict[str, Dict[str, int]] = header["counts"]
+        self._values = {field: [None] + values for field, values in header["vocabularies"].items()}
+        self._codes = {field: {value: code for code, value in enumerate(values, 1)}
+                       for field, values in header["vocabularies"].items()}
+        self._bitmap_bytes = (self.rows + 7) // 8
+        data = memoryview(self._map)[_PREFIX.size + header_size:]
+        self._columns = {
+            name: data[offset:offset + length * struct.calcsize(typecode)].cast(typecode)
+            for name, (typecode, offset, length) in header["columns"].items()
+        }
+        self.timestamps = self._columns["timestamps"]
+
+    def close(self):
+        """Unmap the file; the segment must not be read afterwards"""
+        for column in self._columns.values():
+            column.release()
+        self._map.close()
+
+    def text(self, field: str, row: int) -> Optional[str]:
+        ends = self._columns[f"{field}.ends"]
+        start = ends[row - 1] if row else 0
+        return str(self._columns[f"{field}.heap"][start:ends[row]], "utf-8", "surrogatepass")
+
+    def labels(self, field: str, row: int) -> Optional[List[str]]:
+        codes, ends, values = self._columns[f"{field}.codes"], self._columns[f"{field}.ends"], self._values[field]
+        start, end = ends[row - 1] if row else 0, ends[row]
+        if end - start == 1 and codes[start] == 0:
+            return None
+        return [values[code] for code in codes[start:end]]
+
+    def event(self, row: int) -> dict:
+        """The stored event, as a new dict"""
+        event = {"event_timestamp": format_micros(self.timestamps[row])}
+        columns = self._columns
+        for field in _ORDER:
+            if field in NUMERIC_COLUMNS:
+                value = columns[field][row]
+                if value != NUMERIC_COLUMNS[field][1] and value == value:
+                    event[field] = value
+            elif field in LABEL_COLUMNS:
+                values = self.labels(field, row)
+                if values is not None:
+                    event[field] = values
+            elif field in TEXT_COLUMNS:
+                kind = columns[f"{field}.kinds"][row]
+                if kind == _TEXT:
+                    event[field] = self.text(field, row)
+                elif kind == _NULL:
+                    event[field] = None
+        ends = columns["extras.ends"]
+        start = ends[row - 1] if row else 0
+        if ends[row] > start:
+            event.update(json.loads(bytes(columns["extras.heap"][start:ends[row]])))
+        return event
+
+    def events(self) -> List[dict]:
+        return [self.event(row) for row in range(self.rows)]
+
+    def key(self, row: int) -> Tuple[int, str]:
+        """(epoch microseconds, request_id) of a row"""
+        return self.timestamps[row], self.text("request_id", row)
+
+    def find(self, request_id: str) -> Optional[int]:
+        """Row of the event with this request_id, or None"""
+        hashed = request_id_hash(request_id)
+        hashes, rows = self._columns["request_hashes"], self._columns["request_rows"]
+        i = bisect_left(hashes, hashed)
+        while i < len(hashes) and hashes[i] == hashed:
+            if self.text("request_id", rows[i]) == request_id:
+                return rows[i]
+            i += 1
+        return None
+
+    def request_hashes(self) -> memoryview:
+        return self._columns["request_hashes"]
+
+    def below(self, key: Tuple[int, str]) -> int:
+        """Number of rows strictly below (epoch microseconds, request_id)"""
+        micros, request_id = key
+        low = bisect_left(self.timestamps, micros)
+        high = bisect_right(self.timestamps, micros, lo=low)
+        # Rows with the same timestamp are ordered by request_id
+        while low < high and self.text("request_id", low) < request_id:
+            low += 1
+        return low
+
+    def bitmap(self, field: str, value: str) -> int:
+        """Rows carrying `value` in `field`, as a bitmap (bit i = row i)"""
+        code = self._codes[field].get(value)
+        return 0 if code is None else self.bitmap_of(field, code)
+
+    def bitmap_of(self, field: str, code: int) -> int:
+        size = self._bitmap_bytes
+        return int.from_bytes(self._columns[f"{field}.bitmaps"][(code - 1) * size:code * size], "little")
+
+    def matching(self, labels: LabelQuery) -> int:
+        """Rows passing the label filter, as a bitmap"""
+        rows = (1 << self.rows) - 1
+        for field, values in labels.include.items():
+            bitmaps = [self.bitmap(field, value) for value in values]
+            if labels.match == "any":
+                combined = 0
+                for bits in bitmaps:
+                    combined |= bits
+                rows &= combined
+            else:
+                for bits in bitmaps:
+                    rows &= bits
+        for field, values in labels.exclude.items():
+            for value in values:
+                rows &= ~self.bitmap(field, value)
+        return rows
+
+    def rows_descending(self, start: int, stop: int, matching: Optional[int]) -> Iterator[int]:
+        """Rows in [start, stop), newest first, limited to the `matching` bitmap when given"""
+        if matching is None:
+            yield from range(stop - 1, start - 1, -1)
+            return
+        matching &= (1 << stop) - 1
+        matching >>= start
+        if not matching:
+            return
+        # Walked a 64-bit word at a time: bit_length() on the whole bitmap
+        # would cost its size per row
+        words = array("Q", matching.to_bytes((matching.bit_length() + 63) // 64 * 8, "little"))
+        if sys.byteorder == "big":
+            words.byteswap()
+        for index in range(len(words) - 1, -1, -1):
+            word = words[index]
+            base = start + index * 64
+            while word:
+                top = word.bit_length() - 1
+                yield base + top
+                word ^= 1 << top
+
+
+class SegmentStore:
+    """A directory of day segments: partition-pruned reads, tail runs and tiered merges on ingest"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._write_lock = threading.Lock()
+        found: Dict[str, List[Tuple[int, int, str]]] = {}
+        for name in os.listdir(directory):
+            match = _RUN_NAME.fullmatch(name)
+            if match:
+                day, first, last = match.groups()
+                found.setdefault(day, []).append((int(first or 0), int(last or 0), name))
+        segments = {}
+        for day, names in found.items():
+            runs: List[Segment] = []
+            # Widest first among runs starting together; a run inside the
+            # previous one's range was left behind by an interrupted merge
+            for first, last, name in sorted(names, key=lambda item: (item[0], -item[1])):
+                path = os.path.join(directory, name)
+                if runs and last <= runs[-1].batches[1]:
+                    os.remove(path)
+                    continue
+                runs.append(Segment(path, (first, last)))
+            segments[runs[0].day] = tuple(runs)
+        # (days ascending, day -> runs oldest first), swapped whole so readers see a consistent snapshot
+        self._state: Tuple[List[str], Dict[str, Tuple[Segment, ...]]] = (sorted(segments), segments)
+        # request_id hashes of every stored event, built on the first insert
+        self._hashes: Optional[set] = None
+        # Readers in progress, and runs replaced since that are waiting for them to finish
+        self._readers_lock = threading.Lock()
+        self._readers = 0
+        self._retired: List[Segment] = []
+
+    @contextmanager
+    def _reading(self):
+        """The current state, with its runs kept mapped until the block exits"""
+        with self._readers_lock:
+            self._readers += 1
+            state = self._state
+        try:
+            yield state
+        finally:
+            with self._readers_lock:
+                self._readers -= 1
+                retired = [] if self._readers else self._retired
+                if not self._readers:
+                    self._retired = []
+            for segment in retired:
+                segment.close()
+
+    def _retire(self, replaced: List[Segment]):
+        """Delete replaced runs' files, and unmap them now or when the last reader finishes"""
+        for segment in replaced:
+            os.remove(segment.path)
+        with self._readers_lock:
+            self._retired.extend(replaced)
+            if self._readers:
+                return
+            retired, self._retired = self._retired, []
+        for segment in retired:
+            segment.close()
+
+    def __len__(self) -> int:
+        return sum(segment.rows for runs in self._state[1].values() for segment in runs)
+
+    @property
+    def days(self) -> List[str]:
+        return list(self._state[0])
+
+    def runs(self, day: str) -> Tuple[Segment, ...]:
+        """The day's runs, oldest first"""
+        return self._state[1].get(day, ())
+
+    def label_counts(self, field: str, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, int]:
+        """Events per value of `field` over days in [start, end) ("YYYY-MM-DD"), from segment headers alone"""
+        days, segments = self._state
+        counts: Dict[str, int] = {}
+        for day in days[bisect_left(days, start) if start else 0:bisect_left(days, end) if end else len(days)]:
+            for segment in segments[day]:
+                for value, count in segment.counts[field].items():
+                    counts[value] = counts.get(value, 0) + count
+        return counts
+
+    def iter_events(
+        self,
+        sentiment: Optional[str] = None,
+        before: Optional[SortKey] = None,
+        since: Optional[str] = None,
+        labels: Optional[LabelQuery] = None,
+    ) -> Iterator[dict]:
+        """
+        Events newest first, with `sentiment` (any when None), strictly below
+        `before`, at or after `since` (a normalized timestamp) and passing
+        `labels`. Only the days between `since` and `before` are read.
+        """
+        below = None if before is None else (timestamp_micros(before[0]), before[1])
+        start = None if since is None else timestamp_micros(since)
+        query = LabelQuery(labels.include, labels.exclude, labels.match) if labels else LabelQuery()
+        query.require("user_sentiment", [sentiment] if sentiment is not None else None)
+        with self._reading() as (days, segments):
+            last = len(days) if before is None else bisect_right(days, before[0][:10])
+            first = 0 if since is None else bisect_left(days, since[:10])
+            for day in reversed(days[first:last]):
+                for segment in reversed(segments[day]):
+                    stop = segment.rows if below is None else segment.below(below)
+                    low = 0 if start is None else bisect_left(segment.timestamps, start)
+                    if low >= stop:
+                        continue
+                    for row in segment.rows_descending(low, stop, segment.matching(query) if query else None):
+                        yield segment.event(row)
+
+    def page(self, sentiment=None, limit: int = 20, before=None, since=None, labels=None) -> List[dict]:
+        return list(islice(self.iter_events(sentiment, before, since, labels), limit))
+
+    def get(self, request_id: str) -> Optional[dict]:
+        with self._reading() as (days, segments):
+            for day in reversed(days):
+                for segment in reversed(segments[day]):
+                    row = segment.find(request_id)
+                    if row is not None:
+                        return segment.event(row)
+        return None
+
+    def _add_day(self, day: str, runs: Tuple[Segment, ...], new: List[dict], replaced: List[Segment]) -> Tuple[Segment, ...]:
+        """The day's runs with `new` stored; runs that no longer belong go to `replaced`"""
+        if not runs:
+            path = _run_path(self.directory, day, (0, 0))
+            write_segment(path, new)
+            return (Segment(path),)
+        rows = _sorted_rows(new)
+        tail = runs[-1]
+        if rows[0][0] <= tail.key(tail.rows - 1):
+            # Inside the day's range: rewrite the day as one run, under a
+            # new name that covers every run it replaces
+            batches = (runs[0].batches[0], tail.batches[1] + 1)
+            path = _run_path(self.directory, day, batches)
+            write_segment(path, [event for run in runs for event in run.events()] + new)
+            replaced.extend(runs)
+            return (Segment(path, batches),)
+        sequence = tail.batches[1] + 1
+        path = _run_path(self.directory, day, (sequence, sequence))
+        write_segment(path, new)
+        runs += (Segment(path, (sequence, sequence)),)
+        while len(runs) > 1 and runs[-2].rows <= runs[-1].rows * MERGE_RATIO:
+            older, newer = runs[-2], runs[-1]
+            batches = (older.batches[0], newer.batches[1])
+            path = _run_path(self.directory, day, batches)
+            if not append_segment(path, older, newer.events()):
+                write_segment(path, older.events() + newer.events())
+            replaced.extend((older, newer))
+            runs = runs[:-2] + (Segment(path, batches),)
+        return runs
+
+    def add_many(self, events: List[dict]) -> int:
+        """
+        Store events whose request_id is new: as a new run of each day they
+        fall on, merged as MERGE_RATIO allows, or by rewriting a day they
+        land inside of. Returns the number stored.
+        """
+        with self._write_lock:
+            if self._hashes is None:
+                self._hashes = set()
+                for runs in self._state[1].values():
+                    for segment in runs:
+                        self._hashes.update(segment.request_hashes())
+            fresh: Dict[str, List[dict]] = {}
+            seen = set()
+            for event in events:
+                request_id = event["request_id"]
+                if request_id in seen:
+                    continue
+                # A hash already stored is almost always the same event; the lookup makes sure
+                if request_id_hash(request_id) in self._hashes and self.get(request_id) is not None:
+                    continue
+                seen.add(request_id)
+                if not STORED_TIMESTAMP.fullmatch(event["event_timestamp"]):
+                    event = dict(event, event_timestamp=normalize_timestamp(event["event_timestamp"]))
+                fresh.setdefault(event["event_timestamp"][:10], []).append(event)
+            days, segments = self._state
+            segments = dict(segments)
+            replaced: List[Segment] = []
+            for day, new in fresh.items():
+                segments[day] = self._add_day(day, segments.get(day, ()), new, replaced)
+                self._hashes.update(request_id_hash(event["request_id"]) for event in new)
+            self._state = (sorted(segments), segments)
+            self._retire(replaced)
+            return len(seen)
+
+    def stats(self) -> dict:
+        days, segments = self._state
+        runs = [segment for day_runs in segments.values() for segment in day_runs]
+        return {
+            "segments": len(days),
+            "runs": len(runs),
+            "rows": sum(segment.rows for segment in runs),
+            "bytes": sum(segment.size for segment in runs),
+            "first_day": days[0] if days else None,
+            "last_day": days[-1] if days else None,
+        }
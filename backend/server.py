@@ -1,10 +1,55 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import Optional, List
+import asyncio
+import logging
 import os
+import re
+
+from bitmap_index import LabelIndex, LabelQuery
+from data_sources import BigQueryDataSource, MemoryDataSource, SegmentDataSource, SQLiteDataSource
+from event_store import BackgroundIndex, EventStore, decode_cursor, encode_cursor, normalize_timestamp
+from export import EXPORT_CHUNK_ROWS, EXPORT_ENCODERS, EXPORT_MEDIA_TYPES
+from fast_responses import CompressionMiddleware, FastJSONResponse, describe as describe_fast_responses
+from frustration import FrustrationDetector
+from ingest import (
+    MAX_INGEST_BYTES, IngestError, SentimentCounts, parse_json_batch, parse_json_steps, parse_ndjson_batch,
+    parse_ndjson_steps
+)
+from integrations import INTEGRATION_GROUP, INTEGRATION_GROUPS, IntegrationIndex
+from live_feed import LiveFeed
+from metrics import Metrics, MetricsMiddleware, SamplingProfiler, monitor_loop_lag, record_results
+from near_duplicates import DEFAULT_THRESHOLD as SIMILARITY_THRESHOLD, NearDuplicateIndex
+from projection import MAX_PREVIEW_CHARS, PreviewIndex, parse_fields, project_event
+from quantiles import DEFAULT_QUANTILES, QUANTILE_GROUPINGS, QUANTILE_METRICS, RELATIVE_ACCURACY, QuantileIndex
+from response_cache import ResponseCache, ResponseCacheMiddleware
+from rollups import RollupIndex, parse_bucket_time, summarize
+from search_index import SearchIndex
+from session_index import SessionIndex
+from tool_usage import POSITION_BINS, ShardError, ToolUsageEngine
+from unique_users import STANDARD_ERROR, UNIQUE_USER_FIELDS, UniqueUserIndex
+
+logger = logging.getLogger("uvicorn.error")
 
 app = FastAPI(title="Oracle - HITL Classification Dashboard")
 
+# Cached read endpoints. Entries are tagged with (stored events, search-indexed
+# events, similarity-indexed events), so they go stale as soon as any changes;
+# ingest also clears the cache outright. Added before CORS so cached responses
+# still get CORS headers.
+RESPONSE_CACHE = ResponseCache(version=lambda: (len(EVENT_STORE), len(SEARCH_INDEX), len(NEAR_DUPLICATES)))
+app.add_middleware(
+    ResponseCacheMiddleware,
+    cache=RESPONSE_CACHE,
+    paths=[
+        "/api/sentiments", "/api/hitl-events", "/api/hitl-event/", "/api/trends", "/api/sessions",
+        "/api/at-risk-users", "/api/stats/quantiles", "/api/stats/unique-users", "/api/tool-usage",
+        "/api/clusters", "/api/integrations",
+    ],
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -14,6 +59,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in fast response path: read endpoints return pre-serialisable payloads
+# as FastJSONResponse (orjson, no jsonable_encoder pass), and responses are
+# gzip/brotli-compressed outside the response cache, whose entries stay
+# uncompressed and get their compressed bytes memoised by ETag.
+FAST_RESPONSES = os.environ.get("ORACLE_FAST_RESPONSES", "0") == "1"
+if FAST_RESPONSES:
+    app.add_middleware(CompressionMiddleware)
+    logger.info("Fast responses on: %s", describe_fast_responses())
+
+# Request metrics for /api/metrics (ORACLE_METRICS=0 turns the middleware
+# off). Added last, so it is outermost and times cache hits and compression
+# too. The profiler only samples once switched on at /api/debug/profiler.
+METRICS = Metrics()
+PROFILER = SamplingProfiler()
+METRICS_ENABLED = os.environ.get("ORACLE_METRICS", "1") == "1"
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=METRICS, router=app.router, profiler=PROFILER)
+
+def _respond(payload):
+    return FastJSONResponse(payload) if FAST_RESPONSES else payload
+
 # =============================================================================
 # MODULAR DATA STRUCTURE - Matches BigQuery schema
 # =============================================================================
@@ -276,56 +342,916 @@ HITL_EVENTS_BY_SENTIMENT = {
     ]
 }
 
+# Events are indexed once at import; both event endpoints read from the store
+# instead of the raw dict above.
+EVENT_STORE = EventStore.from_sentiment_map(HITL_EVENTS_BY_SENTIMENT)
+
+# Bitmap per user_intent / user_sentiment / work_category value, for label filters
+LABEL_INDEX = LabelIndex()
+EVENT_STORE.attach(LABEL_INDEX)
+
+# BM25 index over user_curr_message / agent_prev_message, for q= search.
+# Tokenising costs far more per event than the other indexes, so it is fed
+# from a worker thread: ingest returns once events are stored and search
+# catches up shortly after.
+SEARCH_INDEX = SearchIndex(EVENT_STORE.doc)
+SEARCH_INDEXER = BackgroundIndex(SEARCH_INDEX)
+EVENT_STORE.attach(SEARCH_INDEXER)
+
+# MinHash / LSH signatures of user_curr_message, for near-duplicate clusters
+# and similar events; fed from a worker thread, like search
+NEAR_DUPLICATES = NearDuplicateIndex()
+NEAR_DUPLICATE_INDEXER = BackgroundIndex(NEAR_DUPLICATES)
+EVENT_STORE.attach(NEAR_DUPLICATE_INDEXER)
+
+# Word-boundary cut points for preview_chars=PREVIEW_CHARS, computed at ingest
+PREVIEWS = PreviewIndex()
+EVENT_STORE.attach(PREVIEWS)
+
+# Hourly / daily sentiment and intent counts, for /api/trends
+ROLLUPS = RollupIndex()
+EVENT_STORE.attach(ROLLUPS)
+
+# Daily ECU / execution_time quantile sketches per group, for /api/stats/quantiles
+QUANTILES = QuantileIndex()
+EVENT_STORE.attach(QUANTILES)
+
+# HyperLogLog sketches of user_id per label and day, for unique_users counts
+UNIQUE_USERS = UniqueUserIndex()
+EVENT_STORE.attach(UNIQUE_USERS)
+
+# Daily integration mentions from work_subcategory, parsed once here, for /api/integrations/demand
+INTEGRATIONS = IntegrationIndex()
+EVENT_STORE.attach(INTEGRATIONS)
+
+# Per-job_id timelines and running summaries, for the session endpoints
+SESSIONS = SessionIndex(EVENT_STORE.sort_key)
+EVENT_STORE.attach(SESSIONS)
+
+# Per-user frustrated-event counts over a sliding 7-day window, for /api/at-risk-users
+FRUSTRATION = FrustrationDetector()
+EVENT_STORE.attach(FRUSTRATION)
+
+# Server-Sent Events fan-out of newly ingested events, for /api/live/hitl-events
+LIVE_FEED = LiveFeed(EVENT_STORE.doc)
+EVENT_STORE.attach(LIVE_FEED)
+
+# SENTIMENT_CATEGORIES already counts the events above, so only events
+# ingested from now on are added to it
+SENTIMENT_COUNTS = SentimentCounts(SENTIMENT_CATEGORIES)
+EVENT_STORE.attach(SENTIMENT_COUNTS, replay=False)
+
+# Trajectory steps sharded by job across worker processes, for /api/tool-usage.
+# Fed by POST /api/ingest/trajectories, not by the event store; workers start
+# with the first batch or report
+TOOL_USAGE = ToolUsageEngine(
+    int(os.environ.get("ORACLE_TOOL_USAGE_PROCESSES", min(4, os.cpu_count() or 1))),
+    on_restart=RESPONSE_CACHE.invalidate,
+)
+
+def _make_data_source(kind: str):
+    """
+    Where /api/sentiments and the event pages read from (ORACLE_DATA_SOURCE):
+    "memory" (default) serves the store above; "sqlite" is an offline stand-in
+    for BigQuery (ORACLE_SQLITE_PATH, seeded with the mock events when empty);
+    "segments" maps the day segments in ORACLE_SEGMENT_DIR (seeded likewise),
+    which persist ingested events across restarts; "bigquery" queries
+    ORACLE_BIGQUERY_TABLE. Search, trends and export always use the in-memory
+    indexes.
+    """
+    memory = MemoryDataSource(EVENT_STORE, LABEL_INDEX, SENTIMENT_COUNTS)
+    if kind == "memory":
+        return memory
+    if kind == "sqlite":
+        source = SQLiteDataSource(os.environ.get("ORACLE_SQLITE_PATH", "file:oracle?mode=memory&cache=shared"))
+        if source.is_empty():
+            source.insert_many_sync([EVENT_STORE.doc(doc) for doc in range(len(EVENT_STORE))])
+        return source
+    if kind == "segments":
+        source = SegmentDataSource(os.environ.get("ORACLE_SEGMENT_DIR", os.path.join(os.path.dirname(__file__), "segments")))
+        if source.is_empty():
+            source.insert_many_sync([EVENT_STORE.doc(doc) for doc in range(len(EVENT_STORE))])
+        return source
+    if kind == "bigquery":
+        return BigQueryDataSource(os.environ.get("ORACLE_BIGQUERY_TABLE", "agent_analytics.intent_classification_events"))
+    raise ValueError(f"Unknown ORACLE_DATA_SOURCE: {kind!r} (expected memory, sqlite, segments or bigquery)")
+
+DATA_SOURCE = _make_data_source(os.environ.get("ORACLE_DATA_SOURCE", "memory"))
+
+# Set by prefork.py, which loads the dataset once and forks the workers that
+# serve it: they share it copy-on-write, so it is read-only there (ingest
+# returns 409), and WORKER is the worker's index
+READ_ONLY = False
+WORKER = None
+
+def _require_writable():
+    if READ_ONLY:
+        raise HTTPException(status_code=409, detail="Ingest is disabled: the workers serve a shared, preloaded dataset")
+
+async def _read_batch(request: Request) -> bytes:
+    """The request body, refused with 413 as soon as it is known to pass MAX_INGEST_BYTES"""
+    too_large = HTTPException(status_code=413, detail=f"Batch larger than {MAX_INGEST_BYTES} bytes")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_INGEST_BYTES:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_INGEST_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+# Gauges and counters read from the components' stats() at scrape time
+METRICS.register_stats(
+    "oracle",
+    lambda: {
+        "events_stored": len(EVENT_STORE),
+        "search_indexed": len(SEARCH_INDEX),
+        "search_pending": SEARCH_INDEXER.pending,
+        "near_duplicates_indexed": len(NEAR_DUPLICATES),
+        "near_duplicates_pending": NEAR_DUPLICATE_INDEXER.pending,
+        "sessions": len(SESSIONS),
+        **{f"tool_usage_{key}": value for key, value in TOOL_USAGE.stats().items()},
+    },
+    "Dataset size",
+    gauges=(
+        "events_stored", "search_indexed", "search_pending", "near_duplicates_indexed", "near_duplicates_pending",
+        "sessions", "tool_usage_jobs", "tool_usage_steps",
+    ),
+)
+METRICS.register_stats(
+    "oracle_response_cache", RESPONSE_CACHE.stats, "Response cache",
+    counters=("hits", "misses", "not_modified", "stores", "evictions", "expirations", "invalidations"),
+    gauges=("entries", "bytes"),
+)
+METRICS.register_stats("oracle_data_source", DATA_SOURCE.stats, "Data source", counters=("queries", "coalesced"))
+METRICS.register_stats("oracle_tool_usage", TOOL_USAGE.stats, "Tool usage workers", counters=("restarts",))
+METRICS.register_stats(
+    "oracle_live_feed", LIVE_FEED.stats, "Live feed",
+    counters=("events", "flushes", "sent", "dropped"), gauges=("subscribers", "channels"),
+)
+METRICS.register_stats("oracle_frustration", FRUSTRATION.stats, "Frustration", gauges=("tracked_users", "at_risk_users"))
+METRICS.register_stats(
+    "oracle_label_index", LABEL_INDEX.stats, "Label bitmap index",
+    counters=("queries", "bitmap_hits", "bitmap_misses"), gauges=("values",),
+)
+METRICS.register_stats(
+    "oracle_search", SEARCH_INDEX.stats, "Search index", counters=("searches", "empty_searches", "results"),
+)
+METRICS.register_stats(
+    "oracle_session_index", SESSIONS.stats, "Session index",
+    counters=("lookups", "lookup_misses", "rankings", "ranked_scanned"),
+)
+
 # =============================================================================
 # API ENDPOINTS
 # =============================================================================
 
+@app.on_event("shutdown")
+async def close_data_source():
+    await DATA_SOURCE.close()
+
+@app.on_event("startup")
+async def start_tool_usage():
+    await run_in_threadpool(TOOL_USAGE.start)
+
+@app.on_event("shutdown")
+async def close_tool_usage():
+    await run_in_threadpool(TOOL_USAGE.close)
+
+_LOOP_LAG_TASK = None
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    global _LOOP_LAG_TASK
+    if METRICS_ENABLED:
+        _LOOP_LAG_TASK = asyncio.create_task(monitor_loop_lag(METRICS))
+
+@app.on_event("shutdown")
+async def stop_profiling():
+    if _LOOP_LAG_TASK is not None:
+        _LOOP_LAG_TASK.cancel()
+    await run_in_threadpool(PROFILER.stop)
+
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "service": "Oracle - HITL Classification Dashboard"}
+    return {
+        "status": "healthy",
+        "service": "Oracle - HITL Classification Dashboard",
+        "data_source": DATA_SOURCE.stats(),
+        "fast_responses": FAST_RESPONSES,
+        "worker": WORKER,
+        "read_only": READ_ONLY
+    }
 
 @app.get("/api/sentiments")
 async def get_sentiment_categories():
     """
-    Get sentiment categories with counts
-    Equivalent to: SELECT user_sentiment, COUNT(*) FROM agent_analytics.intent_classification_events GROUP BY 1 ORDER BY 2 DESC
+    Get sentiment categories with counts and estimated distinct users, including events ingested since startup
+    Equivalent to: SELECT user_sentiment, COUNT(*), APPROX_COUNT_DISTINCT(user_id)
+                   FROM agent_analytics.intent_classification_events GROUP BY 1 ORDER BY 2 DESC
+    """
+    categories = await DATA_SOURCE.sentiment_counts()
+    # BigQuery counts users itself; every other source holds the events the sketches saw
+    if categories and "unique_users" not in categories[0]:
+        users = UNIQUE_USERS.count("sentiment")
+        categories = [{**category, "unique_users": users.get(category["sentiment"], 0)} for category in categories]
+    return _respond(categories)
+
+def _parse_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def label_filters(
+    intent: Optional[List[str]] = Query(default=None, description="Events with these user_intent values"),
+    work_category: Optional[List[str]] = Query(default=None, description="Events with these work_category values"),
+    not_intent: Optional[List[str]] = Query(default=None, description="Exclude events with any of these intents"),
+    not_sentiment: Optional[List[str]] = Query(default=None, description="Exclude events with any of these sentiments"),
+    not_work_category: Optional[List[str]] = Query(default=None, description="Exclude events with any of these categories"),
+    match: str = Query(default="any", pattern="^(any|all)$", description="Within a field, require any or all listed values")
+) -> LabelQuery:
+    """
+    Label filters shared by the event endpoints. Values within a field are ORed
+    (match=any) or ANDed (match=all), fields are ANDed, not_* values are excluded.
+    Equivalent to: WHERE ('req_same_bug_fix' IN UNNEST(user_intent) OR ...) AND NOT 'design' IN UNNEST(work_category) ...
     """
-    return SENTIMENT_CATEGORIES
+    return LabelQuery(
+        include={"user_intent": intent, "work_category": work_category},
+        exclude={"user_intent": not_intent, "user_sentiment": not_sentiment, "work_category": not_work_category},
+        match=match
+    )
+
+def event_shape(
+    fields: Optional[List[str]] = Query(default=None, description="Only return these fields (request_id and event_timestamp are always kept)"),
+    preview_chars: Optional[int] = Query(default=None, ge=1, le=MAX_PREVIEW_CHARS, description="Cut message fields to about this many characters")
+):
+    """Payload options shared by the event endpoints: field projection and message previews"""
+    return parse_fields(fields), preview_chars
+
+def _shaped(events: List[dict], shape) -> List[dict]:
+    fields, preview_chars = shape
+    if fields is None and preview_chars is None:
+        return events
+    return [
+        project_event(event, fields, preview_chars, PREVIEWS, EVENT_STORE.doc_id(event["request_id"]))
+        for event in events
+    ]
+
+def _matching(labels: LabelQuery):
+    """Doc-id bitmap for the label filters, or None when no filter was given"""
+    return LABEL_INDEX.match(labels) if labels else None
+
+def date_range(
+    start: Optional[str] = Query(default=None, description="Only events at or after this date or time"),
+    end: Optional[str] = Query(default=None, description="Only events before this date or time")
+):
+    """Date bounds shared by the event pages: (since, until) as normalized timestamps"""
+    return _parse_timestamp("start", start), _parse_timestamp("end", end)
+
+def _rollup_window(granularity: str, start: Optional[str], end: Optional[str]):
+    """Bucket start times of a rollup window (see RollupIndex.window); 400 for bad or over-wide bounds"""
+    since = _parse_timestamp("start", start)
+    until = _parse_timestamp("end", end)
+    try:
+        return ROLLUPS.window(
+            granularity,
+            start=parse_bucket_time(since) if since else None,
+            end=parse_bucket_time(until) if until else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def trend_window(
+    granularity: str = Query(default="day", pattern="^(hour|day)$"),
+    start: Optional[str] = Query(default=None, description="Inclusive window start; defaults to 30 days (48 hours) before end"),
+    end: Optional[str] = Query(default=None, description="Exclusive window end; defaults to just after the latest event")
+):
+    """(granularity, bucket start times) for /api/trends"""
+    return granularity, _rollup_window(granularity, start, end)
+
+def day_window(
+    start: Optional[str] = Query(default=None, description="Inclusive window start; defaults to 30 days before end"),
+    end: Optional[str] = Query(default=None, description="Exclusive window end; defaults to the end of the latest event's day")
+) -> List[str]:
+    """Whole days shared by the sketch-backed stats endpoints, as "YYYY-MM-DD" labels, oldest first"""
+    return [day.strftime("%Y-%m-%d") for day in _rollup_window("day", start, end)]
+
+def _page_bounds(cursor: Optional[str], dates):
+    """(before, since) for a page: the cursor, tightened to the end of the date range"""
+    before = _parse_cursor(cursor)
+    since, until = dates
+    if until is not None and (before is None or (until, "") < before):
+        before = (until, "")
+    return before, since
+
+def _search(q: str, cursor: Optional[str], labels: LabelQuery, limit: int):
+    """Relevance-ranked events for q= (one page, best first), restricted by the label filters"""
+    if cursor is not None:
+        raise HTTPException(status_code=400, detail="cursor cannot be combined with q")
+    hits = SEARCH_INDEX.search(q, limit, candidates=_matching(labels))
+    return [dict(EVENT_STORE.doc(doc), score=round(score, 4)) for doc, score in hits]
 
 @app.get("/api/hitl-events/{sentiment}")
-async def get_hitl_events_by_sentiment(sentiment: str, limit: int = Query(default=20, le=100)):
+async def get_hitl_events_by_sentiment(
+    sentiment: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    q: Optional[str] = Query(default=None, description='Full-text search; "quoted phrases" must match exactly'),
+    labels: LabelQuery = Depends(label_filters),
+    shape = Depends(event_shape),
+    dates = Depends(date_range)
+):
     """
-    Get HITL classification events filtered by sentiment
+    Get HITL classification events filtered by sentiment (and optional label filters), one keyset page at a time.
+    start= / end= bound event_timestamp, so partitioned sources only read those days.
+    With q=, returns the best `limit` matches ranked by BM25 instead of by time.
+    fields= / preview_chars= shrink each event; cut messages are listed under "truncated"
+    and the full event is at /api/hitl-event/{request_id}.
     Equivalent to: SELECT event_timestamp, request_id, user_curr_message, agent_prev_message, user_intent, user_sentiment 
                    FROM agent_analytics.intent_classification_events 
-                   WHERE ? IN UNNEST(user_sentiment) 
-                   ORDER BY event_timestamp DESC LIMIT 20
+                   WHERE ? IN UNNEST(user_sentiment) AND event_timestamp >= @start AND event_timestamp < @end
+                     AND (event_timestamp < @ts OR (event_timestamp = @ts AND request_id < @request_id))
+                   ORDER BY event_timestamp DESC, request_id DESC LIMIT 20
     """
-    if sentiment not in HITL_EVENTS_BY_SENTIMENT:
+    if not DATA_SOURCE.has_sentiment(sentiment):
         raise HTTPException(status_code=404, detail=f"No events found for sentiment: {sentiment}")
     
-    events = HITL_EVENTS_BY_SENTIMENT[sentiment][:limit]
-    return {
+    if q:
+        if any(dates):
+            raise HTTPException(status_code=400, detail="start and end cannot be combined with q")
+        events = _shaped(_search(q, cursor, labels.require("user_sentiment", [sentiment]), limit), shape)
+        record_results(len(events))
+        return _respond({"sentiment": sentiment, "q": q, "count": len(events), "events": events, "next_cursor": None})
+    
+    before, since = _page_bounds(cursor, dates)
+    events, next_key = await DATA_SOURCE.events_page(sentiment, limit, before=before, labels=labels, since=since)
+    events = _shaped(events, shape)
+    record_results(len(events))
+    return _respond({
         "sentiment": sentiment,
         "count": len(events),
-        "events": events
-    }
+        "events": events,
+        "next_cursor": encode_cursor(next_key) if next_key else None
+    })
 
 @app.get("/api/hitl-events")
-async def get_all_hitl_events(limit: int = Query(default=20, le=100)):
-    """Get all HITL events across all sentiments"""
-    all_events = []
-    for sentiment, events in HITL_EVENTS_BY_SENTIMENT.items():
-        all_events.extend(events)
+async def get_all_hitl_events(
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    sentiment: Optional[List[str]] = Query(default=None, description="Events with these user_sentiment values"),
+    q: Optional[str] = Query(default=None, description='Full-text search; "quoted phrases" must match exactly'),
+    labels: LabelQuery = Depends(label_filters),
+    shape = Depends(event_shape),
+    dates = Depends(date_range)
+):
+    """
+    Get all HITL events across all sentiments (or the listed ones), newest first and de-duplicated by request_id.
+    With q=, returns the best `limit` matches ranked by BM25 instead of by time.
+    fields= / preview_chars= shrink each event, and start= / end= bound the dates,
+    as for /api/hitl-events/{sentiment}.
+    """
+    labels.require("user_sentiment", sentiment)
+    if q:
+        if any(dates):
+            raise HTTPException(status_code=400, detail="start and end cannot be combined with q")
+        events = _shaped(_search(q, cursor, labels, limit), shape)
+        record_results(len(events))
+        return _respond({"sentiment": "all", "q": q, "count": len(events), "events": events, "next_cursor": None})
+    before, since = _page_bounds(cursor, dates)
+    events, next_key = await DATA_SOURCE.events_page(None, limit, before=before, labels=labels, since=since)
+    events = _shaped(events, shape)
+    record_results(len(events))
+    return _respond({
+        "sentiment": "all",
+        "count": len(events),
+        "events": events,
+        "next_cursor": encode_cursor(next_key) if next_key else None
+    })
+
+@app.get("/api/hitl-event/{request_id}")
+async def get_hitl_event(request_id: str):
+    """
+    One full HITL event, for expanding a truncated preview
+    Equivalent to: SELECT * FROM agent_analytics.intent_classification_events WHERE request_id = ? LIMIT 1
+    """
+    event = await DATA_SOURCE.get_event(request_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail=f"No event found with request_id: {request_id}")
+    return _respond(event)
+
+def _parse_timestamp(name: str, value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return normalize_timestamp(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{name}: {e}")
+
+@app.get("/api/sessions")
+async def get_sessions(
+    limit: int = Query(default=100, ge=1, le=1000),
+    since: Optional[str] = Query(default=None, description="Only sessions with an event at or after this time"),
+    sentiment: Optional[str] = Query(default=None, description="Only sessions with an event of this sentiment")
+):
+    """
+    Session (job_id) summaries with the highest ECU, read from the session index.
+    Equivalent to: SELECT job_id, user_id, MIN(event_timestamp) as session_start, MAX(event_timestamp) as session_end,
+                          MAX(state_number) as total_states, MAX(trajectory_ecu_consumed) as total_ecu_consumed,
+                          ARRAY_AGG(DISTINCT intent) as all_intents, ARRAY_AGG(DISTINCT sentiment) as all_sentiments
+                   FROM agent_analytics.intent_classification_events, UNNEST(user_intent) as intent, UNNEST(user_sentiment) as sentiment
+                   GROUP BY job_id, user_id ORDER BY total_ecu_consumed DESC LIMIT 100
+    """
+    sessions = SESSIONS.top_by_ecu(limit, since=_parse_timestamp("since", since), sentiment=sentiment)
+    record_results(len(sessions))
+    return _respond({"count": len(sessions), "total_sessions": len(SESSIONS), "sessions": sessions})
+
+def _session_timeline(job_id: str, limit: int, shape) -> dict:
+    session = SESSIONS.get(job_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"No session found with job_id: {job_id}")
+    events = _shaped([EVENT_STORE.doc(doc) for doc in SESSIONS.timeline(job_id)[:limit]], shape)
+    return {**session, "events": events}
+
+@app.get("/api/sessions/{job_id}")
+async def get_session(
+    job_id: str,
+    limit: int = Query(default=500, ge=1, le=5000, description="Return at most this many events, oldest first"),
+    shape = Depends(event_shape)
+):
+    """
+    One session's summary and its events in time order
+    Equivalent to: SELECT * FROM agent_analytics.intent_classification_events WHERE job_id = ? ORDER BY event_timestamp
+    """
+    return _respond(_session_timeline(job_id, limit, shape))
+
+@app.get("/api/hitl-event/{request_id}/session")
+async def get_event_session(
+    request_id: str,
+    limit: int = Query(default=500, ge=1, le=5000, description="Return at most this many events, oldest first"),
+    shape = Depends(event_shape)
+):
+    """The session an event belongs to (as /api/sessions/{job_id}), for seeing the conversation around it"""
+    event = EVENT_STORE.get(request_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail=f"No event found with request_id: {request_id}")
+    if not isinstance(event.get("job_id"), str):
+        raise HTTPException(status_code=404, detail=f"Event {request_id} has no job_id")
+    return _respond({"request_id": request_id, **_session_timeline(event["job_id"], limit, shape)})
+
+@app.get("/api/hitl-event/{request_id}/similar")
+async def get_similar_events(
+    request_id: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    threshold: float = Query(default=SIMILARITY_THRESHOLD, ge=0.3, le=1.0, description="Minimum estimated similarity of user_curr_message"),
+    shape = Depends(event_shape)
+):
+    """
+    Events whose user_curr_message is a near duplicate of this event's, most similar first,
+    by MinHash estimates of the Jaccard similarity of their 5-character shingles
+    """
+    doc = EVENT_STORE.doc_id(request_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail=f"No event found with request_id: {request_id}")
+    matches = NEAR_DUPLICATES.similar(doc, threshold, limit)
+    events = _shaped([EVENT_STORE.doc(match) for match, _ in matches], shape)
+    record_results(len(events))
+    return _respond({
+        "request_id": request_id,
+        "threshold": threshold,
+        "count": len(events),
+        "events": [dict(event, similarity=round(score, 4)) for event, (_, score) in zip(events, matches)]
+    })
+
+@app.get("/api/at-risk-users")
+async def get_at_risk_users(
+    limit: int = Query(default=100, ge=1, le=1000),
+    min_events: Optional[int] = Query(default=None, ge=1, description="Frustrated events in the window (default: the at-risk threshold)"),
+    flags: int = Query(default=0, ge=0, le=1000, description="Also return this many of the latest threshold crossings")
+):
+    """
+    Users with repeated frustration in the 7 days up to the newest event, kept current as events are ingested
+    Equivalent to: SELECT user_id, COUNT(*) as frustrated_events, MAX(event_timestamp) as last_frustrated_at,
+                          ARRAY_AGG(DISTINCT intent) as related_intents
+                   FROM agent_analytics.intent_classification_events, UNNEST(user_intent) as intent
+                   WHERE DATE(event_timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 7 DAY) AND 'frustrated' IN UNNEST(user_sentiment)
+                   GROUP BY user_id HAVING frustrated_events >= 2 ORDER BY frustrated_events DESC
+    """
+    users = FRUSTRATION.at_risk(limit, min_events=min_events)
+    record_results(len(users))
+    payload = {
+        "window_hours": FRUSTRATION.window_hours,
+        "threshold": FRUSTRATION.threshold,
+        "as_of": FRUSTRATION.watermark,
+        "count": len(users),
+        "users": users,
+    }
+    if flags:
+        payload["recent_flags"] = FRUSTRATION.recent_flags(flags)
+    return _respond(payload)
+
+def _clusters(docs, threshold: float, min_size: int, limit: int, per_cluster: int, shape) -> List[dict]:
+    clusters = []
+    for group in NEAR_DUPLICATES.clusters(docs, threshold, min_size)[:limit]:
+        clusters.append({
+            "size": len(group),
+            "first_seen": EVENT_STORE.sort_key(group[-1])[0],
+            "last_seen": EVENT_STORE.sort_key(group[0])[0],
+            "events": _shaped([EVENT_STORE.doc(doc) for doc in group[:per_cluster]], shape),
+        })
+    return clusters
+
+@app.get("/api/clusters")
+async def get_clusters(
+    limit: int = Query(default=20, ge=1, le=200),
+    min_size: int = Query(default=2, ge=2, description="Only clusters with at least this many events"),
+    threshold: float = Query(default=SIMILARITY_THRESHOLD, ge=0.3, le=1.0, description="Minimum estimated similarity of user_curr_message"),
+    events_per_cluster: int = Query(default=5, ge=1, le=100, description="Newest events returned per cluster"),
+    sentiment: Optional[List[str]] = Query(default=None, description="Events with these user_sentiment values"),
+    labels: LabelQuery = Depends(label_filters),
+    shape = Depends(event_shape),
+    dates = Depends(date_range)
+):
+    """
+    Groups of events with near-duplicate user_curr_message (e.g. intent=req_same_bug_fix), largest first,
+    so one cluster can be triaged instead of each event. Messages are compared through MinHash / LSH
+    buckets, never pairwise; a cluster joins messages linked by a chain of similar pairs.
+    """
+    since, until = dates
+    docs = EVENT_STORE.iter_docs(
+        before=(until, "") if until is not None else None,
+        since=since,
+        matching=_matching(labels.require("user_sentiment", sentiment))
+    )
+    clusters = await run_in_threadpool(_clusters, docs, threshold, min_size, limit, events_per_cluster, shape)
+    record_results(len(clusters))
+    return _respond({"threshold": threshold, "count": len(clusters), "clusters": clusters})
+
+@app.get("/api/live/hitl-events")
+async def live_hitl_events(
+    sentiment: Optional[List[str]] = Query(default=None, description="Only events with any of these sentiments"),
+    intent: Optional[List[str]] = Query(default=None, description="Only events with any of these intents"),
+    shape = Depends(event_shape)
+):
+    """
+    Newly ingested events as Server-Sent Events (text/event-stream), each as a
+    `data:` line with the event JSON, shaped like the event endpoints. A client
+    that falls too far behind gets an `event: dropped` message with the number
+    of events it missed, and should refetch the first page.
+    """
+    fields, preview_chars = shape
+    subscriber = LIVE_FEED.subscribe(
+        frozenset(sentiment or ()),
+        frozenset(intent or ()),
+        (tuple(fields) if fields is not None else None, preview_chars),
+        lambda events: _shaped(events, shape),
+    )
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many live feed subscribers")
+    return StreamingResponse(
+        subscriber.stream(),
+        media_type="text/event-stream",
+        # No proxy buffering, so events reach the client as they are sent
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/live/stats")
+async def get_live_stats():
+    """Live feed subscribers, channels and sent / dropped message counters"""
+    return LIVE_FEED.stats()
+
+def _export_events(loop, labels: LabelQuery, before, since):
+    """
+    Every matching event, newest first, read from DATA_SOURCE a page at a time.
+    Runs on a worker thread (see export_hitl_events), so it waits for each page
+    while the event loop fetches it.
+    """
+    while True:
+        page = DATA_SOURCE.events_page(None, EXPORT_CHUNK_ROWS, before=before, labels=labels, since=since)
+        events, before = asyncio.run_coroutine_threadsafe(page, loop).result()
+        yield from events
+        if before is None:
+            return
+
+@app.get("/api/export/hitl-events")
+async def export_hitl_events(
+    request: Request,
+    fmt: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    sentiment: Optional[List[str]] = Query(default=None, description="Events with these user_sentiment values; omit to export all"),
+    labels: LabelQuery = Depends(label_filters),
+    dates = Depends(date_range)
+):
+    """
+    Stream every matching HITL event as NDJSON or CSV, newest first, with the filters of /api/hitl-events
+    Equivalent to: SELECT event_timestamp, request_id, user_intent, user_sentiment, user_curr_message, agent_prev_message
+                   FROM agent_analytics.intent_classification_events
+                   WHERE ? IN UNNEST(user_sentiment) AND event_timestamp >= @start AND event_timestamp < @end
+                   ORDER BY event_timestamp DESC
+    """
+    labels.require("user_sentiment", sentiment)
+    before, since = _page_bounds(None, dates)
+    events = _export_events(asyncio.get_running_loop(), labels, before, since)
+    chunks = EXPORT_ENCODERS[fmt](events)
     
-    # Sort by timestamp descending
-    all_events.sort(key=lambda x: x["event_timestamp"], reverse=True)
+    async def stream():
+        # Pages are read and encoded on a worker thread, a chunk at a time, so
+        # the event loop stays free and a disconnected client stops the export
+        async for chunk in iterate_in_threadpool(chunks):
+            if await request.is_disconnected():
+                break
+            yield chunk
+    
+    name = re.sub(r"[^A-Za-z0-9_-]+", "_", "-".join(sentiment)) if sentiment else "all"
+    filename = f"hitl-events-{name}.{fmt}"
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/trends")
+async def get_trends(
+    window = Depends(trend_window),
+    sentiment: Optional[str] = Query(default=None, description="Restrict counts to events with this sentiment")
+):
+    """
+    Sentiment and intent counts per time bucket, with bug resolution / recurrence rates, read from rollups.
+    Daily buckets and the totals also carry estimated distinct users ("unique_users": overall, per sentiment
+    and per intent; only overall with a sentiment filter), merged from per-day HyperLogLog sketches.
+    Equivalent to: SELECT DATE(event_timestamp) as date, sentiment, COUNT(*) as count, APPROX_COUNT_DISTINCT(user_id)
+                   FROM agent_analytics.intent_classification_events, UNNEST(user_sentiment) as sentiment
+                   WHERE event_timestamp >= @start AND event_timestamp < @end
+                   GROUP BY date, sentiment ORDER BY date
+    """
+    if sentiment is not None and not EVENT_STORE.has_sentiment(sentiment):
+        raise HTTPException(status_code=404, detail=f"No events found for sentiment: {sentiment}")
+    granularity, starts = window
+    buckets = ROLLUPS.trends(granularity, starts, sentiment=sentiment)
+    totals = summarize(buckets)
+    if granularity == "day":
+        days = [row["bucket"] for row in buckets]
+        if sentiment is None:
+            # Keyed like the counts: "all", then "sentiments" and "intents" per label
+            for key, field in (("all", "all"), ("sentiments", "sentiment"), ("intents", "intent")):
+                for row, users in zip(buckets, UNIQUE_USERS.daily(field, days).values()):
+                    row.setdefault("unique_users", {})[key] = users.get("all", 0) if key == "all" else users
+                users = UNIQUE_USERS.count(field, days)
+                totals.setdefault("unique_users", {})[key] = users.get("all", 0) if key == "all" else users
+        else:
+            for row, users in zip(buckets, UNIQUE_USERS.daily("sentiment", days).values()):
+                row["unique_users"] = {"all": users.get(sentiment, 0)}
+            totals["unique_users"] = {"all": UNIQUE_USERS.count("sentiment", days).get(sentiment, 0)}
+    return _respond({
+        "granularity": granularity,
+        "sentiment": sentiment or "all",
+        "start": buckets[0]["bucket"] if buckets else None,
+        "end": buckets[-1]["bucket"] if buckets else None,
+        "totals": totals,
+        "buckets": buckets
+    })
+
+@app.get("/api/stats/quantiles")
+async def get_quantile_stats(
+    metric: str = Query(default="trajectory_ecu_consumed", pattern=f"^({'|'.join(QUANTILE_METRICS)})$"),
+    group_by: str = Query(default="all", pattern=f"^({'|'.join(QUANTILE_GROUPINGS)})$"),
+    labels: List[str] = Depends(day_window),
+    q: Optional[List[float]] = Query(default=None, description="Quantiles between 0 and 1 (default: 0.5, 0.9, 0.99)")
+):
+    """
+    Per-group count, mean, min, max and quantiles of a numeric column over whole days, merged from daily sketches.
+    Quantiles are within RELATIVE_ACCURACY (1%) of the exact value; the rest is exact.
+    Equivalent to: SELECT CASE WHEN 'credit_concern' IN UNNEST(user_intent) THEN 'concern_raised' ELSE 'no_concern' END as credit_flag,
+                          AVG(trajectory_ecu_consumed) as avg_ecu,
+                          APPROX_QUANTILES(trajectory_ecu_consumed, 100)[OFFSET(50)] as median_ecu, COUNT(*) as events
+                   FROM agent_analytics.intent_classification_events
+                   WHERE DATE(event_timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
+                   GROUP BY credit_flag
+    """
+    qs = q or list(DEFAULT_QUANTILES)
+    if len(qs) > 20 or not all(0 <= value <= 1 for value in qs):
+        raise HTTPException(status_code=400, detail="q takes up to 20 quantiles between 0 and 1")
+    groups = QUANTILES.stats(metric, group_by, labels, qs)
+    return _respond({
+        "metric": metric,
+        "group_by": group_by,
+        "start": labels[0] if labels else None,
+        "end": labels[-1] if labels else None,
+        "relative_accuracy": RELATIVE_ACCURACY,
+        "groups": groups
+    })
+
+@app.get("/api/stats/unique-users")
+async def get_unique_user_stats(
+    group_by: str = Query(default="all", pattern=f"^({'|'.join(UNIQUE_USER_FIELDS)})$"),
+    labels: List[str] = Depends(day_window)
+):
+    """
+    Estimated distinct users per label over whole days, merged from daily HyperLogLog sketches
+    (standard error STANDARD_ERROR, 1.6%).
+    Equivalent to: SELECT intent, APPROX_COUNT_DISTINCT(user_id) as unique_users
+                   FROM agent_analytics.intent_classification_events, UNNEST(user_intent) as intent
+                   WHERE DATE(event_timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
+                   GROUP BY intent ORDER BY unique_users DESC
+    """
+    users = UNIQUE_USERS.count(group_by, labels)
+    groups = [{"group": group, "unique_users": count} for group, count in users.items()]
+    groups.sort(key=lambda row: (-row["unique_users"], row["group"]))
+    return _respond({
+        "group_by": group_by,
+        "start": labels[0] if labels else None,
+        "end": labels[-1] if labels else None,
+        "standard_error": round(STANDARD_ERROR, 4),
+        "groups": groups
+    })
+
+@app.get("/api/integrations/demand")
+async def get_integration_demand(
+    labels: List[str] = Depends(day_window),
+    group: Optional[str] = Query(default=None, pattern=f"^({'|'.join(map(re.escape, INTEGRATION_GROUPS))})$",
+                                 description="Only integrations of this knowledge base group (Payment, LLM/AI, ...)"),
+    limit: int = Query(default=50, ge=1, le=200, description="Integrations returned, most mentioned first"),
+    daily: bool = Query(default=True, description="Include per-day buckets")
+):
+    """
+    Events naming each standardised integration in work_subcategory over whole days, with those carrying
+    the requested_integration intent and estimated distinct users, read from daily counts of subcategories
+    parsed at ingest. Items under the integration category that match no standardised name are listed
+    as "unrecognized".
+    Equivalent to: SELECT subcategory, COUNT(*) as mentions, COUNT(DISTINCT user_id) as unique_users
+                   FROM agent_analytics.intent_classification_events, UNNEST(work_subcategory) as subcategory
+                   WHERE DATE(event_timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
+                     AND 'integration' IN UNNEST(work_category)
+                   GROUP BY subcategory ORDER BY mentions DESC
+    """
+    included = (lambda name: INTEGRATION_GROUP[name] == group) if group else (lambda name: True)
+    mentions = {name: count for name, count in INTEGRATIONS.mentions(labels).items() if included(name)}
+    requests = INTEGRATIONS.requests(labels)
+    users = UNIQUE_USERS.count("integration", labels)
+    integrations = [
+        {
+            "integration": name,
+            "group": INTEGRATION_GROUP[name],
+            "mentions": count,
+            "requests": requests.get(name, 0),
+            "unique_users": users.get(name, 0),
+        }
+        for name, count in mentions.items()
+    ]
+    integrations.sort(key=lambda row: (-row["mentions"], row["integration"]))
+    integrations = integrations[:limit]
+    record_results(len(integrations))
+    payload = {
+        "start": labels[0] if labels else None,
+        "end": labels[-1] if labels else None,
+        "group": group or "all",
+        "totals": {"mentions": sum(mentions.values()), "requests": sum(requests.get(name, 0) for name in mentions)},
+        "integrations": integrations,
+    }
+    if group is None:
+        unrecognized = sorted(INTEGRATIONS.unrecognized(labels).items(), key=lambda item: (-item[1], item[0]))
+        payload["unrecognized"] = [{"item": item, "mentions": count} for item, count in unrecognized[:limit]]
+    if daily:
+        names = [row["integration"] for row in integrations]
+        payload["buckets"] = [
+            {
+                "bucket": label,
+                "mentions": {name: day_mentions[name] for name in names if name in day_mentions},
+                "requests": {name: day_requests[name] for name in names if name in day_requests},
+                "unique_users": {name: day_users[name] for name in names if name in day_users},
+            }
+            for label, (day_mentions, day_requests), day_users in zip(
+                labels, INTEGRATIONS.daily(labels), UNIQUE_USERS.daily("integration", labels).values()
+            )
+        ]
+    return _respond(payload)
+
+@app.get("/api/tool-usage")
+async def get_tool_usage(
+    start: Optional[str] = Query(default=None, description="Only jobs started at or after this date or time"),
+    end: Optional[str] = Query(default=None, description="Only jobs started before this date or time"),
+    model_name: Optional[List[str]] = Query(default=None),
+    agent_name: Optional[str] = Query(default=None, description="EmergentAssistant, SkilledAssistant or All"),
+    prompt_name: Optional[List[str]] = Query(default=None),
+    user_id_last_char: Optional[List[str]] = Query(default=None, description="User sample by last user_id character"),
+    min_calls: int = Query(default=0, ge=0, description="Only tools with at least this many calls")
+):
+    """
+    Per-tool usage over trajectory steps ingested through /api/ingest/trajectories: how many of the
+    selected jobs use each tool, how often, how successfully and how early (the "Model/Prompt Eval"
+    report). Computed across the tool usage worker processes.
+    Equivalent to: Redash query #2375 over analytics.trajectories_full_view JOIN analytics.jobs_full_view
+                   (Tool, Total_Jobs, Tool_Jobs, Invoke_Pct, Total_Tool_Calls, Tool_Freq_Per_Job, Pct_Tool_Call,
+                   Success_Calls, Success_Pct, P90_First_Invocation_Step, P90_Invocation_Latency)
+    """
+    if user_id_last_char and not all(len(char) == 1 for char in user_id_last_char):
+        raise HTTPException(status_code=400, detail="user_id_last_char takes single characters")
+    since = _parse_timestamp("start", start)
+    until = _parse_timestamp("end", end)
+    try:
+        report = await run_in_threadpool(
+            TOOL_USAGE.report,
+            start=since,
+            end=until,
+            model_names=model_name,
+            agent_name=None if agent_name in (None, "All") else agent_name,
+            prompt_names=prompt_name,
+            user_id_last_chars=user_id_last_char,
+            min_calls=min_calls
+        )
+    except ShardError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    record_results(len(report["tools"]))
+    return _respond({"start": since, "end": until, "position_bins": POSITION_BINS, **report})
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Response cache hit/miss/304 counters and current size"""
+    return RESPONSE_CACHE.stats()
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Request, dataset, cache and index metrics in the Prometheus text format"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/debug/profiler")
+async def get_profiler():
+    """Sampling profiler settings and the folded stacks of the latest slow requests"""
+    return PROFILER.status()
+
+@app.post("/api/debug/profiler")
+async def set_profiler(
+    enabled: bool = Query(...),
+    interval_ms: float = Query(default=5, gt=0, le=1000, description="Time between stack samples"),
+    slow_ms: float = Query(default=500, ge=0, description="Keep the samples of requests at least this slow")
+):
+    """
+    Switch the sampling profiler on or off. While on, every request slower
+    than slow_ms keeps the stacks sampled while it ran; turning it off drops
+    the pending samples but keeps the captures.
+    """
+    if enabled:
+        await run_in_threadpool(PROFILER.start, interval_ms / 1000, slow_ms / 1000)
+    else:
+        await run_in_threadpool(PROFILER.stop)
+    return PROFILER.status()
+
+@app.post("/api/ingest/hitl-events")
+async def ingest_hitl_events(request: Request):
+    """
+    Bulk-insert classification events, sent as a JSON array or as NDJSON
+    (Content-Type: application/x-ndjson). The batch is rejected as a whole if
+    any event is invalid; events whose request_id is already stored are skipped.
+    Validation and insertion run in a worker thread so reads keep being served.
+    """
+    _require_writable()
+    body = await _read_batch(request)
+    content_type = request.headers.get("content-type", "")
+    parse = parse_ndjson_batch if "ndjson" in content_type else parse_json_batch
+    try:
+        events = await run_in_threadpool(parse, body)
+    except IngestError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    # The in-memory store always takes the batch, since it feeds search,
+    # trends and export; an external data source gets its own copy
+    inserted = await run_in_threadpool(EVENT_STORE.add_many, events)
+    if DATA_SOURCE.kind != "memory":
+        inserted = await DATA_SOURCE.insert_many(events)
+    if inserted:
+        RESPONSE_CACHE.invalidate()
     return {
-        "sentiment": "all",
-        "count": len(all_events[:limit]),
-        "events": all_events[:limit]
+        "received": len(events),
+        "inserted": inserted,
+        "duplicates": len(events) - inserted,
+        "search_pending": SEARCH_INDEXER.pending,
+        "near_duplicates_pending": NEAR_DUPLICATE_INDEXER.pending
     }
 
+@app.post("/api/ingest/trajectories")
+async def ingest_trajectories(request: Request):
+    """
+    Bulk-insert trajectory steps for /api/tool-usage, sent as a JSON array or as
+    NDJSON, and validated like /api/ingest/hitl-events. Steps already stored
+    (same job_id, created_at and function_name) are skipped.
+    """
+    _require_writable()
+    body = await _read_batch(request)
+    parse = parse_ndjson_steps if "ndjson" in request.headers.get("content-type", "") else parse_json_steps
+    try:
+        steps = await run_in_threadpool(parse, body)
+    except IngestError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    try:
+        inserted = await run_in_threadpool(TOOL_USAGE.add_many, steps)
+    except ShardError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if inserted:
+        RESPONSE_CACHE.invalidate()
+    return {"received": len(steps), "inserted": inserted, "duplicates": len(steps) - inserted, **TOOL_USAGE.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,224 @@
+"""
+Session (job_id) index for session-level analysis.
+
+Events that carry a job_id are grouped by it as they are added to the store
+(see EventStore.attach). Each session keeps its doc ids in (event_timestamp,
+request_id) order, for the timeline, and a running summary, which is the
+knowledge base's "Session-Level Analysis" query kept up to date:
+
+    SELECT job_id, user_id, MIN(event_timestamp), MAX(event_timestamp),
+           MAX(state_number), MAX(trajectory_ecu_consumed),
+           ARRAY_AGG(DISTINCT intent), ARRAY_AGG(DISTINCT sentiment)
+    ... GROUP BY job_id, user_id ORDER BY total_ecu_consumed DESC LIMIT 100
+
+Sessions are also ranked by ECU, in geometric ECU buckets. An event that
+raises its session's ECU moves it to a higher bucket at most, and the top
+100 by ECU sorts only the highest buckets, not every session.
+"""
+
+import math
+from array import array
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterator, List, Optional
+
+from event_store import SortKey
+
+# ECU ranking granularity: a bucket spans about 9% of ECU
+BUCKETS_PER_DOUBLING = 8
+ZERO_BUCKET = -(1 << 31)
+
+
+def _number(value) -> Optional[float]:
+    """A finite numeric column value, or None for anything else (bools included)"""
+    return value if type(value) is int or (type(value) is float and math.isfinite(value)) else None
+
+
+class _Ranking:
+    """
+    Job ids grouped by ECU into geometric buckets (BUCKETS_PER_DOUBLING per
+    doubling). A session whose ECU rises changes bucket now and then, which
+    is two set operations. Reading walks the buckets from the highest down
+    and sorts only the ones it reaches.
+    """
+
+    def __init__(self, ecu: Callable[[str], float]):
+        self._ecu = ecu
+        self._buckets: Dict[int, set] = {}
+        # Bucket numbers in use, ascending
+        self._order: List[int] = []
+
+    @staticmethod
+    def bucket(ecu: float) -> int:
+        return math.floor(math.log2(ecu) * BUCKETS_PER_DOUBLING) if ecu > 0 else ZERO_BUCKET
+
+    def add(self, job_id: str, ecu: float):
+        number = self.bucket(ecu)
+        members = self._buckets.get(number)
+        if members is None:
+            members = self._buckets[number] = set()
+            insort(self._order, number)
+        members.add(job_id)
+
+    def move(self, job_id: str, old: float, new: float):
+        number = self.bucket(old)
+        if self.bucket(new) != number:
+            self._buckets[number].discard(job_id)
+            self.add(job_id, new)
+
+    def __iter__(self) -> Iterator[str]:
+        """Job ids, highest ECU first (ties by job_id)"""
+        ecu = self._ecu
+        for number in reversed(list(self._order)):
+            # list() copies the set atomically, so an ingest can't change it mid-iteration
+            members = list(self._buckets[number])
+            members.sort(key=lambda job_id: (-ecu(job_id), job_id))
+            yield from members
+
+
+class _Session:
+    __slots__ = ("job_id", "user_id", "docs", "last", "start", "end", "states", "ecu", "intents", "sentiments")
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.user_id: Optional[str] = None
+        # Doc ids ascending by (event_timestamp, request_id)
+        self.docs = array("I")
+        # Sort key of docs[-1]
+        self.last: Optional[SortKey] = None
+        self.start: Optional[str] = None
+        self.end: Optional[str] = None
+        self.states: Optional[int] = None
+        self.ecu: Optional[float] = None
+        # Distinct values in first-seen order, with event counts
+        self.intents: Dict[str, int] = {}
+        self.sentiments: Dict[str, int] = {}
+
+    def summary(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "session_start": self.start,
+            "session_end": self.end,
+            "total_events": len(self.docs),
+            "total_states": self.states,
+            "total_ecu_consumed": self.ecu,
+            "all_intents": list(self.intents),
+            "all_sentiments": list(self.sentiments),
+            "sentiment_counts": dict(self.sentiments),
+        }
+
+
+class SessionIndex:
+    """Per-job timelines and summaries, maintained as events are added to the store"""
+
+    def __init__(self, sort_key: Callable[[int], SortKey]):
+        self._sort_key = sort_key
+        self._sessions: Dict[str, _Session] = {}
+        # Sessions without an ECU value are not ranked
+        self._by_ecu = _Ranking(lambda job_id: self._sessions[job_id].ecu)
+        # get() / timeline() calls and those for unknown job_ids; top_by_ecu()
+        # calls and the sessions they walked
+        self.lookups = 0
+        self.lookup_misses = 0
+        self.rankings = 0
+        self.ranked_scanned = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, doc: int, event: dict):
+        job_id = event.get("job_id")
+        if not isinstance(job_id, str) or not job_id:
+            return
+        session = self._sessions.get(job_id)
+        if session is None:
+            session = self._sessions[job_id] = _Session(job_id)
+
+        docs = session.docs
+        key = (event["event_timestamp"], event["request_id"])
+        # Events usually arrive in time order, so this is an append
+        if not docs or key >= session.last:
+            docs.append(doc)
+            session.last = key
+        else:
+            docs.insert(bisect_left(docs, key, key=self._sort_key), doc)
+
+        timestamp = event["event_timestamp"]
+        if session.start is None or timestamp < session.start:
+            session.start = timestamp
+        if session.end is None or timestamp > session.end:
+            session.end = timestamp
+        user_id = event.get("user_id")
+        if session.user_id is None and isinstance(user_id, str):
+            session.user_id = user_id
+        state = _number(event.get("state_number"))
+        if state is not None and (session.states is None or state > session.states):
+            session.states = state
+        for field, counts in (("user_intent", session.intents), ("user_sentiment", session.sentiments)):
+            values = event.get(field)
+            if isinstance(values, list):
+                for value in values:
+                    if isinstance(value, str):
+                        counts[value] = counts.get(value, 0) + 1
+
+        ecu = _number(event.get("trajectory_ecu_consumed"))
+        if ecu is not None and (session.ecu is None or ecu > session.ecu):
+            if session.ecu is None:
+                session.ecu = ecu
+                self._by_ecu.add(job_id, ecu)
+            else:
+                old, session.ecu = session.ecu, ecu
+                self._by_ecu.move(job_id, old, ecu)
+
+    def _lookup(self, job_id: str) -> Optional[_Session]:
+        session = self._sessions.get(job_id)
+        self.lookups += 1
+        if session is None:
+            self.lookup_misses += 1
+        return session
+
+    def get(self, job_id: str) -> Optional[dict]:
+        session = self._lookup(job_id)
+        return None if session is None else session.summary()
+
+    def timeline(self, job_id: str) -> List[int]:
+        """The session's doc ids, oldest first"""
+        session = self._lookup(job_id)
+        return [] if session is None else list(session.docs)
+
+    def top_by_ecu(
+        self, limit: int, since: Optional[str] = None, sentiment: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Summaries of the `limit` sessions with the highest ECU, optionally only
+        those active at or after `since` and those with an event of `sentiment`.
+        Walks the ranking from the top until `limit` sessions match.
+        """
+        found = []
+        # An ingest while this walks the ranking can move a session into a
+        # bucket not yet reached
+        seen = set()
+        for job_id in self._by_ecu:
+            if job_id in seen:
+                continue
+            seen.add(job_id)
+            session = self._sessions[job_id]
+            if since is not None and session.end < since:
+                continue
+            if sentiment is not None and sentiment not in session.sentiments:
+                continue
+            found.append(session.summary())
+            if len(found) == limit:
+                break
+        self.rankings += 1
+        self.ranked_scanned += len(seen)
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "lookups": self.lookups,
+            "lookup_misses": self.lookup_misses,
+            "rankings": self.rankings,
+            "ranked_scanned": self.ranked_scanned,
+        }
@@ -0,0 +1,516 @@
+"""
+Tool/function usage analysis, the knowledge base's "Model/Prompt Eval" report.
+
+Redash query #2375 measures how often, how successfully and how early each
+tool is used, with a chain of CTEs over analytics.trajectories_full_view
+joined to analytics.jobs_full_view: step sequencing per job, first use per
+(job, tool), latency to first use, a P90 latency threshold per tool, then
+the counts. ToolUsageEngine computes the same report from trajectory steps
+ingested in bulk (POST /api/ingest/trajectories):
+
+- Steps are sharded by job_id across worker processes. A shard
+  keeps each of its jobs' steps sorted by created_at, with a summary of the
+  job: per tool, calls, successful calls, first step, seconds from the job
+  start to first use and where in the trajectory the calls fall. A batch
+  re-summarises only the jobs it touches, in every shard at once
+- A report sends the filters to every shard. Each merges the summaries of
+  its matching jobs into per-tool partial aggregates, and the parent merges
+  the partials. Everything merged is a sum, except first-use latencies,
+  which are counted in logarithmic buckets (quantiles.bucket_index) so the
+  P90 threshold can be found after the merge
+- Shards share nothing, so a batch or a report keeps every core busy, and
+  the server process holds no step data
+- Workers come from a forkserver started with them, so they inherit none of
+  the server's heap or threads. A batch is staged on every shard before any
+  applies it. A worker found dead, or lost mid-request, is replaced by an
+  empty one (its jobs are gone until re-ingested) and the request fails
+  with ShardError
+
+With processes=0 the single shard lives in the calling process.
+
+Step numbers count a job's steps in created_at order from 1, as ROW_NUMBER()
+does. A job starts at its jobs_full_view created_at (job_created_at) when
+the steps carry it, else at its first step. Reports select jobs by start
+time; all of a selected job's steps count, which covers the query's 7-day
+trajectory buffer. The P90 threshold is found at bucket resolution, so jobs
+within RELATIVE_ACCURACY (1%) of a tool's P90 latency may fall on either
+side of it.
+"""
+
+import gc
+import logging
+import multiprocessing
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from event_columns import timestamp_micros
+from quantiles import MIN_MAGNITUDE, bucket_index
+
+# Calls per tool are histogrammed by position in the trajectory, in tenths
+POSITION_BINS = 10
+# Histograms are packed into one integer, _BIN_BITS per bin, so merging two is one addition
+_BIN_BITS = 40
+_BIN_MASK = (1 << _BIN_BITS) - 1
+# Latency bucket of a tool used at the job start (or before it)
+_ZERO_BUCKET = bucket_index(MIN_MAGNITUDE) - 1
+P90 = 0.9
+
+logger = logging.getLogger("uvicorn.error")
+
+# (job_id, created_at µs, function_name, success, model_name, agent_name, prompt_name, user_id, job_created_at µs)
+Step = Tuple[str, int, str, bool, Optional[str], Optional[str], Optional[str], Optional[str], Optional[int]]
+# (start µs, end µs, model names, agent name, prompt names, user_id last characters); None matches everything
+Filters = Tuple[Optional[int], Optional[int], Optional[frozenset], Optional[str], Optional[frozenset], Optional[frozenset]]
+
+
+def _succeeded(value) -> bool:
+    """env_success is the string 'true' in the view; a JSON boolean is accepted too"""
+    return value is True or (isinstance(value, str) and value.lower() == "true")
+
+
+def step_tuple(step: dict) -> Step:
+    """A validated TrajectoryStepIn as the tuple shards store"""
+    job_created_at = step.get("job_created_at")
+    return (
+        step["job_id"], timestamp_micros(step["created_at"]), step["function_name"], _succeeded(step.get("env_success")),
+        step.get("model_name"), step.get("agent_name"), step.get("prompt_name"), step.get("user_id"),
+        timestamp_micros(job_created_at) if job_created_at else None,
+    )
+
+
+def shard_of(job_id: str, shards: int) -> int:
+    return zlib.crc32(job_id.encode()) % shards
+
+
+class _Job:
+    __slots__ = ("model_name", "agent_name", "prompt_name", "user_char", "created", "times", "tools", "success", "summary")
+
+    def __init__(self):
+        self.model_name: Optional[str] = None
+        self.agent_name: Optional[str] = None
+        self.prompt_name: Optional[str] = None
+        self.user_char: Optional[str] = None
+        self.created: Optional[int] = None
+        # Steps in (created_at, tool code) order
+        self.times = array("q")
+        self.tools = array("H")
+        self.success = bytearray()
+        # tool code -> (calls, successes, first step, first-use latency s, latency bucket, packed position histogram)
+        self.summary: Dict[int, tuple] = {}
+
+    @property
+    def start(self) -> int:
+        return self.created if self.created is not None else self.times[0]
+
+
+class ToolUsageShard:
+    """The jobs of one shard, with their per-tool summaries"""
+
+    def __init__(self):
+        self._jobs: Dict[str, _Job] = {}
+        self._staged: List[Step] = []
+        self._codes: Dict[str, int] = {}
+        self._names: List[str] = []
+        self.steps = 0
+
+    def _code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    def add(self, steps: List[Step]) -> Tuple[int, int]:
+        """Add steps, skipping ones already stored (same job, created_at and tool); (inserted, new jobs)"""
+        by_job: Dict[str, List[Step]] = {}
+        for step in steps:
+            by_job.setdefault(step[0], []).append(step)
+        inserted = new_jobs = 0
+        for job_id, job_steps in by_job.items():
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = _Job()
+                new_jobs += 1
+            _, _, _, _, model_name, agent_name, prompt_name, user_id, created = job_steps[-1]
+            job.model_name = model_name or job.model_name
+            job.agent_name = agent_name or job.agent_name
+            job.prompt_name = prompt_name or job.prompt_name
+            job.user_char = user_id[-1].lower() if user_id else job.user_char
+            job.created = created if created is not None else job.created
+            added = self._merge(job, job_steps)
+            if added:
+                inserted += added
+                self._summarise(job)
+        self.steps += inserted
+        return inserted, new_jobs
+
+    def _merge(self, job: _Job, steps: List[Step]) -> int:
+        """Merge steps into the job's sorted columns; the number added"""
+        incoming = sorted({(step[1], self._code(step[2])): step[3] for step in steps}.items())
+        times, tools = job.times, job.tools
+        # Existing steps at or after the first incoming one; usually none, as steps arrive in order
+        overlap = bisect_left(times, incoming[0][0][0])
+        if overlap < len(times):
+            stored = set(zip(times[overlap:], tools[overlap:]))
+            incoming = [item for item in incoming if item[0] not in stored]
+            if not incoming:
+                return 0
+            if incoming[0][0] < (times[-1], tools[-1]):
+                merged = sorted(list(zip(zip(times, tools), job.success)) + incoming)
+                job.times = array("q", (key[0] for key, _ in merged))
+                job.tools = array("H", (key[1] for key, _ in merged))
+                job.success = bytearray(ok for _, ok in merged)
+                return len(incoming)
+        times.extend(key[0] for key, _ in incoming)
+        tools.extend(key[1] for key, _ in incoming)
+        job.success.extend(ok for _, ok in incoming)
+        return len(incoming)
+
+    @staticmethod
+    def _summarise(job: _Job):
+        count = len(job.times)
+        start = job.start
+        summary: Dict[int, list] = {}
+        for step, (time, code, ok) in enumerate(zip(job.times, job.tools, job.success), 1):
+            entry = summary.get(code)
+            if entry is None:
+                # A step logged before the job's created_at counts as used at the start
+                latency = max(time - start, 0) / 1_000_000
+                bucket = bucket_index(latency) if latency >= MIN_MAGNITUDE else _ZERO_BUCKET
+                entry = summary[code] = [0, 0, step, latency, bucket, 0]
+            entry[0] += 1
+            entry[1] += ok
+            entry[5] += 1 << (_BIN_BITS * ((step - 1) * POSITION_BINS // count))
+        job.summary = {code: tuple(entry) for code, entry in summary.items()}
+
+    def partials(self, filters: Filters) -> dict:
+        """Per-tool sums over the jobs matching `filters`"""
+        start, end, model_names, agent_name, prompt_names, user_chars = filters
+        jobs = calls = 0
+        # tool code -> [tool jobs, calls, successes, packed position histogram, {latency bucket: [jobs, latency s, first steps]}]
+        tools: Dict[int, list] = {}
+        for job in self._jobs.values():
+            if start is not None or end is not None:
+                job_start = job.start
+                if (start is not None and job_start < start) or (end is not None and job_start >= end):
+                    continue
+            if model_names is not None and job.model_name not in model_names:
+                continue
+            if agent_name is not None and job.agent_name != agent_name:
+                continue
+            if prompt_names is not None and job.prompt_name not in prompt_names:
+                continue
+            if user_chars is not None and job.user_char not in user_chars:
+                continue
+            jobs += 1
+            calls += len(job.times)
+            for code, (tool_calls, successes, first_step, latency, bucket, histogram) in job.summary.items():
+                total = tools.get(code)
+                if total is None:
+                    total = tools[code] = [0, 0, 0, 0, {}]
+                total[0] += 1
+                total[1] += tool_calls
+                total[2] += successes
+                total[3] += histogram
+                first = total[4].get(bucket)
+                if first is None:
+                    total[4][bucket] = [1, latency, first_step]
+                else:
+                    first[0] += 1
+                    first[1] += latency
+                    first[2] += first_step
+        return {"jobs": jobs, "calls": calls, "tools": {self._names[code]: total for code, total in tools.items()}}
+
+    def stage(self, steps: List[Step]) -> int:
+        """Hold a batch for commit(), replacing any batch held"""
+        self._staged = steps
+        return len(steps)
+
+    def commit(self) -> Tuple[int, int]:
+        """add() the held batch"""
+        steps, self._staged = self._staged, []
+        return self.add(steps)
+
+    def discard(self):
+        self._staged = []
+
+    def stats(self) -> Tuple[int, int]:
+        return len(self._jobs), self.steps
+
+
+def _merge_partials(partials: Iterable[dict]) -> dict:
+    merged = {"jobs": 0, "calls": 0, "tools": {}}
+    for partial in partials:
+        merged["jobs"] += partial["jobs"]
+        merged["calls"] += partial["calls"]
+        for name, (jobs, calls, successes, positions, first) in partial["tools"].items():
+            total = merged["tools"].get(name)
+            if total is None:
+                merged["tools"][name] = [jobs, calls, successes, positions, first]
+                continue
+            total[0] += jobs
+            total[1] += calls
+            total[2] += successes
+            total[3] += positions
+            for bucket, (bucket_jobs, latency, first_step) in first.items():
+                into = total[4].setdefault(bucket, [0, 0.0, 0])
+                into[0] += bucket_jobs
+                into[1] += latency
+                into[2] += first_step
+    return merged
+
+
+def _p90_filtered(first: Dict[int, list], jobs: int) -> Tuple[float, float]:
+    """(mean first step, mean latency) over the jobs at or below the P90 first-use latency"""
+    rank = P90 * (jobs - 1)
+    kept = seen = 0
+    steps = latency = 0.0
+    for bucket in sorted(first):
+        bucket_jobs, bucket_latency, bucket_steps = first[bucket]
+        kept += bucket_jobs
+        latency += bucket_latency
+        steps += bucket_steps
+        seen += bucket_jobs
+        if seen > rank:
+            break
+    return steps / kept, latency / kept
+
+
+def _rows(merged: dict, min_calls: int) -> List[dict]:
+    rows = []
+    for name, (jobs, calls, successes, positions, first) in merged["tools"].items():
+        if calls < min_calls:
+            continue
+        first_step, latency = _p90_filtered(first, jobs)
+        rows.append({
+            "tool": name,
+            "tool_jobs": jobs,
+            "invoke_pct": round(jobs / merged["jobs"] * 100, 2),
+            "total_tool_calls": calls,
+            "tool_freq_per_job": round(calls / jobs, 2),
+            "pct_tool_call": round(calls / merged["calls"] * 100, 2),
+            "success_calls": successes,
+            "success_pct": round(successes / calls * 100, 2),
+            "p90_first_invocation_step": round(first_step, 2),
+            "p90_invocation_latency": round(latency, 2),
+            "position_histogram": [positions >> (_BIN_BITS * position) & _BIN_MASK for position in range(POSITION_BINS)],
+        })
+    rows.sort(key=lambda row: (-row["tool_jobs"], row["tool"]))
+    return rows
+
+
+def _serve(connection):
+    """Worker process: apply (method, args) requests to one shard until None arrives"""
+    # Objects inherited from the fork server (its imports) are never
+    # collected here, so the collector leaves their pages shared
+    gc.freeze()
+    shard = ToolUsageShard()
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            result = getattr(shard, method)(*args)
+        except Exception as e:
+            result = e
+        connection.send(result)
+    connection.close()
+
+
+class ShardError(RuntimeError):
+    """A worker died or stopped answering mid-request; it was restarted empty and the request not applied"""
+
+
+class ToolUsageEngine:
+    """Tool usage report over steps sharded by job across `processes` worker processes (0: in-process)"""
+
+    def __init__(self, processes: int = 0, on_restart: Optional[Callable[[], None]] = None):
+        self.processes = processes
+        # Called after a dead worker is replaced, since its jobs are gone from the reports
+        self.on_restart = on_restart
+        self._shards: Optional[list] = None
+        self._workers: List[multiprocessing.Process] = []
+        # [jobs, steps] per shard, so a lost shard's can be taken off the totals
+        self._counts: List[List[int]] = []
+        # One request at a time goes out to the shards, and all of them work on it
+        self._lock = threading.Lock()
+        self.restarts = 0
+
+    @property
+    def jobs(self) -> int:
+        return sum(jobs for jobs, _ in self._counts)
+
+    @property
+    def steps(self) -> int:
+        return sum(steps for _, steps in self._counts)
+
+    def start(self):
+        """Start the workers; the server calls this at startup, else the first batch or report does"""
+        with self._lock:
+            if self._shards is None:
+                self._start()
+
+    def _start(self):
+        shards = max(self.processes, 1)
+        self._counts = [[0, 0] for _ in range(shards)]
+        if self.processes == 0:
+            self._shards = [ToolUsageShard()]
+            return
+        self._shards = [None] * shards
+        self._workers = [None] * shards
+        for index in range(shards):
+            self._spawn(index)
+
+    def _spawn(self, index: int):
+        # Workers come from the fork server, a small process started before
+        # any of them that has only imported this module, so nothing of the
+        # server's heap or of the locks its threads hold is inherited
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        parent, child = context.Pipe()
+        worker = context.Process(target=_serve, args=(child,), name=f"tool-usage-{index}", daemon=True)
+        worker.start()
+        child.close()
+        self._shards[index] = parent
+        self._workers[index] = worker
+
+    def _restart(self, index: int):
+        """Replace worker `index`, dead or out of step with its pipe, with an empty one"""
+        worker = self._workers[index]
+        if worker.is_alive():
+            worker.kill()
+        worker.join(timeout=5)
+        self._shards[index].close()
+        jobs, steps = self._counts[index]
+        logger.warning("Tool usage worker %d failed (exit code %s); restarted it empty, losing %d jobs and %d steps",
+                       index, worker.exitcode, jobs, steps)
+        self._counts[index] = [0, 0]
+        self.restarts += 1
+        self._spawn(index)
+        if self.on_restart is not None:
+            self.on_restart()
+
+    def _exchange(self, requests: List[tuple]) -> Tuple[list, List[int]]:
+        """
+        Send requests[i] to worker i and read every reply, restarting the
+        workers that fail; (replies in shard order, indexes of failed workers)
+        """
+        replies: list = [None] * len(requests)
+        sent, failed = [], []
+        for index, request in enumerate(requests):
+            try:
+                self._shards[index].send(request)
+                sent.append(index)
+            except OSError:
+                failed.append(index)
+        # Every sent request is answered before anything else goes out, so no
+        # reply is left in a pipe to be read as the answer to the next request
+        for index in sent:
+            try:
+                replies[index] = self._shards[index].recv()
+            except (EOFError, OSError):
+                failed.append(index)
+        for index in failed:
+            self._restart(index)
+        return replies, failed
+
+    def _scatter(self, method: str, args: List[tuple]) -> list:
+        """shard.method(*args[i]) on every shard i, in parallel; the results in shard order (call with the lock)"""
+        if self._shards is None:
+            self._start()
+        if self.processes == 0:
+            return [getattr(shard, method)(*shard_args) for shard, shard_args in zip(self._shards, args)]
+        for index, worker in enumerate(self._workers):
+            if not worker.is_alive():
+                self._restart(index)
+        results, failed = self._exchange([(method, shard_args) for shard_args in args])
+        if failed:
+            raise ShardError(f"tool usage workers {failed} failed during {method}")
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def add_many(self, steps: List[dict]) -> int:
+        """
+        Add validated steps (ingest.TrajectoryStepIn); the number not already
+        stored. Every shard holds its part of the batch before any applies it,
+        so a worker lost on the way leaves none of the batch applied
+        """
+        shards = max(self.processes, 1)
+        batches: List[List[Step]] = [[] for _ in range(shards)]
+        for step in steps:
+            batches[shard_of(step["job_id"], shards)].append(step_tuple(step))
+        with self._lock:
+            failed: List[int] = []
+            if self.processes == 0:
+                results = self._scatter("add", [(batch,) for batch in batches])
+            else:
+                try:
+                    self._scatter("stage", [(batch,) for batch in batches])
+                except Exception:
+                    # Workers restarted by the failure have nothing staged
+                    self._exchange([("discard", ())] * shards)
+                    raise
+                # Only a worker dying between the two steps can fail here, and
+                # its whole shard is gone with it
+                results, failed = self._exchange([("commit", ())] * shards)
+            for counts, result in zip(self._counts, results):
+                if isinstance(result, tuple):
+                    counts[0] += result[1]
+                    counts[1] += result[0]
+        if failed:
+            raise ShardError(f"tool usage workers {failed} failed during commit")
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return sum(inserted for inserted, _ in results)
+
+    def report(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        model_names: Optional[Iterable[str]] = None,
+        agent_name: Optional[str] = None,
+        prompt_names: Optional[Iterable[str]] = None,
+        user_id_last_chars: Optional[Iterable[str]] = None,
+        min_calls: int = 0,
+    ) -> dict:
+        """
+        Per-tool usage over jobs started in [start, end) (stored-format
+        timestamps) that match every given filter, most widely used first
+        """
+        filters: Filters = (
+            timestamp_micros(start) if start else None,
+            timestamp_micros(end) if end else None,
+            frozenset(model_names) if model_names else None,
+            agent_name,
+            frozenset(prompt_names) if prompt_names else None,
+            frozenset(char.lower() for char in user_id_last_chars) if user_id_last_chars else None,
+        )
+        with self._lock:
+            partials = self._scatter("partials", [(filters,)] * max(self.processes, 1))
+        merged = _merge_partials(partials)
+        return {"total_jobs": merged["jobs"], "total_calls": merged["calls"], "tools": _rows(merged, min_calls)}
+
+    def stats(self) -> dict:
+        return {"processes": self.processes, "jobs": self.jobs, "steps": self.steps, "restarts": self.restarts}
+
+    def close(self):
+        with self._lock:
+            if self.processes and self._shards is not None:
+                for connection in self._shards:
+                    try:
+                        connection.send(None)
+                    except OSError:
+                        pass
+                    connection.close()
+                for worker in self._workers:
+                    worker.join(timeout=5)
+            self._shards = None
+            self._workers = []
+            self._counts = []
@@ -0,0 +1,289 @@
+"""
+Distinct user counts per label and day, with HyperLogLog.
+
+Nearly every knowledge base query reports COUNT(DISTINCT user_id) next to
+its event counts. Exact counts over any date range need a set of user ids
+per label and day. UniqueUserIndex instead keeps a HyperLogLog sketch per
+(field, label, day), plus one per (field, label) over all time, filled as
+events are added to the store (see EventStore.attach). A range is answered
+by merging its days' sketches, which gives exactly the sketch of the range.
+
+HyperLogLog with PRECISION = 12:
+
+- 4,096 one-byte registers. A user id's 64-bit hash picks a register by its
+  top 12 bits, and the register keeps the longest run of leading zeros seen
+  in the other 52
+- Estimates use Ertl's improved estimator ("New cardinality estimation
+  algorithms for HyperLogLog sketches", 2017), which needs no empirical
+  bias tables and holds from a handful of users up. Standard error is
+  1.04 / sqrt(4096) = 1.6%; about 95% of estimates fall within 3.3%
+- A sketch starts sparse: a sorted array of 4-byte (register, value)
+  entries for up to SPARSE_LIMIT registers (1 KB at most). Past that it
+  switches to the 4 KB of registers. So labels with few users per day stay
+  small
+- Merging takes the register-wise maximum. Registers are packed into one
+  big integer with a spare bit per byte, so the maximum of 4,096 registers
+  is a few whole-integer operations rather than a loop
+
+Memory: at most 4 KB per (field, label, day). With the production label set
+(about 100 labels a day across sentiment, intent, work_category and
+work_subcategory) that is at most 400 KB a day, about 12 MB for 30 days.
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from integrations import event_integrations
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+# Hash bits after the register index; a register holds at most _Q + 1
+_Q = 64 - PRECISION
+_LOW_BITS = (1 << _Q) - 1
+# Sparse entries (register << 8 | value, one per register) held before switching to registers
+SPARSE_LIMIT = REGISTERS // 16
+
+# group_by -> array column, or a function of the event for derived labels ("all" counts every event)
+UNIQUE_USER_FIELDS = {
+    "all": None,
+    "sentiment": "user_sentiment",
+    "intent": "user_intent",
+    "work_category": "work_category",
+    "work_subcategory": "work_subcategory",
+    "integration": event_integrations,
+}
+
+# Bytes of every register with only the spare top bit set / with all bits set
+_HIGH = int.from_bytes(b"\x80" * REGISTERS, "little")
+_ALL = (1 << (8 * REGISTERS)) - 1
+
+
+# Users come back event after event, so their hashes are memoised
+@lru_cache(maxsize=1 << 16)
+def user_register(user_id: str) -> Tuple[int, int]:
+    """(register, value) a user id sets"""
+    hashed = int.from_bytes(blake2b(user_id.encode(), digest_size=8).digest(), "little")
+    return hashed >> _Q, _Q - (hashed & _LOW_BITS).bit_length() + 1
+
+
+def _max_registers(a: int, b: int) -> int:
+    """Register-wise maximum of two packed register sets (registers are below 128)"""
+    # A byte of (a | 0x80) - b keeps its top bit exactly where a >= b
+    a_wins = ((((a | _HIGH) - b) & _HIGH) >> 7) * 0xFF
+    return (a & a_wins) | (b & (_ALL ^ a_wins))
+
+
+def _sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+def estimate(registers: bytes) -> float:
+    """Ertl's improved HyperLogLog estimate from a full set of registers"""
+    m = len(registers)
+    # Registers hold small values: count up until every register is accounted for
+    counts = [0] * (_Q + 2)
+    seen = 0
+    for value in range(_Q + 2):
+        counts[value] = registers.count(value)
+        seen += counts[value]
+        if seen == m:
+            break
+    z = m * _tau(1 - counts[_Q + 1] / m)
+    for value in range(_Q, 0, -1):
+        z = 0.5 * (z + counts[value])
+    z += m * _sigma(counts[0] / m)
+    return m * m / (2 * math.log(2) * z)
+
+
+class HyperLogLog:
+    """One HyperLogLog sketch; sparse until more than SPARSE_LIMIT registers are set"""
+
+    __slots__ = ("_sparse", "_registers")
+
+    def __init__(self):
+        self._sparse: Optional[array] = array("I")
+        self._registers: Optional[bytearray] = None
+
+    def add(self, register: int, value: int) -> bool:
+        """Record a user's (register, value); False when the sketch already covered it"""
+        registers = self._registers
+        if registers is not None:
+            if registers[register] < value:
+                registers[register] = value
+                return True
+            return False
+        entry = register << 8 | value
+        sparse = self._sparse
+        # Sorted, at most one entry per register: an entry for the register at
+        # or after `entry` holds at least `value`, one just before holds less
+        position = bisect_left(sparse, entry)
+        if position < len(sparse) and sparse[position] >> 8 == register:
+            return False
+        if position and sparse[position - 1] >> 8 == register:
+            sparse[position - 1] = entry
+            return True
+        if len(sparse) < SPARSE_LIMIT:
+            sparse.insert(position, entry)
+            return True
+        registers = bytearray(REGISTERS)
+        for entry in sparse:
+            if registers[entry >> 8] < entry & 0xFF:
+                registers[entry >> 8] = entry & 0xFF
+        if registers[register] < value:
+            registers[register] = value
+        # Registers first: a reader that sees _sparse cleared must find them
+        self._registers = registers
+        self._sparse = None
+        return True
+
+
+class _Merged:
+    """Accumulates sketches: packed registers for dense ones, entries for sparse ones"""
+
+    __slots__ = ("packed", "entries")
+
+    def __init__(self):
+        self.packed = 0
+        self.entries: List[int] = []
+
+    def merge(self, sketch: HyperLogLog):
+        registers = sketch._registers
+        if registers is not None:
+            self.packed = _max_registers(self.packed, int.from_bytes(registers, "little"))
+        else:
+            sparse = sketch._sparse
+            # Switched to registers since the first read
+            if sparse is None:
+                self.packed = _max_registers(self.packed, int.from_bytes(sketch._registers, "little"))
+            else:
+                self.entries.extend(sparse)
+
+    def estimate(self) -> int:
+        registers = bytearray(self.packed.to_bytes(REGISTERS, "little"))
+        for entry in self.entries:
+            if registers[entry >> 8] < entry & 0xFF:
+                registers[entry >> 8] = entry & 0xFF
+        return round(estimate(registers))
+
+
+def _labels(event: dict) -> List[Tuple[str, str]]:
+    """(field, label) pairs an event counts towards"""
+    labels = [("all", "all")]
+    for field, column in UNIQUE_USER_FIELDS.items():
+        if column is None:
+            continue
+        values = column(event) if callable(column) else event.get(column)
+        if type(values) is not list:
+            continue
+        for value in values:
+            if type(value) is str and (field, value) not in labels:
+                labels.append((field, value))
+    return labels
+
+
+class UniqueUserIndex:
+    """HyperLogLog sketches of user_id per (field, label, day) and per (field, label), kept as events are added"""
+
+    def __init__(self):
+        # (field, day) -> label -> sketch; day None holds the all-time sketches
+        self._sketches: Dict[Tuple[str, Optional[str]], Dict[str, HyperLogLog]] = {}
+        # Events added per day (None: in total), which versions the cached estimates
+        self._added: Dict[Optional[str], int] = {}
+        # (field, day) -> (_added when computed, estimates)
+        self._estimates: Dict[Tuple[str, Optional[str]], Tuple[int, Dict[str, int]]] = {}
+
+    def add(self, doc: int, event: dict):
+        user_id = event.get("user_id")
+        if not isinstance(user_id, str) or not user_id:
+            return
+        register, value = user_register(user_id)
+        day = event["event_timestamp"][:10]
+        sketches = self._sketches
+        for field, label in _labels(event):
+            # The all-time sketch covers the day's, so it can only change when the day's does
+            for key in ((field, day), (field, None)):
+                by_label = sketches.get(key)
+                if by_label is None:
+                    by_label = sketches[key] = {}
+                sketch = by_label.get(label)
+                if sketch is None:
+                    sketch = by_label[label] = HyperLogLog()
+                registers = sketch._registers
+                if registers is not None:
+                    if registers[register] >= value:
+                        break
+                    registers[register] = value
+                elif not sketch.add(register, value):
+                    break
+        # Bumped after the sketches, so an estimate computed meanwhile is recomputed on the next read
+        added = self._added
+        added[day] = added.get(day, 0) + 1
+        added[None] = added.get(None, 0) + 1
+
+    def _merge(self, field: str, days: Iterable[Optional[str]]) -> Dict[str, int]:
+        merged: Dict[str, _Merged] = {}
+        for day in days:
+            by_label = self._sketches.get((field, day))
+            if not by_label:
+                continue
+            # list() copies atomically, so an ingest adding a label can't break the walk
+            for label, sketch in list(by_label.items()):
+                total = merged.get(label)
+                if total is None:
+                    total = merged[label] = _Merged()
+                total.merge(sketch)
+        return {label: total.estimate() for label, total in merged.items()}
+
+    def _single(self, field: str, day: Optional[str]) -> Dict[str, int]:
+        """Estimates for one day (or all time), cached until events are added to it"""
+        key = (field, day)
+        version = self._added.get(day, 0)
+        cached = self._estimates.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        estimates = self._merge(field, (day,))
+        self._estimates[key] = (version, estimates)
+        return estimates
+
+    def count(self, field: str, days: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Estimated distinct users per label of `field`, over `days`
+        ("YYYY-MM-DD" labels) or, when None, over all time
+        """
+        if days is None:
+            return dict(self._single(field, None))
+        days = list(days)
+        if len(days) == 1:
+            return dict(self._single(field, days[0]))
+        return self._merge(field, days)
+
+    def daily(self, field: str, days: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """count(field, [day]) for each of `days`"""
+        return {day: dict(self._single(field, day)) for day in days}
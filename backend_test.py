@@ -6,8 +6,12 @@ Tests all backend endpoints with mock data
 
 import requests
 import sys
+import time
+import uuid
+import csv
+import io
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 
 class LLMTracingAPITester:
     def __init__(self, base_url="http://localhost:8001"):
@@ -200,6 +204,818 @@ class LLMTracingAPITester:
         except Exception as e:
             self.log_test("Invalid Job ID Handling", False, f"Exception: {str(e)}")
 
+    def test_all_hitl_events(self):
+        """Test all-sentiment HITL events are newest first with no repeated request_id"""
+        try:
+            response = requests.get(f"{self.base_url}/api/hitl-events", params={"limit": 100}, timeout=10)
+            success = response.status_code == 200
+            
+            if success:
+                events = response.json().get("events", [])
+                timestamps = [event["event_timestamp"] for event in events]
+                request_ids = [event["request_id"] for event in events]
+                
+                if timestamps != sorted(timestamps, reverse=True):
+                    self.log_test("All HITL Events", False, "Events not sorted by event_timestamp DESC")
+                elif len(request_ids) != len(set(request_ids)):
+                    self.log_test("All HITL Events", False, "Duplicate request_id in response")
+                else:
+                    self.log_test("All HITL Events", True, f"Found {len(events)} unique events")
+                return events
+            else:
+                self.log_test("All HITL Events", False, f"Status: {response.status_code}")
+                return []
+                
+        except Exception as e:
+            self.log_test("All HITL Events", False, f"Exception: {str(e)}")
+            return []
+
+    def test_hitl_events_pagination(self, sentiment="dissatisfied", page_size=7):
+        """Test walking next_cursor pages yields the same events as one large page"""
+        url = f"{self.base_url}/api/hitl-events/{sentiment}"
+        try:
+            full = requests.get(url, params={"limit": 100}, timeout=10).json().get("events", [])
+            
+            paged, cursor, pages = [], None, 0
+            while True:
+                params = {"limit": page_size}
+                if cursor:
+                    params["cursor"] = cursor
+                data = requests.get(url, params=params, timeout=10).json()
+                paged.extend(data.get("events", []))
+                cursor = data.get("next_cursor")
+                pages += 1
+                if not cursor or pages > 100:
+                    break
+            
+            expected = [event["request_id"] for event in full]
+            actual = [event["request_id"] for event in paged]
+            if actual == expected:
+                self.log_test(f"HITL Events Pagination ({sentiment})", True, 
+                            f"{len(actual)} events over {pages} pages")
+            else:
+                self.log_test(f"HITL Events Pagination ({sentiment})", False, 
+                            f"Paged {len(actual)} events, expected {len(expected)}")
+            
+            response = requests.get(url, params={"cursor": "not-a-cursor"}, timeout=10)
+            if response.status_code == 400:
+                self.log_test("Invalid Cursor Handling", True, "Correctly returned 400")
+            else:
+                self.log_test("Invalid Cursor Handling", False, f"Expected 400, got {response.status_code}")
+                
+        except Exception as e:
+            self.log_test(f"HITL Events Pagination ({sentiment})", False, f"Exception: {str(e)}")
+
+    def test_export_hitl_events(self):
+        """Test NDJSON and CSV exports stream the same rows as the list endpoint"""
+        try:
+            expected = requests.get(f"{self.base_url}/api/hitl-events", params={"limit": 100}, timeout=10).json().get("events", [])
+            expected_ids = [event["request_id"] for event in expected]
+            
+            response = requests.get(f"{self.base_url}/api/export/hitl-events", params={"format": "ndjson"}, 
+                                    stream=True, timeout=30)
+            rows = [json.loads(line) for line in response.iter_lines() if line]
+            if response.status_code == 200 and [row["request_id"] for row in rows] == expected_ids:
+                self.log_test("Export HITL Events (ndjson)", True, f"Streamed {len(rows)} rows")
+            else:
+                self.log_test("Export HITL Events (ndjson)", False, 
+                            f"Status: {response.status_code}, rows: {len(rows)}, expected: {len(expected_ids)}")
+            
+            params = {"sentiment": ["dissatisfied", "frustrated"], "intent": "req_same_bug_fix", "start": "2026-01-01"}
+            expected = requests.get(f"{self.base_url}/api/hitl-events", params=dict(params, limit=100), timeout=10).json()
+            response = requests.get(f"{self.base_url}/api/export/hitl-events", 
+                                    params=dict(params, format="csv"), timeout=30)
+            rows = list(csv.reader(io.StringIO(response.text)))
+            if (response.status_code == 200 and rows and rows[0][:2] == ["event_timestamp", "request_id"]
+                    and [row[1] for row in rows[1:]] == [event["request_id"] for event in expected.get("events", [])]):
+                self.log_test("Export HITL Events (csv)", True, f"{len(rows) - 1} rows")
+            else:
+                self.log_test("Export HITL Events (csv)", False, f"Status: {response.status_code}")
+                
+        except Exception as e:
+            self.log_test("Export HITL Events", False, f"Exception: {str(e)}")
+
+    def test_label_filters(self):
+        """Test intent/sentiment label filters agree with filtering the unfiltered list"""
+        try:
+            everything = requests.get(f"{self.base_url}/api/hitl-events", params={"limit": 100}, timeout=10).json().get("events", [])
+            params = {"limit": 100, "intent": "req_same_bug_fix", "not_sentiment": "frustrated"}
+            response = requests.get(f"{self.base_url}/api/hitl-events", params=params, timeout=10)
+            
+            if response.status_code == 200:
+                actual = [event["request_id"] for event in response.json().get("events", [])]
+                expected = [event["request_id"] for event in everything 
+                            if "req_same_bug_fix" in event["user_intent"] and "frustrated" not in event["user_sentiment"]]
+                if actual == expected:
+                    self.log_test("Label Filters", True, f"{len(actual)} events match intent AND NOT sentiment")
+                else:
+                    self.log_test("Label Filters", False, f"Got {len(actual)} events, expected {len(expected)}")
+            else:
+                self.log_test("Label Filters", False, f"Status: {response.status_code}")
+                
+        except Exception as e:
+            self.log_test("Label Filters", False, f"Exception: {str(e)}")
+
+    def test_date_filters(self):
+        """Test start/end bounds agree with filtering the unfiltered list, across cursor pages"""
+        try:
+            everything = requests.get(f"{self.base_url}/api/hitl-events", params={"limit": 100}, timeout=10).json().get("events", [])
+            if len(everything) < 3:
+                self.log_test("Date Filters", False, f"Only {len(everything)} events")
+                return
+            # A window from the oldest listed event's day up to, not including, the newest event
+            start, end = everything[-1]["event_timestamp"][:10], everything[0]["event_timestamp"]
+            expected = [event["request_id"] for event in everything if start <= event["event_timestamp"] < end]
+            actual, cursor = [], None
+            while True:
+                params = {"limit": 5, "start": start, "end": end.replace(" UTC", "Z").replace(" ", "T")}
+                if cursor:
+                    params["cursor"] = cursor
+                page = requests.get(f"{self.base_url}/api/hitl-events", params=params, timeout=10).json()
+                actual += [event["request_id"] for event in page["events"]]
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            with_q = requests.get(f"{self.base_url}/api/hitl-events", params={"q": "stripe", "start": start}, timeout=10)
+            bad = requests.get(f"{self.base_url}/api/hitl-events", params={"start": "yesterday"}, timeout=10)
+            if actual != expected:
+                self.log_test("Date Filters", False, f"Got {len(actual)} events, expected {len(expected)}")
+            elif with_q.status_code != 400 or bad.status_code != 400:
+                self.log_test("Date Filters", False, f"q with start: {with_q.status_code}, bad start: {bad.status_code}")
+            else:
+                self.log_test("Date Filters", True, f"{len(actual)} events from {start} to {end}, 5 per page")
+                
+        except Exception as e:
+            self.log_test("Date Filters", False, f"Exception: {str(e)}")
+
+    def test_search(self):
+        """Test q= full-text search, including accent folding and phrases"""
+        cases = [
+            ({"q": "probleme resolu"}, "5b0aae73-05ed-42d7-889d-7fb0ed85d779"),
+            ({"q": '"still the same"'}, "c86677a6-69c5-48eb-9b53-4ad83cc1e087"),
+            ({"q": "PayU"}, "6e125700-71ee-4008-9e1c-20a31a7a33cd"),
+        ]
+        for params, expected_id in cases:
+            try:
+                response = requests.get(f"{self.base_url}/api/hitl-events", params=params, timeout=10)
+                if response.status_code != 200:
+                    self.log_test(f"Search {params['q']}", False, f"Status: {response.status_code}")
+                    continue
+                
+                ids = [event["request_id"] for event in response.json().get("events", [])]
+                if expected_id in ids:
+                    self.log_test(f"Search {params['q']}", True, f"{len(ids)} hits, expected event rank {ids.index(expected_id) + 1}")
+                else:
+                    self.log_test(f"Search {params['q']}", False, f"{expected_id} not in {ids}")
+                    
+            except Exception as e:
+                self.log_test(f"Search {params['q']}", False, f"Exception: {str(e)}")
+        
+        try:
+            response = requests.get(f"{self.base_url}/api/hitl-events/satisfied", params={"q": "stripe"}, timeout=10)
+            sentiments = [event["user_sentiment"] for event in response.json().get("events", [])]
+            if response.status_code == 200 and sentiments and all("satisfied" in s for s in sentiments):
+                self.log_test("Search + Sentiment Filter", True, f"{len(sentiments)} satisfied hits")
+            else:
+                self.log_test("Search + Sentiment Filter", False, f"Status: {response.status_code}, sentiments: {sentiments}")
+        except Exception as e:
+            self.log_test("Search + Sentiment Filter", False, f"Exception: {str(e)}")
+
+    def test_trends(self):
+        """Test /api/trends rollups agree with the raw events"""
+        try:
+            response = requests.get(f"{self.base_url}/api/trends", params={"granularity": "day"}, timeout=10)
+            if response.status_code != 200:
+                self.log_test("Daily Trends", False, f"Status: {response.status_code}")
+                return
+            
+            data = response.json()
+            buckets = data.get("buckets", [])
+            events = requests.get(f"{self.base_url}/api/hitl-events", params={"limit": 100}, timeout=10).json()["events"]
+            expected = {}
+            for event in events:
+                for sentiment in event["user_sentiment"]:
+                    expected[sentiment] = expected.get(sentiment, 0) + 1
+            
+            if len(buckets) != 30:
+                self.log_test("Daily Trends", False, f"Expected 30 daily buckets, got {len(buckets)}")
+            elif data["totals"]["events"] != len(events) or data["totals"]["sentiments"] != expected:
+                self.log_test("Daily Trends", False, f"Totals {data['totals']} do not match {len(events)} events / {expected}")
+            else:
+                self.log_test("Daily Trends", True, f"{data['start']} to {data['end']}, recurrence rate {data['totals']['bug_recurrence_rate']}")
+                
+        except Exception as e:
+            self.log_test("Daily Trends", False, f"Exception: {str(e)}")
+        
+        try:
+            response = requests.get(f"{self.base_url}/api/trends", params={"granularity": "hour", "sentiment": "frustrated"}, timeout=10)
+            buckets = response.json().get("buckets", [])
+            other = [b for b in buckets if set(b["sentiments"]) - {"frustrated"}]
+            if response.status_code == 200 and len(buckets) == 48 and not other:
+                self.log_test("Hourly Trends by Sentiment", True, f"{response.json()['totals']['events']} frustrated events")
+            else:
+                self.log_test("Hourly Trends by Sentiment", False, f"Status: {response.status_code}, buckets: {len(buckets)}")
+        except Exception as e:
+            self.log_test("Hourly Trends by Sentiment", False, f"Exception: {str(e)}")
+        
+        try:
+            response = requests.get(f"{self.base_url}/api/trends", params={"granularity": "hour", "start": "0001-01-01"}, timeout=10)
+            detail = response.json().get("detail", "")
+            self.log_test("Trend Window Too Wide", response.status_code == 400 and "move start later" in detail,
+                          f"Status: {response.status_code}, detail: {detail}")
+        except Exception as e:
+            self.log_test("Trend Window Too Wide", False, f"Exception: {str(e)}")
+
+    def test_ingest(self):
+        """Test NDJSON bulk ingest: inserted events are listed, counted, searchable and de-duplicated"""
+        url = f"{self.base_url}/api/ingest/hitl-events"
+        headers = {"Content-Type": "application/x-ndjson"}
+        marker = uuid.uuid4().hex[:12]
+        events = [
+            {"event_timestamp": "2026-01-21T09:00:00Z", "request_id": str(uuid.uuid4()), "user_sentiment": ["frustrated", "frustrated"],
+             "user_intent": ["req_same_bug_fix"], "user_curr_message": f"ingest test {marker} still failing",
+             "agent_prev_message": "Fixed the build."},
+            {"event_timestamp": "2026-01-21 09:00:01.000000 UTC", "request_id": str(uuid.uuid4()), "user_sentiment": ["neutral"],
+             "user_intent": ["asked_info"], "user_curr_message": "how do I deploy?", "agent_prev_message": None},
+        ]
+        body = "\n".join(json.dumps(event) for event in events)
+        try:
+            before = {item["sentiment"]: item["count"] for item in requests.get(f"{self.base_url}/api/sentiments", timeout=10).json()}
+            response = requests.post(url, data=body, headers=headers, timeout=10)
+            after = {item["sentiment"]: item["count"] for item in requests.get(f"{self.base_url}/api/sentiments", timeout=10).json()}
+            if response.status_code != 200 or response.json()["inserted"] != 2:
+                self.log_test("Bulk Ingest", False, f"Status: {response.status_code}, body: {response.text[:200]}")
+                return
+            if after["frustrated"] != before["frustrated"] + 1 or after["neutral"] != before["neutral"] + 1:
+                self.log_test("Bulk Ingest", False, f"Sentiment counts not updated: {before} -> {after}")
+                return
+            listed = requests.get(f"{self.base_url}/api/hitl-events/frustrated", params={"limit": 100}, timeout=10).json()["events"]
+            if events[0]["request_id"] not in [event["request_id"] for event in listed]:
+                self.log_test("Bulk Ingest", False, "Ingested event missing from /api/hitl-events/frustrated")
+                return
+            self.log_test("Bulk Ingest", True, "2 events inserted, listed and counted")
+            
+            # Search indexing runs in the background, so allow it a moment
+            found = False
+            for _ in range(20):
+                hits = requests.get(f"{self.base_url}/api/hitl-events", params={"q": marker}, timeout=10).json()["events"]
+                found = [event["request_id"] for event in hits] == [events[0]["request_id"]]
+                if found:
+                    break
+                time.sleep(0.1)
+            self.log_test("Ingested Event Searchable", found, f"q={marker}")
+            
+            response = requests.post(url, data=body, headers=headers, timeout=10)
+            self.log_test("Ingest De-duplication", response.status_code == 200 and response.json()["duplicates"] == 2,
+                          f"Response: {response.text[:200]}")
+            
+            response = requests.post(url, data='{"request_id": "x"}\nnot json', headers=headers, timeout=10)
+            lines = sorted({error["loc"][1] for error in response.json().get("detail", [])})
+            self.log_test("Ingest Validation", response.status_code == 422 and lines == [1, 2],
+                          f"Status: {response.status_code}, invalid lines: {lines}")
+            
+            typed = dict(events[1], request_id=str(uuid.uuid4()), user_id=5, job_id=["j"], trajectory_ecu_consumed="abc")
+            response = requests.post(url, data=json.dumps(typed), headers=headers, timeout=10)
+            fields = sorted(error["loc"][-1] for error in response.json().get("detail", []))
+            self.log_test("Ingest Column Types", response.status_code == 422
+                          and fields == ["job_id", "trajectory_ecu_consumed", "user_id"],
+                          f"Status: {response.status_code}, invalid fields: {fields}")
+            
+            # Sent chunked, so the size is only known while the body is read
+            oversized = (b" " * (1 << 20) for _ in range(65))
+            response = requests.post(url, data=oversized, headers=headers, timeout=30)
+            self.log_test("Ingest Size Limit", response.status_code == 413, f"Status: {response.status_code}")
+                
+        except Exception as e:
+            self.log_test("Bulk Ingest", False, f"Exception: {str(e)}")
+
+    def test_response_cache(self):
+        """Test ETag / If-None-Match revalidation and cache invalidation on ingest"""
+        url = f"{self.base_url}/api/hitl-events/satisfied"
+        try:
+            first = requests.get(url, params={"limit": 100}, timeout=10)
+            etag = first.headers.get("etag")
+            stats_before = requests.get(f"{self.base_url}/api/cache/stats", timeout=10).json()
+            again = requests.get(url, params={"limit": 100}, headers={"If-None-Match": etag}, timeout=10)
+            stats_after = requests.get(f"{self.base_url}/api/cache/stats", timeout=10).json()
+            
+            if not etag or again.status_code != 304 or again.content:
+                self.log_test("Response Cache 304", False, f"ETag: {etag}, status: {again.status_code}")
+            elif stats_after["not_modified"] != stats_before["not_modified"] + 1:
+                self.log_test("Response Cache 304", False, f"not_modified counter: {stats_before} -> {stats_after}")
+            else:
+                self.log_test("Response Cache 304", True, f"hit rate {stats_after['hit_rate']}")
+            
+            event = {"event_timestamp": "2026-01-21T08:00:00Z", "request_id": str(uuid.uuid4()), "user_sentiment": ["satisfied"],
+                     "user_intent": ["ack_bug_fixed"], "user_curr_message": "works now, thanks", "agent_prev_message": "Deployed the fix."}
+            requests.post(f"{self.base_url}/api/ingest/hitl-events", json=[event], timeout=10)
+            after_ingest = requests.get(url, params={"limit": 100}, headers={"If-None-Match": etag}, timeout=10)
+            ids = [e["request_id"] for e in after_ingest.json().get("events", [])] if after_ingest.status_code == 200 else []
+            if event["request_id"] in ids and after_ingest.headers.get("etag") != etag:
+                self.log_test("Response Cache Invalidation", True, "Ingested event served with a new ETag")
+            else:
+                self.log_test("Response Cache Invalidation", False, f"Status: {after_ingest.status_code}")
+                
+        except Exception as e:
+            self.log_test("Response Cache", False, f"Exception: {str(e)}")
+
+    def test_data_source(self):
+        """Test the configured data source is reported and serves sentiment counts"""
+        try:
+            source = requests.get(f"{self.base_url}/api/health", timeout=10).json().get("data_source", {})
+            if source.get("kind") not in ("memory", "sqlite", "segments", "bigquery"):
+                self.log_test("Data Source", False, f"Unexpected data_source: {source}")
+                return
+            
+            # A unique parameter bypasses the response cache, so the source is queried
+            response = requests.get(f"{self.base_url}/api/sentiments", params={"nocache": str(uuid.uuid4())}, timeout=10)
+            counts = response.json() if response.status_code == 200 else []
+            after = requests.get(f"{self.base_url}/api/health", timeout=10).json()["data_source"]
+            if not counts or [c["count"] for c in counts] != sorted((c["count"] for c in counts), reverse=True):
+                self.log_test("Data Source", False, f"Sentiment counts not ordered: {counts}")
+            elif source["kind"] != "memory" and after["queries"] <= source["queries"]:
+                self.log_test("Data Source", False, f"Query counter did not move: {source} -> {after}")
+            else:
+                self.log_test("Data Source", True, f"{source['kind']}: {len(counts)} sentiments")
+                
+        except Exception as e:
+            self.log_test("Data Source", False, f"Exception: {str(e)}")
+
+    def test_payload_projection(self):
+        """Test fields= projection, preview_chars= truncation and the full-event endpoint"""
+        try:
+            params = {"limit": 20, "fields": "user_intent", "preview_chars": 80}
+            response = requests.get(f"{self.base_url}/api/hitl-events/dissatisfied", params=params, timeout=10)
+            if response.status_code != 200:
+                self.log_test("Payload Projection", False, f"Status code: {response.status_code}")
+                return
+            events = response.json()["events"]
+            extra = [sorted(e) for e in events if set(e) - {"request_id", "event_timestamp", "user_intent"}]
+            if not events or extra:
+                self.log_test("Payload Projection", False, f"Unexpected fields: {extra[:1]}")
+                return
+            
+            previews = requests.get(f"{self.base_url}/api/hitl-events/dissatisfied",
+                                    params={"limit": 20, "preview_chars": 80}, timeout=10).json()["events"]
+            truncated = [e for e in previews if "agent_prev_message" in e.get("truncated", [])]
+            if not truncated:
+                self.log_test("Payload Projection", False, "No agent message was truncated at preview_chars=80")
+                return
+            preview = truncated[0]
+            if len(preview["agent_prev_message"]) > 81 or not preview["agent_prev_message"].endswith("…"):
+                self.log_test("Payload Projection", False, f"Bad preview: {preview['agent_prev_message']!r}")
+                return
+            
+            full = requests.get(f"{self.base_url}/api/hitl-event/{preview['request_id']}", timeout=10)
+            missing = requests.get(f"{self.base_url}/api/hitl-event/{uuid.uuid4()}", timeout=10)
+            if full.status_code != 200 or "truncated" in full.json():
+                self.log_test("Payload Projection", False, f"Full event: {full.status_code}")
+            elif not full.json()["agent_prev_message"].startswith(preview["agent_prev_message"][:-1]):
+                self.log_test("Payload Projection", False, "Preview is not a prefix of the full message")
+            elif missing.status_code != 404:
+                self.log_test("Payload Projection", False, f"Unknown request_id returned {missing.status_code}")
+            else:
+                self.log_test("Payload Projection", True, f"{len(truncated)}/{len(previews)} previews truncated")
+                
+        except Exception as e:
+            self.log_test("Payload Projection", False, f"Exception: {str(e)}")
+
+    def test_fast_responses(self):
+        """Test response compression and weak ETag revalidation (ORACLE_FAST_RESPONSES=1), or plain bodies when off"""
+        try:
+            enabled = requests.get(f"{self.base_url}/api/health", timeout=10).json().get("fast_responses", False)
+            url = f"{self.base_url}/api/hitl-events"
+            params = {"limit": 100}
+            plain = requests.get(url, params=params, headers={"Accept-Encoding": "identity"}, timeout=10)
+            compressed = requests.get(url, params=params, headers={"Accept-Encoding": "gzip"}, timeout=10)
+            if plain.status_code != 200 or compressed.status_code != 200:
+                self.log_test("Fast Responses", False, f"Status codes: {plain.status_code}, {compressed.status_code}")
+                return
+            if compressed.json() != plain.json() or "content-encoding" in plain.headers:
+                self.log_test("Fast Responses", False, "Compressed and identity responses differ")
+                return
+            encoding = compressed.headers.get("content-encoding")
+            if not enabled:
+                if encoding:
+                    self.log_test("Fast Responses", False, f"Compressed ({encoding}) with fast responses off")
+                else:
+                    self.log_test("Fast Responses", True, "Fast responses off; identity bodies")
+                return
+            
+            etag = compressed.headers.get("etag", "")
+            if encoding != "gzip" or "accept-encoding" not in compressed.headers.get("vary", "").lower():
+                self.log_test("Fast Responses", False, f"Content-Encoding {encoding}, Vary {compressed.headers.get('vary')}")
+            elif not etag.startswith('W/"'):
+                self.log_test("Fast Responses", False, f"Compressed response has a strong ETag: {etag}")
+            else:
+                revalidated = requests.get(url, params=params, headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+                                           timeout=10)
+                if revalidated.status_code != 304:
+                    self.log_test("Fast Responses", False, f"Revalidation returned {revalidated.status_code}")
+                else:
+                    self.log_test("Fast Responses", True,
+                                  f"gzip {len(plain.content)} -> {compressed.headers.get('content-length')} bytes, 304 on weak ETag")
+                
+        except Exception as e:
+            self.log_test("Fast Responses", False, f"Exception: {str(e)}")
+
+    def test_sessions(self):
+        """Test the job_id session index: ECU ranking, time-ordered timeline and the session behind an event"""
+        job_id = f"job-{uuid.uuid4()}"
+        ids = [str(uuid.uuid4()) for _ in range(3)]
+        # Sent out of order; the ECU is large enough to rank first
+        events = [
+            {"event_timestamp": f"2026-01-21 08:0{minute}:00.000000 UTC", "request_id": ids[minute], "job_id": job_id,
+             "user_id": "user-session-test", "state_number": minute + 1, "trajectory_ecu_consumed": 1e9 + minute,
+             "user_sentiment": [sentiment], "user_intent": [intent], "user_curr_message": f"step {minute}",
+             "agent_prev_message": "Done."}
+            for minute, sentiment, intent in [(2, "frustrated", "req_same_bug_fix"), (0, "neutral", "req_feature"),
+                                              (1, "dissatisfied", "req_new_bugfix")]
+        ]
+        try:
+            response = requests.post(f"{self.base_url}/api/ingest/hitl-events", json=events, timeout=10)
+            if response.status_code != 200:
+                self.log_test("Sessions", False, f"Ingest status: {response.status_code}")
+                return
+            top = requests.get(f"{self.base_url}/api/sessions", params={"limit": 5}, timeout=10).json()["sessions"]
+            summary = top[0] if top else {}
+            expected = {"job_id": job_id, "user_id": "user-session-test", "total_events": 3, "total_states": 3,
+                        "total_ecu_consumed": 1e9 + 2, "session_start": "2026-01-21 08:00:00.000000 UTC",
+                        "session_end": "2026-01-21 08:02:00.000000 UTC"}
+            wrong = {key: summary.get(key) for key, value in expected.items() if summary.get(key) != value}
+            if wrong or sorted(summary["all_sentiments"]) != ["dissatisfied", "frustrated", "neutral"]:
+                self.log_test("Sessions", False, f"Top session by ECU: {wrong or summary}")
+                return
+            
+            timeline = requests.get(f"{self.base_url}/api/sessions/{job_id}", timeout=10).json()
+            around = requests.get(f"{self.base_url}/api/hitl-event/{ids[2]}/session",
+                                  params={"fields": "user_sentiment"}, timeout=10).json()
+            missing = requests.get(f"{self.base_url}/api/sessions/{uuid.uuid4()}", timeout=10)
+            no_job = requests.get(f"{self.base_url}/api/hitl-event/sat-001/session", timeout=10)
+            if [event["request_id"] for event in timeline["events"]] != ids:
+                self.log_test("Sessions", False, "Timeline not in time order")
+            elif around.get("job_id") != job_id or [e["user_sentiment"] for e in around["events"]] != [["neutral"], ["dissatisfied"], ["frustrated"]]:
+                self.log_test("Sessions", False, f"Session for event: {around}")
+            elif missing.status_code != 404 or no_job.status_code != 404:
+                self.log_test("Sessions", False, f"Unknown job {missing.status_code}, event without job {no_job.status_code}")
+            else:
+                self.log_test("Sessions", True, "Ranked first by ECU; 3-event timeline in time order")
+                
+        except Exception as e:
+            self.log_test("Sessions", False, f"Exception: {str(e)}")
+
+    def test_at_risk_users(self):
+        """Test the streaming frustrated-user detector with one large ingest burst"""
+        url = f"{self.base_url}/api/at-risk-users"
+        prefix = f"user-risk-{uuid.uuid4().hex[:8]}"
+        try:
+            as_of = requests.get(url, timeout=10).json()["as_of"]
+            now = datetime.strptime(as_of[:19], "%Y-%m-%d %H:%M:%S")
+            # 50 users with 40 events each in the hour before the newest event; user k has
+            # k % 5 frustrated ones in the window and one more 8 days back, outside it
+            events = []
+            for k in range(50):
+                for i in range(40):
+                    frustrated = i < k % 5
+                    events.append({
+                        "event_timestamp": (now - timedelta(minutes=59, seconds=-i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        "request_id": str(uuid.uuid4()), "user_id": f"{prefix}-{k}",
+                        "user_sentiment": ["frustrated" if frustrated else "neutral"],
+                        "user_intent": ["req_same_bug_fix" if frustrated else "provided_info"],
+                        "user_curr_message": "still broken" if frustrated else "ok", "agent_prev_message": "Done."})
+                events.append({
+                    "event_timestamp": (now - timedelta(days=8)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "request_id": str(uuid.uuid4()), "user_id": f"{prefix}-{k}", "user_sentiment": ["frustrated"],
+                    "user_intent": ["credit_concern"], "user_curr_message": "old", "agent_prev_message": "Done."})
+            body = "\n".join(json.dumps(event) for event in events)
+            response = requests.post(f"{self.base_url}/api/ingest/hitl-events", data=body,
+                                     headers={"Content-Type": "application/x-ndjson"}, timeout=30)
+            if response.status_code != 200:
+                self.log_test("At-Risk Users", False, f"Ingest status: {response.status_code}")
+                return
+            
+            data = requests.get(url, params={"limit": 1000, "flags": 1000}, timeout=10).json()
+            found = {user["user_id"]: user for user in data["users"] if user["user_id"].startswith(prefix)}
+            expected = {f"{prefix}-{k}": k % 5 for k in range(50) if k % 5 >= 2}
+            counts = [user["frustrated_events"] for user in data["users"]]
+            flagged = {flag["user_id"] for flag in data["recent_flags"] if flag["user_id"].startswith(prefix)}
+            with_one = requests.get(url, params={"limit": 1000, "min_events": 1}, timeout=10).json()["users"]
+            if {user_id: user["frustrated_events"] for user_id, user in found.items()} != expected:
+                self.log_test("At-Risk Users", False, f"Counts: {found}")
+            elif counts != sorted(counts, reverse=True):
+                self.log_test("At-Risk Users", False, f"Not ranked: {counts}")
+            elif any(user["related_intents"] != ["req_same_bug_fix"] or user["flagged_at"] is None for user in found.values()):
+                self.log_test("At-Risk Users", False, f"Intents / flag time: {list(found.values())[:2]}")
+            elif flagged != set(expected):
+                self.log_test("At-Risk Users", False, f"Flags for {len(flagged)} of {len(expected)} users")
+            elif sum(user["user_id"].startswith(prefix) for user in with_one) != 40:
+                self.log_test("At-Risk Users", False, "min_events=1 should include users with one frustrated event")
+            else:
+                self.log_test("At-Risk Users", True, f"{len(events)} events in one batch; {len(found)} users flagged, expired events not counted")
+                
+        except Exception as e:
+            self.log_test("At-Risk Users", False, f"Exception: {str(e)}")
+
+    def test_live_feed(self):
+        """Test the SSE live feed: only new events matching the subscription are pushed"""
+        marker = uuid.uuid4().hex[:12]
+        events = [
+            {"event_timestamp": "2026-01-21 10:00:00.000000 UTC", "request_id": str(uuid.uuid4()), "user_sentiment": [sentiment],
+             "user_intent": ["req_same_bug_fix"], "user_curr_message": f"live {marker} {sentiment}", "agent_prev_message": "Done."}
+            for sentiment in ("neutral", "frustrated")
+        ]
+        try:
+            with requests.get(f"{self.base_url}/api/live/hitl-events",
+                              params={"sentiment": "frustrated", "fields": "user_curr_message"},
+                              stream=True, timeout=10) as stream:
+                lines = stream.iter_lines(decode_unicode=True)
+                # The first message means the subscription is registered
+                if stream.headers.get("content-type", "").split(";")[0] != "text/event-stream" or not next(lines).startswith("retry:"):
+                    self.log_test("Live Feed", False, f"Not an event stream: {stream.headers.get('content-type')}")
+                    return
+                response = requests.post(f"{self.base_url}/api/ingest/hitl-events", json=events, timeout=10)
+                if response.status_code != 200:
+                    self.log_test("Live Feed", False, f"Ingest status: {response.status_code}")
+                    return
+                received = None
+                for line in lines:
+                    if line.startswith("data:") and marker in line:
+                        received = json.loads(line[len("data:"):])
+                        break
+            stats = requests.get(f"{self.base_url}/api/live/stats", timeout=10).json()
+            if received is None or received["user_curr_message"] != f"live {marker} frustrated":
+                self.log_test("Live Feed", False, f"Received: {received}")
+            elif set(received) != {"request_id", "event_timestamp", "user_curr_message"}:
+                self.log_test("Live Feed", False, f"Fields not projected: {sorted(received)}")
+            elif "subscribers" not in stats:
+                self.log_test("Live Feed", False, f"Stats: {stats}")
+            else:
+                self.log_test("Live Feed", True, "Frustrated event pushed, neutral one filtered out")
+                
+        except Exception as e:
+            self.log_test("Live Feed", False, f"Exception: {str(e)}")
+
+    def test_quantile_stats(self):
+        """Test quantile sketches: per-group exact counts and quantiles within the documented error"""
+        outcome = f"test_outcome_{uuid.uuid4().hex[:8]}"
+        # execution_time 1..100 under one new progress_outcome, spread over two days
+        events = [
+            {"event_timestamp": f"2026-01-{20 + i % 2} 09:00:{i % 60:02d}.{i:06d} UTC", "request_id": str(uuid.uuid4()),
+             "user_sentiment": ["neutral"], "user_intent": ["provided_info"], "progress_outcome": [outcome],
+             "execution_time": float(i), "user_curr_message": "quantile test", "agent_prev_message": "Done."}
+            for i in range(1, 101)
+        ]
+        try:
+            response = requests.post(f"{self.base_url}/api/ingest/hitl-events", json=events, timeout=10)
+            if response.status_code != 200:
+                self.log_test("Quantile Stats", False, f"Ingest status: {response.status_code}")
+                return
+            response = requests.get(f"{self.base_url}/api/stats/quantiles", params={
+                "metric": "execution_time", "group_by": "outcome", "start": "2026-01-20", "end": "2026-01-22",
+                "q": [0.5, 0.99]}, timeout=10)
+            data = response.json()
+            row = next((row for row in data.get("groups", []) if row["group"] == outcome), None)
+            accuracy = data.get("relative_accuracy", 0)
+            bad_q = requests.get(f"{self.base_url}/api/stats/quantiles", params={"q": 1.5}, timeout=10)
+            # Exact values at floor(q * (n - 1)): 50 and 99
+            if row is None or (row["count"], row["min"], row["max"], row["mean"]) != (100, 1.0, 100.0, 50.5):
+                self.log_test("Quantile Stats", False, f"Group: {row}")
+            elif abs(row["quantiles"]["p50"] - 50) > 50 * accuracy or abs(row["quantiles"]["p99"] - 99) > 99 * accuracy:
+                self.log_test("Quantile Stats", False, f"Quantiles outside {accuracy:.0%}: {row['quantiles']}")
+            elif bad_q.status_code != 400:
+                self.log_test("Quantile Stats", False, f"q=1.5 status: {bad_q.status_code}")
+            else:
+                self.log_test("Quantile Stats", True, f"p50 {row['quantiles']['p50']:.2f}, p99 {row['quantiles']['p99']:.2f} merged from 2 days")
+                
+        except Exception as e:
+            self.log_test("Quantile Stats", False, f"Exception: {str(e)}")
+
+    def test_unique_users(self):
+        """Test distinct-user estimates: merged across days, within three standard errors"""
+        intent = f"test_intent_{uuid.uuid4().hex[:8]}"
+        prefix = uuid.uuid4().hex[:8]
+        # 1,000 users under one new intent, each seen once on each of two days
+        events = [
+            {"event_timestamp": f"2025-11-{10 + day} 12:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d} UTC",
+             "request_id": str(uuid.uuid4()), "user_id": f"{prefix}-{i}", "user_sentiment": ["neutral"],
+             "user_intent": [intent], "user_curr_message": "unique user test", "agent_prev_message": "Done."}
+            for day in range(2) for i in range(1000)
+        ]
+        try:
+            response = requests.post(f"{self.base_url}/api/ingest/hitl-events", json=events, timeout=30)
+            if response.status_code != 200:
+                self.log_test("Unique Users", False, f"Ingest status: {response.status_code}")
+                return
+            data = requests.get(f"{self.base_url}/api/stats/unique-users", params={
+                "group_by": "intent", "start": "2025-11-10", "end": "2025-11-12"}, timeout=10).json()
+            row = next((row for row in data.get("groups", []) if row["group"] == intent), None)
+            tolerance = 3 * data.get("standard_error", 0) * 1000
+            trends = requests.get(f"{self.base_url}/api/trends", params={
+                "start": "2025-11-10", "end": "2025-11-12"}, timeout=10).json()
+            daily = [bucket.get("unique_users", {}).get("intents", {}).get(intent) for bucket in trends.get("buckets", [])]
+            sentiments = requests.get(f"{self.base_url}/api/sentiments", timeout=10).json()
+            if row is None or abs(row["unique_users"] - 1000) > tolerance:
+                self.log_test("Unique Users", False, f"Group: {row}, tolerance {tolerance:.0f}")
+            elif len(daily) != 2 or any(users is None or abs(users - 1000) > tolerance for users in daily):
+                self.log_test("Unique Users", False, f"Daily trend estimates: {daily}")
+            elif not all(isinstance(category.get("unique_users"), int) for category in sentiments):
+                self.log_test("Unique Users", False, f"Sentiments without unique_users: {sentiments[:2]}")
+            else:
+                self.log_test("Unique Users", True, f"{row['unique_users']} of 1000 users over 2 days, daily {daily}")
+                
+        except Exception as e:
+            self.log_test("Unique Users", False, f"Exception: {str(e)}")
+
+    def test_tool_usage(self):
+        """Test trajectory step ingest and the per-tool usage report over a test model's jobs"""
+        model = f"test-model-{uuid.uuid4().hex[:8]}"
+        # (job, seconds after the job started, tool, env_success)
+        calls = [
+            ("a", 10, "think", "true"), ("a", 20, "search_replace", "true"), ("a", 30, "search_replace", "false"),
+            ("a", 40, "finish", "true"),
+            ("b", 5, "search_replace", "true"), ("b", 15, "execute_bash", "false"), ("b", 25, "finish", "true"),
+            ("c", 60, "execute_bash", "true"),
+        ]
+        steps = [
+            {"job_id": f"{model}-{job}", "function_name": tool, "created_at": f"2025-10-01 09:{seconds // 60:02d}:{seconds % 60:02d}.000000 UTC",
+             "env_success": success, "model_name": model, "prompt_name": "frontend_app_builder_cloud_v8",
+             "agent_name": "SkilledAssistant" if job == "c" else "EmergentAssistant", "user_id": f"user_{job}",
+             "job_created_at": "2025-10-01 09:00:00.000000 UTC"}
+            for job, seconds, tool, success in calls
+        ]
+        url = f"{self.base_url}/api/ingest/trajectories"
+        try:
+            body = "\n".join(json.dumps(step) for step in steps)
+            response = requests.post(url, data=body, headers={"Content-Type": "application/x-ndjson"}, timeout=30)
+            if response.status_code != 200 or response.json()["inserted"] != len(steps):
+                self.log_test("Tool Usage", False, f"Ingest status: {response.status_code}, body: {response.text[:200]}")
+                return
+            data = requests.get(f"{self.base_url}/api/tool-usage", params={"model_name": model}, timeout=30).json()
+            tools = {row["tool"]: row for row in data.get("tools", [])}
+            search_replace = tools.get("search_replace", {})
+            expected = {
+                "tool_jobs": 2, "invoke_pct": 66.67, "total_tool_calls": 3, "tool_freq_per_job": 1.5, "pct_tool_call": 37.5,
+                "success_calls": 2, "success_pct": 66.67, "p90_first_invocation_step": 1.0, "p90_invocation_latency": 5.0,
+                "position_histogram": [1, 0, 1, 0, 0, 1, 0, 0, 0, 0],
+            }
+            mismatched = {field: search_replace.get(field) for field, value in expected.items() if search_replace.get(field) != value}
+            if (data.get("total_jobs"), data.get("total_calls")) != (3, 8) or set(tools) != {"think", "search_replace", "finish", "execute_bash"}:
+                self.log_test("Tool Usage", False, f"Totals: {data.get('total_jobs')} jobs, {data.get('total_calls')} calls, tools {sorted(tools)}")
+                return
+            if mismatched:
+                self.log_test("Tool Usage", False, f"search_replace: {mismatched}")
+                return
+            self.log_test("Tool Usage", True, "3 jobs, 8 calls; search_replace on 2 jobs, 66.67% successful")
+            
+            filtered = requests.get(f"{self.base_url}/api/tool-usage", params={
+                "model_name": model, "agent_name": "SkilledAssistant"}, timeout=30).json()
+            busy = requests.get(f"{self.base_url}/api/tool-usage", params={"model_name": model, "min_calls": 3}, timeout=30).json()
+            self.log_test("Tool Usage Filters",
+                          filtered.get("total_jobs") == 1 and [row["tool"] for row in busy.get("tools", [])] == ["search_replace"],
+                          f"SkilledAssistant jobs: {filtered.get('total_jobs')}, tools with 3+ calls: {[row['tool'] for row in busy.get('tools', [])]}")
+            
+            again = requests.post(url, json=steps, timeout=30)
+            invalid = requests.post(url, json=[{"job_id": model, "created_at": "2025-10-01"}], timeout=30)
+            self.log_test("Tool Usage Ingest De-duplication",
+                          again.status_code == 200 and again.json()["duplicates"] == len(steps) and invalid.status_code == 422,
+                          f"Resend: {again.text[:120]}, invalid status: {invalid.status_code}")
+            
+            oversized = (b" " * (1 << 20) for _ in range(65))
+            response = requests.post(url, data=oversized, timeout=30)
+            self.log_test("Tool Usage Ingest Size Limit", response.status_code == 413, f"Status: {response.status_code}")
+                
+        except Exception as e:
+            self.log_test("Tool Usage", False, f"Exception: {str(e)}")
+
+    def test_metrics(self):
+        """Test the Prometheus metrics endpoint and switching the sampling profiler on and off"""
+        try:
+            requests.get(f"{self.base_url}/api/hitl-events/frustrated", params={"limit": 5}, timeout=30)
+            requests.get(f"{self.base_url}/api/hitl-event/not-a-request-id", timeout=30)
+            response = requests.get(f"{self.base_url}/api/metrics", timeout=30)
+            text = response.text
+            expected = [
+                'oracle_http_requests_total{method="GET",route="/api/hitl-events/{sentiment}",status="200"}',
+                'oracle_http_requests_total{method="GET",route="/api/hitl-event/{request_id}",status="404"}',
+                'oracle_http_request_duration_seconds_bucket{method="GET",route="/api/hitl-events/{sentiment}",le="+Inf"}',
+                'oracle_http_response_bytes_total{method="GET",route="/api/hitl-events/{sentiment}"}',
+                "oracle_events_stored ",
+                "oracle_response_cache_hits_total ",
+                "oracle_label_index_bitmap_hits_total ",
+                "oracle_search_searches_total ",
+                "oracle_session_index_lookups_total ",
+                "oracle_tool_usage_restarts_total ",
+            ]
+            missing = [series for series in expected if series not in text]
+            self.log_test("Metrics",
+                          response.status_code == 200 and response.headers.get("content-type", "").startswith("text/plain") and not missing,
+                          f"Status: {response.status_code}, missing series: {missing}")
+            
+            url = f"{self.base_url}/api/debug/profiler"
+            on = requests.post(url, params={"enabled": "true", "interval_ms": 2, "slow_ms": 0}, timeout=30).json()
+            requests.get(f"{self.base_url}/api/trends", timeout=30)
+            status = requests.get(url, timeout=30).json()
+            off = requests.post(url, params={"enabled": "false"}, timeout=30).json()
+            self.log_test("Sampling Profiler",
+                          on.get("enabled") is True and off.get("enabled") is False and len(status.get("captures", [])) > 0,
+                          f"Enabled: {on.get('enabled')} -> {off.get('enabled')}, captures: {len(status.get('captures', []))}")
+                
+        except Exception as e:
+            self.log_test("Metrics", False, f"Exception: {str(e)}")
+
+    def test_near_duplicates(self):
+        """Test near-duplicate clusters and similar events over a test work_category's events"""
+        category = f"test-{uuid.uuid4().hex[:8]}"
+        messages = [
+            "Still not working, the checkout page shows a blank screen",
+            "still not working!! the checkout page shows a blank screen again",
+            "please add a dark mode toggle to the settings page",
+            "Please add a dark mode toggle on the settings page!",
+            "can you export the monthly report as a csv file",
+        ]
+        events = [
+            {"event_timestamp": f"2025-09-01 10:00:0{i}.000000 UTC", "request_id": f"{category}-{i}", "user_curr_message": message,
+             "user_intent": ["req_same_bug_fix"], "user_sentiment": ["dissatisfied"], "work_category": [category]}
+            for i, message in enumerate(messages)
+        ]
+        try:
+            response = requests.post(f"{self.base_url}/api/ingest/hitl-events", json=events, timeout=30)
+            if response.status_code != 200:
+                self.log_test("Near-Duplicate Clusters", False, f"Ingest status: {response.status_code}")
+                return
+            for _ in range(50):
+                if not requests.post(f"{self.base_url}/api/ingest/hitl-events", json=[], timeout=10).json()["near_duplicates_pending"]:
+                    break
+                time.sleep(0.1)
+            data = requests.get(f"{self.base_url}/api/clusters", params={"work_category": category, "threshold": 0.5}, timeout=30).json()
+            clusters = [sorted(event["request_id"] for event in cluster["events"]) for cluster in data.get("clusters", [])]
+            expected = [[f"{category}-0", f"{category}-1"], [f"{category}-2", f"{category}-3"]]
+            newest = sorted(cluster["events"][0]["request_id"] for cluster in data.get("clusters", []))
+            self.log_test("Near-Duplicate Clusters",
+                          sorted(clusters) == expected and newest == [f"{category}-1", f"{category}-3"]
+                          and all(c["size"] == 2 and c["first_seen"] < c["last_seen"] for c in data["clusters"]),
+                          f"Clusters: {clusters}")
+            
+            similar = requests.get(f"{self.base_url}/api/hitl-event/{category}-0/similar", params={"threshold": 0.5}, timeout=30).json()
+            matches = {event["request_id"]: event["similarity"] for event in similar.get("events", [])}
+            missing = requests.get(f"{self.base_url}/api/hitl-event/{category}-missing/similar", timeout=30)
+            self.log_test("Similar Events",
+                          list(matches) == [f"{category}-1"] and matches[f"{category}-1"] >= 0.7 and missing.status_code == 404,
+                          f"Similar to {category}-0: {matches}, unknown request_id status: {missing.status_code}")
+                
+        except Exception as e:
+            self.log_test("Near-Duplicate Clusters", False, f"Exception: {str(e)}")
+
+    def test_integration_demand(self):
+        """Test integration demand counts from parsed work_subcategory strings, before and after an ingest"""
+        prefix = uuid.uuid4().hex[:8]
+        unknown = f"zapier-{prefix}"
+        subcategories = [
+            (["integration: Stripe, gpt 4o | design: layout"], ["integration", "design"], ["requested_integration"]),
+            (["Integration :  STRIPE "], ["integration"], ["req_feature"]),
+            (["stripe"], ["integration"], ["req_same_bug_fix"]),
+            ([f"integration: {unknown}"], ["integration"], ["req_feature"]),
+        ]
+        events = [
+            {"event_timestamp": f"2024-02-29 09:00:0{i}.000000 UTC", "request_id": f"{prefix}-{i}", "user_id": f"{prefix}-{i % 2}",
+             "user_sentiment": ["neutral"], "user_intent": intents, "work_category": categories, "work_subcategory": values}
+            for i, (values, categories, intents) in enumerate(subcategories)
+        ]
+        params = {"start": "2024-02-29", "end": "2024-03-01"}
+
+        def demand(**extra):
+            data = requests.get(f"{self.base_url}/api/integrations/demand", params={**params, **extra}, timeout=10).json()
+            return {row["integration"]: row for row in data.get("integrations", [])}, data
+
+        try:
+            before, _ = demand()
+            response = requests.post(f"{self.base_url}/api/ingest/hitl-events", json=events, timeout=30)
+            if response.status_code != 200:
+                self.log_test("Integration Demand", False, f"Ingest status: {response.status_code}")
+                return
+            after, data = demand()
+            payment, _ = demand(group="Payment")
+
+            def added(name, key):
+                return after.get(name, {}).get(key, 0) - before.get(name, {}).get(key, 0)
+
+            deltas = {name: (added(name, "mentions"), added(name, "requests"), added(name, "unique_users"))
+                      for name in ("Stripe", "GPT-4o")}
+            unrecognized = {row["item"]: row["mentions"] for row in data.get("unrecognized", [])}
+            buckets = data.get("buckets", [])
+            success = (
+                deltas == {"Stripe": (3, 1, 2), "GPT-4o": (1, 1, 1)}
+                and unrecognized.get(unknown) == 1
+                and set(payment) <= {"Stripe", "Razorpay", "PayPal"} and "Stripe" in payment
+                and len(buckets) == 1 and buckets[0]["mentions"].get("Stripe") == after["Stripe"]["mentions"]
+            )
+            self.log_test("Integration Demand", success,
+                          f"Added (mentions, requests, users): {deltas}, unrecognized: {unrecognized.get(unknown)}, "
+                          f"Payment group: {sorted(payment)}")
+                
+        except Exception as e:
+            self.log_test("Integration Demand", False, f"Exception: {str(e)}")
+
     def run_all_tests(self):
         """Run all backend tests"""
         print("🚀 Starting LLM Tracing API Backend Tests")
@@ -212,6 +1028,29 @@ class LLMTracingAPITester:
         self.test_tool_categories()
         self.test_invalid_job_id()
         
+        # Test HITL event endpoints
+        self.test_all_hitl_events()
+        self.test_hitl_events_pagination()
+        self.test_export_hitl_events()
+        self.test_label_filters()
+        self.test_date_filters()
+        self.test_search()
+        self.test_trends()
+        self.test_ingest()
+        self.test_response_cache()
+        self.test_data_source()
+        self.test_payload_projection()
+        self.test_fast_responses()
+        self.test_sessions()
+        self.test_at_risk_users()
+        self.test_live_feed()
+        self.test_quantile_stats()
+        self.test_unique_users()
+        self.test_tool_usage()
+        self.test_metrics()
+        self.test_near_duplicates()
+        self.test_integration_demand()
+        
         # Test job-specific endpoints with available jobs
         if jobs:
             for job_id in jobs[:2]:  # Test first 2 jobs to avoid too many requests
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Response cache benchmark.
+
+Loads synthetic events into the backend, then times the dashboard's
+requests three ways: uncached (a unique extra query parameter defeats the
+cache key), cached (200 from the cache) and revalidated (If-None-Match ->
+304). Prints /api/cache/stats at the end.
+
+By default the app is driven in-process through its ASGI interface, which
+measures server time alone; with --url it goes over HTTP to a running
+backend, which adds client and network overhead.
+
+    python benchmarks/cache_benchmark.py --events 100000
+    python benchmarks/cache_benchmark.py --url http://localhost:8001 --events 100000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlencode
+
+import requests
+
+from ingest_benchmark import batches, make_events
+
+DASHBOARD_REQUESTS = [
+    ("/api/sentiments", {}),
+    ("/api/hitl-events/dissatisfied", {"limit": 20}),
+    ("/api/hitl-events", {"limit": 100}),
+    ("/api/hitl-events", {"limit": 20, "intent": "req_same_bug_fix", "not_sentiment": "frustrated"}),
+    ("/api/hitl-events", {"limit": 20, "q": "payment integration"}),
+    ("/api/trends", {"granularity": "hour"}),
+]
+
+
+def load(url, count, batch_size=5000):
+    session = requests.Session()
+    for batch in batches(make_events(count), batch_size):
+        body = "\n".join(json.dumps(event) for event in batch)
+        session.post(f"{url}/api/ingest/hitl-events", data=body,
+                     headers={"Content-Type": "application/x-ndjson"}, timeout=300).raise_for_status()
+    # An empty batch just reports search_pending and near_duplicates_pending;
+    # wait for background indexing to finish so the cache version stops moving
+    while any(session.post(f"{url}/api/ingest/hitl-events", data=b"[]", timeout=10).json()[pending]
+              for pending in ("search_pending", "near_duplicates_pending")):
+        time.sleep(0.5)
+
+
+class HTTPClient:
+    def __init__(self, url):
+        self.url = url
+        self.session = requests.Session()
+
+    def get(self, path, params, headers=None):
+        response = self.session.get(self.url + path, params=params, headers=headers, timeout=60)
+        return response.status_code, response.headers, response.content
+
+
+class ASGIClient:
+    """Calls the app object directly: no sockets, no HTTP parsing"""
+
+    def __init__(self):
+        import server
+
+        self.app = server.app
+        self.loop = asyncio.new_event_loop()
+
+    def get(self, path, params, headers=None):
+        scope = {
+            "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "root_path": "",
+            "path": path, "raw_path": path.encode(), "query_string": urlencode(params, doseq=True).encode(),
+            "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+            "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+        }
+        response = {"headers": {}, "body": []}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {key.decode(): value.decode() for key, value in message["headers"]}
+            else:
+                response["body"].append(message.get("body", b""))
+
+        self.loop.run_until_complete(self.app(scope, receive, send))
+        return response["status"], response["headers"], b"".join(response["body"])
+
+
+def load_in_process(count):
+    import server
+
+    for batch in batches(make_events(count), 5000):
+        server.EVENT_STORE.add_many(batch)
+    server.SEARCH_INDEXER.wait()
+    server.NEAR_DUPLICATE_INDEXER.wait()
+    server.RESPONSE_CACHE.invalidate()
+
+
+def timed(client, path, params, rounds, headers=None):
+    samples = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        status, response_headers, body = client.get(path, params(i), headers)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), status, response_headers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running backend over HTTP instead of in-process")
+    parser.add_argument("--events", type=int, default=100_000, help="Synthetic events to ingest first (0 to skip)")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    if args.url:
+        client = HTTPClient(args.url.rstrip("/"))
+        if args.events:
+            load(client.url, args.events)
+    else:
+        client = ASGIClient()
+        if args.events:
+            load_in_process(args.events)
+
+    print(f"{'endpoint':<76} {'uncached':>9} {'cached':>9} {'304':>9}  (median ms)")
+    for path, params in DASHBOARD_REQUESTS:
+        uncached, _, _ = timed(client, path, lambda i: {**params, "nocache": f"{time.time()}-{i}"}, args.rounds // 4)
+        cached, _, headers = timed(client, path, lambda i: params, args.rounds)
+        revalidated, status, _ = timed(client, path, lambda i: params, args.rounds,
+                                       headers={"If-None-Match": headers["etag"]})
+        assert status == 304, status
+        label = path + ("?" + urlencode(params) if params else "")
+        print(f"{label:<76} {uncached:>9.3f} {cached:>9.3f} {revalidated:>9.3f}")
+    print(json.dumps(json.loads(client.get("/api/cache/stats", {})[2]), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Data source benchmark: single-flight coalescing and event-loop blocking.
+
+Loads synthetic events into a SQLiteDataSource, then opens N "dashboards"
+at once, each asking for the first page of one sentiment (--query page) or
+for the sentiment counts, a GROUP BY over every row (--query counts):
+
+- blocking: the query runs inline in the coroutine, as a plain
+  client.query(...).result() call inside an async handler would
+- executor: queries run on the bounded thread pool, without coalescing
+- executor + single-flight: the production path (events_page / sentiment_counts)
+
+A ticker coroutine runs alongside and records the longest gap between its
+ticks; that is how long any other request would have waited for the loop.
+
+    python benchmarks/data_source_benchmark.py --events 200000 --dashboards 50 --query counts
+"""
+
+import argparse
+import asyncio
+import time
+
+from ingest_benchmark import make_events
+
+from data_sources import SQLiteDataSource  # noqa: E402  (path set up by ingest_benchmark)
+from bitmap_index import LabelQuery  # noqa: E402
+
+TICK_SECONDS = 0.001
+
+
+async def ticker(stop: asyncio.Event, gaps: list):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(TICK_SECONDS)
+        now = time.perf_counter()
+        gaps.append(now - last - TICK_SECONDS)
+        last = now
+
+
+async def measure(name, dashboards, open_dashboard):
+    stop, gaps = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, gaps))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await asyncio.gather(*(open_dashboard() for _ in range(dashboards)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    print(f"{name:<28} {elapsed * 1000:>9.1f}ms {max(gaps) * 1000:>12.1f}ms")
+
+
+async def main_async(args):
+    source = SQLiteDataSource(f"file:bench-{time.time()}?mode=memory&cache=shared")
+    source.insert_many_sync(make_events(args.events))
+    labels = LabelQuery()
+
+    if args.query == "counts":
+        query, query_args, production = source._sentiment_counts, (), source.sentiment_counts
+        description = "loading sentiment counts"
+    else:
+        query, query_args = source._events_page, (args.sentiment, args.limit + 1, None, labels)
+        production = lambda: source.events_page(args.sentiment, args.limit)  # noqa: E731
+        description = f"opening '{args.sentiment}'"
+
+    async def blocking():
+        query(*query_args)
+
+    async def executor():
+        await source._run(query, *query_args)
+
+    print(f"{args.events:,} events, {args.dashboards} concurrent dashboards {description}")
+    print(f"{'':<28} {'wall time':>11} {'max loop stall':>14}")
+    await measure("blocking (inline query)", args.dashboards, blocking)
+    await measure("executor", args.dashboards, executor)
+    before = source.stats()["queries"]
+    await measure("executor + single-flight", args.dashboards, production)
+    stats = source.stats()
+    print(f"single-flight: {stats['queries'] - before} query for {args.dashboards} requests "
+          f"({stats['coalesced']} coalesced)")
+    await source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--dashboards", type=int, default=50)
+    parser.add_argument("--sentiment", default="dissatisfied")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--query", choices=("page", "counts"), default="page")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Streaming frustrated-user detector benchmark.
+
+Feeds synthetic events (benchmarks/synthetic_events.py) straight into a
+FrustrationDetector (backend/frustration.py) as fast as it takes them, with
+a share of events delivered late (out of order), and reports:
+
+- ingest cost per event and events per second
+- at checkpoints, the at-risk list against the batch query evaluated by
+  brute force over every event seen so far, using the detector's window
+- memory held: users tracked and buckets, against users ever frustrated
+- at_risk() latency
+
+    python benchmarks/frustration_benchmark.py --events 1000000 --days 60
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from synthetic_events import generate_events
+
+from frustration import FRUSTRATED, FrustrationDetector, _hour  # noqa: E402
+
+
+def brute_force(events, detector):
+    """The batch query over `events`, for the detector's current window"""
+    cutoff = _hour(detector.watermark) - detector.window_hours + 1
+    counts = {}
+    for event in events:
+        if FRUSTRATED in event["user_sentiment"] and _hour(event["event_timestamp"]) >= cutoff:
+            counts[event["user_id"]] = counts.get(event["user_id"], 0) + 1
+    return {user_id: count for user_id, count in counts.items() if count >= detector.threshold}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--late", type=float, default=0.02, help="Share of events delivered late")
+    parser.add_argument("--max-delay", type=int, default=500, help="Most events a late one is delayed by")
+    parser.add_argument("--checkpoints", type=int, default=4)
+    args = parser.parse_args()
+
+    events = []
+    delayed = []
+    rng = random.Random(15)
+    for event in generate_events(args.events, days=args.days):
+        # Only what the detector reads, so the event list fits in memory at 1M+
+        event = {field: event[field] for field in
+                 ("event_timestamp", "request_id", "user_id", "user_intent", "user_sentiment")}
+        if rng.random() < args.late:
+            delayed.append((len(events) + rng.randrange(1, args.max_delay), event))
+        else:
+            events.append(event)
+        while delayed and delayed[0][0] <= len(events):
+            events.append(delayed.pop(0)[1])
+    events.extend(event for _, event in delayed)
+
+    detector = FrustrationDetector()
+    every = max(1, len(events) // args.checkpoints)
+    elapsed = 0.0
+    ever_frustrated = set()
+    print(f"{len(events):,} events over {args.days} days, {args.late:.0%} late, window {detector.window_hours}h")
+    for start in range(0, len(events), every):
+        chunk = events[start:start + every]
+        began = time.perf_counter()
+        for doc, event in enumerate(chunk, start):
+            detector.add(doc, event)
+        elapsed += time.perf_counter() - began
+        ever_frustrated.update(event["user_id"] for event in chunk if FRUSTRATED in event["user_sentiment"])
+
+        expected = brute_force(events[:start + len(chunk)], detector)
+        found = {user["user_id"]: user["frustrated_events"] for user in detector.at_risk(limit=len(expected) + 1)}
+        assert found == expected, f"at-risk users differ after {start + len(chunk):,} events"
+        stats = detector.stats()
+        print(f"  {start + len(chunk):>10,} events  as of {detector.watermark}  "
+              f"at-risk {len(found):>6,}  tracked {stats['tracked_users']:>6,} / {len(ever_frustrated):,} ever  "
+              f"expired buckets {stats['expired_buckets']:,}  matches batch query")
+
+    print(f"ingest: {elapsed / len(events) * 1e6:.2f} µs/event, {len(events) / elapsed:,.0f} events/s")
+    print(f"stats: {detector.stats()}")
+    for limit in (10, 100, 1000):
+        timings = []
+        for _ in range(50):
+            began = time.perf_counter()
+            detector.at_risk(limit)
+            timings.append(time.perf_counter() - began)
+        print(f"at_risk(limit={limit}): median {statistics.median(timings) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
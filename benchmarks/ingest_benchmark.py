@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Bulk ingest benchmark.
+
+Measures the ingest pipeline stage by stage (validation, then insertion
+into an event store with every index the server attaches), then end to end
+against a running backend, including read latency on /api/hitl-events
+while batches are being ingested.
+
+    python benchmarks/ingest_benchmark.py --events 100000
+    python benchmarks/ingest_benchmark.py --events 100000 --url http://localhost:8001
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from bitmap_index import LabelIndex  # noqa: E402
+from event_store import TIMESTAMP_FORMAT, BackgroundIndex, EventStore  # noqa: E402
+from ingest import SentimentCounts, parse_json_batch, parse_ndjson_batch  # noqa: E402
+from projection import PreviewIndex  # noqa: E402
+from rollups import RollupIndex  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+from server import EVENT_STORE as SAMPLE_STORE, SENTIMENT_CATEGORIES  # noqa: E402
+
+
+def make_events(count, start=datetime(2026, 2, 1)):
+    """`count` copies of the mock events with fresh request_ids and increasing timestamps"""
+    templates = [SAMPLE_STORE.doc(doc) for doc in range(len(SAMPLE_STORE))]
+    events = []
+    for i in range(count):
+        event = dict(templates[i % len(templates)])
+        event["request_id"] = str(uuid.uuid4())
+        event["event_timestamp"] = (start + timedelta(milliseconds=37 * i)).strftime(TIMESTAMP_FORMAT)
+        events.append(event)
+    return events
+
+
+def batches(events, size):
+    for i in range(0, len(events), size):
+        yield events[i:i + size]
+
+
+def server_store(background_search=False):
+    """A store with the same indexes as server.py, plus the search BackgroundIndex (None when inline)"""
+    store = EventStore()
+    store.attach(LabelIndex())
+    search = SearchIndex(store.doc)
+    indexer = BackgroundIndex(search) if background_search else None
+    store.attach(indexer or search)
+    store.attach(PreviewIndex())
+    store.attach(RollupIndex())
+    store.attach(SentimentCounts(SENTIMENT_CATEGORIES), replay=False)
+    return store, indexer
+
+
+def rate(count, seconds):
+    return f"{count / seconds:>10,.0f} events/s  ({seconds * 1000:,.0f}ms)"
+
+
+def bench_pipeline(events, batch_size):
+    json_bodies = [json.dumps(batch).encode() for batch in batches(events, batch_size)]
+    ndjson_bodies = [
+        "\n".join(json.dumps(event) for event in batch).encode() for batch in batches(events, batch_size)
+    ]
+
+    started = time.perf_counter()
+    parsed = [parse_json_batch(body) for body in json_bodies]
+    print(f"validate JSON array            {rate(len(events), time.perf_counter() - started)}")
+
+    started = time.perf_counter()
+    for body in ndjson_bodies:
+        parse_ndjson_batch(body)
+    print(f"validate NDJSON                {rate(len(events), time.perf_counter() - started)}")
+
+    stores = (
+        ("store only", EventStore(), None),
+        ("all indexes, inline", *server_store()),
+        # As in server.py: search indexing on a worker thread
+        ("all indexes, bg search", *server_store(background_search=True)),
+    )
+    for name, store, indexer in stores:
+        started = time.perf_counter()
+        for batch in parsed:
+            store.add_many([dict(event) for event in batch])
+        print(f"insert, {name:<22} {rate(len(events), time.perf_counter() - started)}")
+        if indexer is not None:
+            indexer.wait()
+            print(f"  search caught up after {rate(len(events), time.perf_counter() - started)}")
+
+
+def read_latencies(url, stop, samples):
+    import requests
+
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        session.get(f"{url}/api/hitl-events", params={"limit": 20}, timeout=30)
+        samples.append((time.perf_counter() - started) * 1000)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench_http(url, events, batch_size):
+    import requests
+
+    def measure_reads(seconds):
+        stop, samples = threading.Event(), []
+        reader = threading.Thread(target=read_latencies, args=(url, stop, samples))
+        reader.start()
+        time.sleep(seconds)
+        stop.set()
+        reader.join()
+        return samples
+
+    idle = measure_reads(2.0)
+
+    stop, during = threading.Event(), []
+    reader = threading.Thread(target=read_latencies, args=(url, stop, during))
+    reader.start()
+    session = requests.Session()
+    bodies = ["\n".join(json.dumps(event) for event in batch).encode() for batch in batches(events, batch_size)]
+    started = time.perf_counter()
+    inserted = 0
+    for body in bodies:
+        response = session.post(
+            f"{url}/api/ingest/hitl-events", data=body, headers={"Content-Type": "application/x-ndjson"}, timeout=300
+        )
+        response.raise_for_status()
+        inserted += response.json()["inserted"]
+    elapsed = time.perf_counter() - started
+    stop.set()
+    reader.join()
+
+    print(f"HTTP ingest (NDJSON)           {rate(inserted, elapsed)}  search_pending={response.json()['search_pending']}")
+    for name, samples in (("idle", idle), ("during ingest", during)):
+        print(
+            f"GET /api/hitl-events {name:<14} n={len(samples):<5} p50={statistics.median(samples):.1f}ms "
+            f"p99={percentile(samples, 0.99):.1f}ms max={max(samples):.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--url", help="Also benchmark a running backend at this URL")
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    print(f"{args.events:,} events, batches of {args.batch_size:,}")
+    bench_pipeline(events, args.batch_size)
+    if args.url:
+        bench_http(args.url.rstrip("/"), events, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
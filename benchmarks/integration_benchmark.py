@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Integration demand benchmark: counts from the index vs parsing per request.
+
+Takes synthetic events (benchmarks/synthetic_events.py) and rewrites their
+work_subcategory into the production format, "category: item1, item2 |
+category2: item3": integration names in varied case, spacing and
+punctuation, with aliases, a second integration or a second category on
+some events, and a few names outside the standardised list. Then:
+
+- ingest: IntegrationIndex.add per event, and the share of it spent parsing
+  (memoised per distinct string)
+- for 1-, 7- and 30-day windows ending at the latest event, the demand
+  report (mentions, requests and distinct users per integration) from the
+  index and daily sketches, and from a scan that parses every event's
+  work_subcategory in the window, as the knowledge base query does. Counts
+  must agree exactly; distinct users within the sketches' error
+
+    python benchmarks/integration_benchmark.py --events 170441
+"""
+
+import argparse
+import random
+import time
+
+from synthetic_events import generate_events
+
+from integrations import (  # noqa: E402
+    INTEGRATION_ALIASES, INTEGRATION_GROUP, REQUEST_INTENT, IntegrationIndex, event_integrations, parse_subcategory
+)
+from unique_users import UniqueUserIndex  # noqa: E402
+
+WINDOWS = (1, 7, 30)
+UNLISTED = ("Zapier", "Notion API", "Airtable", "Mailchimp", "Shopify")
+
+
+def spelling(rng, name):
+    """A production-like spelling of a standardised name"""
+    aliases = [alias for alias, target in INTEGRATION_ALIASES.items() if target == name]
+    if aliases and rng.random() < 0.3:
+        name = rng.choice(aliases)
+    edit = rng.random()
+    if edit < 0.2:
+        name = name.lower()
+    elif edit < 0.3:
+        name = name.upper()
+    elif edit < 0.4:
+        name = name.replace("-", " ")
+    return f" {name} " if rng.random() < 0.2 else name
+
+
+def production_format(events, seed=24):
+    rng = random.Random(seed)
+    names = list(INTEGRATION_GROUP)
+    for event in events:
+        category, item = event["work_category"][0], event["work_subcategory"][0]
+        if category == "integration":
+            items = [spelling(rng, item)]
+            if rng.random() < 0.2:
+                items.append(spelling(rng, rng.choice(names)))
+            if rng.random() < 0.05:
+                items.append(rng.choice(UNLISTED))
+            value = f"integration: {', '.join(items)}"
+            if rng.random() < 0.1:
+                value += " | functionality: api"
+                event["work_category"] = ["integration", "functionality"]
+        else:
+            value = f"{category}: {item}"
+        event["work_subcategory"] = [value]
+
+
+def scan(events, days):
+    """The report by parsing every event in `days`, without the memo"""
+    parse = parse_subcategory.__wrapped__
+    mentions, requests, users = {}, {}, {}
+    for event in events:
+        if event["event_timestamp"][:10] not in days:
+            continue
+        named = set()
+        for value in event["work_subcategory"]:
+            for _, item in parse(value):
+                if item in INTEGRATION_GROUP:
+                    named.add(item)
+        for name in named:
+            mentions[name] = mentions.get(name, 0) + 1
+            if REQUEST_INTENT in event["user_intent"]:
+                requests[name] = requests.get(name, 0) + 1
+            users.setdefault(name, set()).add(event["user_id"])
+    return mentions, requests, {name: len(ids) for name, ids in users.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=170_441)
+    args = parser.parse_args()
+
+    events = list(generate_events(args.events))
+    production_format(events)
+    distinct = len({value for event in events for value in event["work_subcategory"]})
+
+    index = IntegrationIndex()
+    began = time.perf_counter()
+    for doc, event in enumerate(events):
+        index.add(doc, event)
+    ingest = time.perf_counter() - began
+    began = time.perf_counter()
+    for event in events:
+        event_integrations(event)
+    parsing = time.perf_counter() - began
+    sketches = UniqueUserIndex()
+    for doc, event in enumerate(events):
+        sketches.add(doc, event)
+    print(f"{len(events):,} events, {distinct:,} distinct work_subcategory strings; "
+          f"ingest {ingest / len(events) * 1e6:.1f}µs/event, of which parsing (memoised) "
+          f"{parsing / len(events) * 1e6:.1f}µs")
+
+    all_days = sorted({event["event_timestamp"][:10] for event in events})
+    print(f"{'days':>4} {'integrations':>12} {'mentions':>9} {'index ms':>9} {'scan ms':>9} {'speedup':>8} "
+          f"{'users rms err':>14}")
+    for window in WINDOWS:
+        days = all_days[-window:]
+        began = time.perf_counter()
+        mentions, requests = index.mentions(days), index.requests(days)
+        users = sketches.count("integration", days)
+        index_ms = (time.perf_counter() - began) * 1000
+        began = time.perf_counter()
+        exact_mentions, exact_requests, exact_users = scan(events, set(days))
+        scan_ms = (time.perf_counter() - began) * 1000
+        assert (mentions, requests) == (exact_mentions, exact_requests), window
+        errors = [(users[name] - count) / count for name, count in exact_users.items()]
+        rms = (sum(error * error for error in errors) / len(errors)) ** 0.5
+        print(f"{window:>4} {len(mentions):>12} {sum(mentions.values()):>9,} {index_ms:>9.2f} {scan_ms:>9.1f} "
+              f"{scan_ms / index_ms:>7.0f}x {rms:>14.2%}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Live feed fan-out benchmark.
+
+Starts one uvicorn worker (or uses --url), connects hundreds of SSE
+subscribers to /api/live/hitl-events, then ingests synthetic events in
+batches while the subscribers read. Half the subscribers filter on
+sentiment=frustrated, the rest take every event, all with the UI's
+preview_chars. A share of them are slow: they take full events and stop
+reading until ingest is over, with a small receive buffer, so their
+server-side queues overflow.
+
+Reports:
+- delivery latency (POST sent -> event read) over the fast subscribers
+- delivered events per fast subscriber, which should be all of them
+- for slow subscribers, events delivered plus events reported dropped,
+  which should add up to the events they subscribed to
+- /api/hitl-events latency while the feed is fanning out
+- the server's /api/live/stats
+
+Subscribers are plain asyncio sockets in this process, so on a small
+machine the client side competes with the server for CPU.
+
+    python benchmarks/live_feed_benchmark.py --subscribers 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+import requests
+
+from synthetic_events import generate_events
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+PREVIEW_CHARS = 320
+
+
+class Subscriber:
+    def __init__(self, url: str, params: dict, slow: bool):
+        self.url = urlsplit(url)
+        self.params = params
+        self.slow = slow
+        self.received = {}  # request_id -> time read
+        self.dropped = 0
+        self.connected = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def run(self, stop: asyncio.Event):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.slow:
+            # A small receive window, so the backlog builds up in the server's queue
+            # rather than in socket buffers
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, (self.url.hostname, self.url.port))
+        reader, writer = await asyncio.open_connection(sock=sock)
+        path = f"/api/live/hitl-events?{urlencode(self.params, doseq=True)}"
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.url.netloc}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        status = await reader.readline()
+        assert b" 200 " in status, status
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        buffer = b""
+        while True:
+            if self.slow and not self.resume.is_set():
+                self.connected.set()
+                await self.resume.wait()
+            try:
+                size = int(await asyncio.wait_for(reader.readline(), 0.5), 16)
+            except asyncio.TimeoutError:
+                # Done once stopped and nothing has arrived for a while
+                if stop.is_set():
+                    break
+                continue
+            buffer += await reader.readexactly(size + 2)
+            messages = buffer[:-2].split(b"\n\n")
+            buffer = messages.pop()
+            now = time.perf_counter()
+            for message in messages:
+                self._message(message, now)
+        writer.close()
+
+    def _message(self, message: bytes, now: float):
+        if message.startswith(b"retry:"):
+            self.connected.set()
+        elif message.startswith(b"event: dropped"):
+            self.dropped += json.loads(message.split(b"data: ", 1)[1])["dropped"]
+        elif message.startswith(b"data: "):
+            # request_id is the second field of every event; slicing it out is much
+            # cheaper than decoding, which matters with every subscriber in one process
+            start = message.index(b'"request_id":"') + 14
+            self.received[message[start:message.index(b'"', start)].decode()] = now
+
+
+def start_server(port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND,
+    )
+    for _ in range(100):
+        try:
+            requests.get(f"http://localhost:{port}/api/health", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def ingest(url, batches, interval, sent, probes):
+    """POST each batch, recording when it was sent, and time a page read between batches"""
+    for batch in batches:
+        began = time.perf_counter()
+        for event in batch:
+            sent[event["request_id"]] = began
+        response = requests.post(f"{url}/api/ingest/hitl-events", json=batch, timeout=60)
+        response.raise_for_status()
+        probe = time.perf_counter()
+        requests.get(f"{url}/api/hitl-events", params={"limit": 20, "preview_chars": PREVIEW_CHARS}, timeout=60)
+        probes.append(time.perf_counter() - probe)
+        time.sleep(max(0.0, interval - (time.perf_counter() - began)))
+
+
+async def run(args, url):
+    events = list(generate_events(args.batches * args.batch_size, days=1))
+    batches = [events[i:i + args.batch_size] for i in range(0, len(events), args.batch_size)]
+    frustrated = {event["request_id"] for event in events if "frustrated" in event["user_sentiment"]}
+
+    subscribers = []
+    for i in range(args.subscribers):
+        slow = i < args.subscribers * args.slow
+        # Slow subscribers take full events, so their backlog outgrows the socket buffers
+        params = {} if slow else {"preview_chars": PREVIEW_CHARS}
+        if i % 2:
+            params["sentiment"] = "frustrated"
+        subscribers.append(Subscriber(url, params, slow))
+    stop = asyncio.Event()
+    began = time.perf_counter()
+    tasks = [asyncio.create_task(subscriber.run(stop)) for subscriber in subscribers]
+    await asyncio.gather(*(subscriber.connected.wait() for subscriber in subscribers))
+    print(f"{len(subscribers)} subscribers connected in {time.perf_counter() - began:.2f}s "
+          f"({sum(s.slow for s in subscribers)} slow)")
+
+    sent, probes = {}, []
+    began = time.perf_counter()
+    await asyncio.to_thread(ingest, url, batches, args.interval, sent, probes)
+    elapsed = time.perf_counter() - began
+    print(f"ingested {len(events):,} events in {len(batches)} batches over {elapsed:.1f}s "
+          f"({len(frustrated):,} frustrated)")
+
+    await asyncio.sleep(args.settle)
+    for subscriber in subscribers:
+        subscriber.resume.set()
+    await asyncio.sleep(args.settle)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    fast = [s for s in subscribers if not s.slow]
+    slow = [s for s in subscribers if s.slow]
+    latencies = sorted(at - sent[request_id] for s in fast for request_id, at in s.received.items())
+    expected = {id(s): len(frustrated) if "sentiment" in s.params else len(events) for s in subscribers}
+    complete = sum(len(s.received) == expected[id(s)] for s in fast)
+    print(f"fast subscribers: {complete}/{len(fast)} got every event, "
+          f"{sum(s.dropped for s in fast):,} events dropped")
+    if latencies:
+        q = statistics.quantiles(latencies, n=100)
+        print(f"delivery latency: p50 {q[49] * 1000:.1f}ms  p95 {q[94] * 1000:.1f}ms  p99 {q[98] * 1000:.1f}ms  "
+              f"max {latencies[-1] * 1000:.1f}ms")
+    if slow:
+        accounted = sum(len(s.received) + s.dropped == expected[id(s)] for s in slow)
+        print(f"slow subscribers: {accounted}/{len(slow)} delivered + dropped = subscribed; "
+              f"{sum(len(s.received) for s in slow):,} delivered, {sum(s.dropped for s in slow):,} dropped")
+    print(f"/api/hitl-events during fan-out: median {statistics.median(probes) * 1000:.1f}ms  "
+          f"max {max(probes) * 1000:.1f}ms")
+    print(f"server: {requests.get(f'{url}/api/live/stats', timeout=10).json()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="A running backend; by default one uvicorn worker is started")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--slow", type=float, default=0.1, help="Share of subscribers that stop reading")
+    parser.add_argument("--batches", type=int, default=60)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between batch starts")
+    parser.add_argument("--settle", type=float, default=3.0)
+    args = parser.parse_args()
+
+    server = None if args.url else start_server(args.port)
+    try:
+        asyncio.run(run(args, args.url or f"http://localhost:{args.port}"))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Event store memory benchmark.
+
+Builds the store from N synthetic events and reports the resident memory it
+keeps, for two layouts, each in its own process:
+
+- dicts: the previous layout. One dict per event (string timestamp, lists
+  of label strings) in a list, a request_id -> doc dict, and per-sentiment
+  sorted lists of (event_timestamp, request_id) tuples
+- columns: EventStore as it is now (see backend/event_columns.py)
+
+Events are decoded from JSON one batch at a time, as the ingest endpoint
+does, so every event owns its strings and lists. Message text is
+deduplicated by default: it costs the same in both layouts and would
+otherwise dominate the numbers (pass --unique-messages to keep it).
+
+    python benchmarks/memory_benchmark.py --events 1000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from ingest_benchmark import make_events
+
+from event_store import EventStore  # noqa: E402  (path set up by ingest_benchmark)
+
+BATCH_SIZE = 10_000
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def decoded_batches(count, unique_messages):
+    messages = {}
+    start = datetime(2026, 2, 1)
+    for first in range(0, count, BATCH_SIZE):
+        batch = make_events(min(BATCH_SIZE, count - first), start + timedelta(milliseconds=37 * first))
+        events = json.loads(json.dumps(batch))
+        if not unique_messages:
+            for event in events:
+                for field in ("user_curr_message", "agent_prev_message"):
+                    event[field] = messages.setdefault(event[field], event[field])
+        yield events
+
+
+def build_dicts(events_batches):
+    docs, doc_ids, keys = [], {}, {}
+    for events in events_batches:
+        for event in events:
+            doc_ids[event["request_id"]] = len(docs)
+            docs.append(event)
+            for sentiment in event["user_sentiment"]:
+                keys.setdefault(sentiment, []).append((event["event_timestamp"], event["request_id"]))
+    for sentiment_keys in keys.values():
+        sentiment_keys.sort()
+    return docs, doc_ids, keys
+
+
+def build_columns(events_batches):
+    store = EventStore()
+    for events in events_batches:
+        store.add_many(events)
+    return store
+
+
+def measure(layout, count, unique_messages):
+    # Generating the events is not part of either layout; do it (and let
+    # the allocator settle) before taking the baseline
+    source = list(decoded_batches(min(count, BATCH_SIZE), unique_messages))
+    del source
+    gc.collect()
+    baseline = rss_bytes()
+    started = time.perf_counter()
+    built = (build_dicts if layout == "dicts" else build_columns)(decoded_batches(count, unique_messages))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    used = rss_bytes() - baseline
+    print(f"{layout:<10} {used / 2**20:>10,.0f}MB {used / count:>12,.0f} {elapsed:>9.1f}s", flush=True)
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--unique-messages", action="store_true", help="Give every event its own message strings")
+    parser.add_argument("--layout", choices=("dicts", "columns"), help="Measure one layout in this process")
+    args = parser.parse_args()
+    if args.layout:
+        measure(args.layout, args.events, args.unique_messages)
+        return
+
+    print(f"{args.events:,} events, {'unique' if args.unique_messages else 'shared'} message text")
+    print(f"{'layout':<10} {'resident':>12} {'bytes/event':>12} {'build':>10}")
+    for layout in ("dicts", "columns"):
+        command = [sys.executable, __file__, "--layout", layout, "--events", str(args.events)]
+        if args.unique_messages:
+            command.append("--unique-messages")
+        subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    main()
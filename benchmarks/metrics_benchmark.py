@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Metrics overhead benchmark.
+
+Loads synthetic events into the backend in-process, then times requests
+with the metrics middleware off (ORACLE_METRICS=0), on, and on with the
+sampling profiler sampling every 5ms, each mode in its own process:
+
+- health: /api/health, the cheapest route, where the middleware's share
+  is largest
+- cached: dashboard requests answered from the response cache
+- uncached: the same requests with a unique query parameter
+- scrape: rendering /api/metrics after the run
+
+Each figure is the median of --rounds requests, in ms. The machine's
+noise is usually larger than the middleware's cost on anything but
+health, so compare the health column first.
+
+    python benchmarks/metrics_benchmark.py --events 100000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from cache_benchmark import DASHBOARD_REQUESTS, ASGIClient, load_in_process, timed
+
+MODES = {
+    "off": {"ORACLE_METRICS": "0"},
+    "on": {"ORACLE_METRICS": "1"},
+    "on + profiler": {"ORACLE_METRICS": "1"},
+}
+
+
+def measure(mode, events, rounds):
+    import server
+
+    client = ASGIClient()
+    if events:
+        load_in_process(events)
+    if mode == "on + profiler":
+        server.PROFILER.start(interval_seconds=0.005)
+    health, _, _ = timed(client, "/api/health", lambda i: {}, rounds)
+    cached, uncached = [], []
+    for path, params in DASHBOARD_REQUESTS:
+        uncached.append(timed(client, path, lambda i: {**params, "nocache": f"{time.time()}-{i}"}, rounds // 4)[0])
+        cached.append(timed(client, path, lambda i: params, rounds)[0])
+    began = time.perf_counter()
+    status, _, body = client.get("/api/metrics", {})
+    scrape = (time.perf_counter() - began) * 1000
+    if mode == "off":
+        assert b"oracle_http_requests_total{" not in body
+    else:
+        assert b'route="/api/trends"' in body, body[:200]
+    server.PROFILER.stop()
+    print(f"{mode:<14} {health:>9.3f} {statistics.mean(cached):>9.3f} {statistics.mean(uncached):>9.3f} "
+          f"{scrape:>9.3f}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=400)
+    parser.add_argument("--mode", choices=list(MODES), help="Measure one mode in this process")
+    args = parser.parse_args()
+    if args.mode:
+        measure(args.mode, args.events, args.rounds)
+        return
+
+    print(f"{args.events:,} events; mean over the {len(DASHBOARD_REQUESTS)} dashboard requests of each median")
+    print(f"{'metrics':<14} {'health':>9} {'cached':>9} {'uncached':>9} {'scrape':>9}  (ms)")
+    for mode, env in MODES.items():
+        command = [sys.executable, __file__, "--mode", mode, "--events", str(args.events), "--rounds", str(args.rounds)]
+        subprocess.run(command, check=True, env={**os.environ, **env})
+
+
+if __name__ == "__main__":
+    main()
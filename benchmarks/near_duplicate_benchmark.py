@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate index benchmark.
+
+Takes synthetic events (benchmarks/synthetic_events.py) and replaces the
+user_curr_message of a share of them (--planted) with a variant of one of
+a few hundred complaints: words dropped, repeated or swapped, case and
+punctuation changed, a typo or two. Variants of one complaint are a
+planted cluster. Then, for each --sizes count of events:
+
+- build: NearDuplicateIndex.add per event (shingling, signature, bands)
+- cluster: clusters() over every event, and over req_same_bug_fix events
+- similar: time per similar() call, over 1,000 events
+
+Time per event should stay flat as the count grows. For the largest size
+it also reports:
+
+- memory: bytes per event the index holds (tracemalloc)
+- accuracy on --sample events, against exact Jaccard similarity of every
+  pair of their shingle sets (whose time, extrapolated, is the quadratic
+  alternative): the estimate's mean absolute error; recall, the share of
+  pairs at or above the threshold that clusters() puts together; and the
+  share of similar() results at or above threshold - 0.1
+- planted clusters: the share of each planted cluster's events in its
+  largest found cluster, and of found clusters' events from one complaint
+
+    python benchmarks/near_duplicate_benchmark.py --sizes 25000 50000 100000 170441
+"""
+
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from itertools import islice
+
+from synthetic_events import generate_events
+
+from near_duplicates import DEFAULT_THRESHOLD, NearDuplicateIndex, shingles  # noqa: E402
+
+COMPLAINT_WORDS = (
+    "still not working the login page payment checkout button fails again after your fix it shows a blank "
+    "screen error 500 when I click submit nothing happens same bug as before please fix this properly images "
+    "are not loading on mobile the api returns unauthorized deploy failed preview is broken cart total is wrong"
+).split()
+
+
+def complaint(rng):
+    return " ".join(rng.choices(COMPLAINT_WORDS, k=rng.randint(6, 18)))
+
+
+def variant(rng, text):
+    words = text.split()
+    for _ in range(rng.randint(0, 2)):
+        edit = rng.random()
+        i = rng.randrange(len(words))
+        if edit < 0.4 and len(words) > 4:
+            del words[i]
+        elif edit < 0.7:
+            words.insert(i, rng.choice(("still", "again", "please", "it", "now", "!!")))
+        elif len(words[i]) > 3:
+            j = rng.randrange(len(words[i]) - 1)
+            words[i] = words[i][:j] + words[i][j + 1] + words[i][j] + words[i][j + 2:]
+    text = " ".join(words)
+    if rng.random() < 0.3:
+        text = text.capitalize() + rng.choice((".", "!", "!!!", "?"))
+    return text
+
+
+def make_events(count, planted, seed=23):
+    """Events with planted near-duplicate messages; also returns each planted event's complaint number"""
+    rng = random.Random(seed)
+    complaints = [complaint(rng) for _ in range(max(1, count // 200))]
+    events, truth = [], {}
+    for doc, event in enumerate(islice(generate_events(count), count)):
+        if rng.random() < planted:
+            number = rng.randrange(len(complaints))
+            event["user_curr_message"] = variant(rng, complaints[number])
+            truth[doc] = number
+        events.append(event)
+    return events, truth
+
+
+def build(events):
+    index = NearDuplicateIndex()
+    began = time.perf_counter()
+    for doc, event in enumerate(events):
+        index.add(doc, event)
+    return index, time.perf_counter() - began
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - began
+
+
+def accuracy(index, events, sample, threshold):
+    docs = sample
+    sets = {doc: shingles(events[doc]["user_curr_message"]) for doc in docs}
+    docs = [doc for doc in docs if sets[doc]]
+    began = time.perf_counter()
+    pairs = {}
+    for i, a in enumerate(docs):
+        for b in docs[i + 1:]:
+            union = len(sets[a] | sets[b])
+            pairs[a, b] = len(sets[a] & sets[b]) / union
+    exact_seconds = time.perf_counter() - began
+    error = statistics.mean(abs(index.similarity(a, b) - j) for (a, b), j in pairs.items())
+    cluster_of = {}
+    for number, group in enumerate(index.clusters(docs, threshold)):
+        for doc in group:
+            cluster_of[doc] = number
+    similar = [(a, b) for (a, b), j in pairs.items() if j >= threshold]
+    together = sum(1 for a, b in similar if a in cluster_of and cluster_of.get(a) == cluster_of.get(b))
+    found = [(doc, match) for doc in docs[:500] for match, _ in index.similar(doc, threshold, 100) if match in sets]
+    precise = sum(1 for doc, match in found if pairs.get((min(doc, match), max(doc, match)), 1.0) >= threshold - 0.1)
+    return len(docs), exact_seconds, error, len(similar), together / max(1, len(similar)), precise / max(1, len(found))
+
+
+def planted_quality(groups, truth):
+    found_in = {}
+    for number, group in enumerate(groups):
+        for doc in group:
+            found_in[doc] = number
+    by_complaint = {}
+    for doc, number in truth.items():
+        by_complaint.setdefault(number, []).append(doc)
+    recall = []
+    for docs in by_complaint.values():
+        if len(docs) > 1:
+            counts = {}
+            for doc in docs:
+                if doc in found_in:
+                    counts[found_in[doc]] = counts.get(found_in[doc], 0) + 1
+            recall.append(max(counts.values(), default=0) / len(docs))
+    purity = []
+    for group in groups:
+        planted = [truth[doc] for doc in group if doc in truth]
+        if planted:
+            purity.append(max(planted.count(number) for number in set(planted)) / len(group))
+    return statistics.mean(recall), statistics.mean(purity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25_000, 50_000, 100_000])
+    parser.add_argument("--planted", type=float, default=0.1, help="Share of events given a planted complaint")
+    parser.add_argument("--sample", type=int, default=2000, help="Events compared exactly, pair by pair")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    events, truth = make_events(max(args.sizes), args.planted)
+    print(f"{max(args.sizes):,} events, {len(truth):,} planted; threshold {args.threshold}")
+    print(f"{'events':>8} {'build':>9} {'per event':>10} {'cluster all':>12} {'per event':>10} "
+          f"{'bug fixes':>10} {'similar':>9}")
+    for size in sorted(args.sizes):
+        subset = events[:size]
+        index, build_seconds = build(subset)
+        groups, cluster_seconds = timed(index.clusters, range(size), args.threshold)
+        bug_fixes = [doc for doc, event in enumerate(subset) if "req_same_bug_fix" in event["user_intent"]]
+        _, bug_fix_seconds = timed(index.clusters, bug_fixes, args.threshold)
+        probes = random.Random(1).sample(range(size), 1000)
+        _, similar_seconds = timed(lambda: [index.similar(doc, args.threshold) for doc in probes])
+        print(f"{size:>8,} {build_seconds:>8.1f}s {build_seconds / size * 1e6:>8.0f}us {cluster_seconds:>11.2f}s "
+              f"{cluster_seconds / size * 1e6:>8.1f}us {bug_fix_seconds * 1000:>8.0f}ms {similar_seconds:>8.2f}ms",
+              flush=True)
+
+    size = max(args.sizes)
+    recall, purity = planted_quality(groups, {doc: number for doc, number in truth.items() if doc < size})
+    print(f"planted clusters: {recall:.1%} of a complaint's events in one found cluster; "
+          f"found clusters {purity:.1%} one complaint; {len(groups):,} clusters of 2+")
+
+    sample = random.Random(2).sample(range(size), args.sample)
+    count, exact_seconds, error, similar_pairs, recall, precision = accuracy(index, subset, sample, args.threshold)
+    extrapolated = exact_seconds * (size / count) ** 2
+    print(f"exact pairwise over {count:,} events: {exact_seconds:.1f}s (about {extrapolated / 3600:.1f}h for {size:,}); "
+          f"estimate error {error:.3f}; {similar_pairs:,} pairs >= {args.threshold}, {recall:.1%} clustered together; "
+          f"similar() results {precision:.1%} >= {args.threshold - 0.1:.1f}")
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    index, _ = build(subset)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"index memory: {held / 2**20:.1f}MB, {held / size:.0f} bytes per event "
+          f"({index.stats()['distinct_messages']:,} distinct messages)")
+
+
+if __name__ == "__main__":
+    main()
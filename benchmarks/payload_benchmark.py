@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Payload benchmark: field projection and message previews.
+
+Loads synthetic events into the backend in-process, then requests the same
+100-event page as full events, with fields= (no message bodies), with the
+UI's preview_chars (cut points precomputed at ingest) and with another
+preview size (cut on request). Responses bypass the response cache, so
+each one is routed, shaped and JSON-encoded.
+
+    python benchmarks/payload_benchmark.py --events 100000
+    python benchmarks/payload_benchmark.py --events 100000 --message-scale 8
+"""
+
+import argparse
+import time
+
+from cache_benchmark import ASGIClient, timed
+from ingest_benchmark import batches, make_events
+
+from projection import PREVIEW_CHARS  # noqa: E402  (path set up by ingest_benchmark)
+
+SHAPES = [
+    ("full events", {}),
+    ("fields=user_intent,user_sentiment", {"fields": "user_intent,user_sentiment"}),
+    (f"preview_chars={PREVIEW_CHARS} (precomputed)", {"preview_chars": PREVIEW_CHARS}),
+    ("preview_chars=200 (on request)", {"preview_chars": 200}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--message-scale", type=int, default=4,
+                        help="Repeat each mock agent message this many times (real responses run to several KB)")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    client = ASGIClient()
+    import server
+
+    for batch in batches(make_events(args.events), 5000):
+        for event in batch:
+            event["agent_prev_message"] = "\n\n".join([event["agent_prev_message"]] * args.message_scale)
+        server.EVENT_STORE.add_many(batch)
+    server.SEARCH_INDEXER.wait()
+    server.NEAR_DUPLICATE_INDEXER.wait()
+
+    print(f"{args.events:,} events, pages of {args.limit} from /api/hitl-events")
+    print(f"{'':<42} {'bytes':>10} {'median ms':>10}")
+    full_bytes = None
+    for label, params in SHAPES:
+        params = {"limit": args.limit, **params}
+        status, _, body = client.get("/api/hitl-events", params)
+        assert status == 200, status
+        full_bytes = full_bytes or len(body)
+        median, _, _ = timed(client, "/api/hitl-events", lambda i: {**params, "nocache": f"{time.time()}-{i}"},
+                             args.rounds)
+        print(f"{label:<42} {len(body):>10,} {median:>10.3f}  ({len(body) / full_bytes:.0%} of full)")
+
+
+if __name__ == "__main__":
+    main()
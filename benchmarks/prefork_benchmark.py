@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Prefork benchmark: memory per worker and throughput by worker count.
+
+Writes --events synthetic events (benchmarks/synthetic_events.py) to an
+NDJSON file, then for each --workers count starts backend/prefork.py with
+the file preloaded and:
+
+- drives it for --seconds with --clients client processes, each sending
+  the dashboard's requests (benchmarks/cache_benchmark.py) with a unique
+  query parameter, so every one is computed rather than served from a
+  worker's response cache, and reports requests per second
+- reads /proc/<pid>/smaps_rollup of the parent and of every worker after
+  the run: Rss (resident, shared pages included), Pss (shared pages split
+  between the processes mapping them) and private pages, which is what
+  each worker costs on top of the shared dataset
+
+The clients run on the same machine and share its cores with the
+workers, so requests per second are only comparable between runs on the
+same machine.
+
+    python benchmarks/prefork_benchmark.py --events 170441 --workers 1 2 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from cache_benchmark import DASHBOARD_REQUESTS
+from synthetic_events import generate_events
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def memory(pid):
+    """Rss, Pss and private kB of a process"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields["Rss"], fields["Pss"], fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+def workers_of(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def start(workers, port, path):
+    server = subprocess.Popen(
+        [sys.executable, "prefork.py", "--workers", str(workers), "--port", str(port), "--preload", path,
+         "--log-level", "warning"],
+        cwd=BACKEND,
+    )
+    for _ in range(3000):
+        try:
+            requests.get(f"http://localhost:{port}/api/health", timeout=1)
+            if len(workers_of(server.pid)) == workers:
+                return server
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def client(url, seconds, counts, index):
+    session = requests.Session()
+    deadline = time.perf_counter() + seconds
+    sent = 0
+    while time.perf_counter() < deadline:
+        path, params = DASHBOARD_REQUESTS[sent % len(DASHBOARD_REQUESTS)]
+        session.get(url + path, params={**params, "nocache": f"{index}-{sent}"}, timeout=60).raise_for_status()
+        sent += 1
+    counts[index] = sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=170_441)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8011)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "events.ndjson")
+        with open(path, "w") as f:
+            for event in generate_events(args.events):
+                f.write(json.dumps(event) + "\n")
+        print(f"{args.events:,} events; {args.clients} clients for {args.seconds:.0f}s ({os.cpu_count()} cores)")
+        print(f"{'workers':>7} {'req/s':>8} {'parent Rss':>11} {'worker Rss':>11} {'worker Pss':>11} "
+              f"{'private':>9} {'total Pss':>10}  (MB, worker figures averaged)")
+        for workers in args.workers:
+            server = start(workers, args.port, path)
+            try:
+                url = f"http://localhost:{args.port}"
+                counts = multiprocessing.Array("i", args.clients)
+                clients = [multiprocessing.Process(target=client, args=(url, args.seconds, counts, index))
+                           for index in range(args.clients)]
+                began = time.perf_counter()
+                for process in clients:
+                    process.start()
+                for process in clients:
+                    process.join()
+                rate = sum(counts) / (time.perf_counter() - began)
+                parent = memory(server.pid)
+                children = [memory(pid) for pid in workers_of(server.pid)]
+                assert len(children) == workers, children
+                rss, pss, private = (sum(column) / workers / 1024 for column in zip(*children))
+                total = (parent[1] + sum(child[1] for child in children)) / 1024
+                print(f"{workers:>7} {rate:>8.1f} {parent[0] / 1024:>11.0f} {rss:>11.0f} {pss:>11.0f} "
+                      f"{private:>9.0f} {total:>10.0f}", flush=True)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Quantile sketch benchmark.
+
+Adds synthetic events (benchmarks/synthetic_events.py) to a QuantileIndex
+(backend/quantiles.py), then for every metric and grouping answers a 30-day
+per-group p50/p90/p99 twice:
+
+- sketches: merge the 30 daily sketches of each group
+- exact: collect every value of each group in the window and sort
+
+and reports both times and the largest relative error of the sketch
+quantiles against the exact ones (the bound is RELATIVE_ACCURACY). Counts
+and means must match exactly.
+
+    python benchmarks/quantile_benchmark.py --events 170441
+"""
+
+import argparse
+import math
+import time
+
+from synthetic_events import generate_events
+
+from quantiles import QUANTILE_GROUPINGS, QUANTILE_METRICS, RELATIVE_ACCURACY, QuantileIndex, _groups  # noqa: E402
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def exact(events, metric, grouping, days):
+    """Per-group sorted values, by a scan of every event in `days`"""
+    values = {}
+    for event in events:
+        if event["event_timestamp"][:10] not in days:
+            continue
+        value = event.get(metric)
+        if value is None:
+            continue
+        for event_grouping, group in _groups(event):
+            if event_grouping == grouping:
+                values.setdefault(group, []).append(value)
+    for group_values in values.values():
+        group_values.sort()
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=170_441)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    events = list(generate_events(args.events))
+    index = QuantileIndex()
+    began = time.perf_counter()
+    for doc, event in enumerate(events):
+        index.add(doc, event)
+    elapsed = time.perf_counter() - began
+    days = sorted({event["event_timestamp"][:10] for event in events})[-args.days:]
+    print(f"{len(events):,} events: {elapsed / len(events) * 1e6:.1f} µs/event to index; "
+          f"{args.days}-day window {days[0]} .. {days[-1]}")
+    print(f"{'metric':<24} {'group_by':<14} {'groups':>6} {'sketch ms':>10} {'exact ms':>10} {'max rel err':>12}")
+
+    window = set(days)
+    for metric in QUANTILE_METRICS:
+        for grouping in QUANTILE_GROUPINGS:
+            began = time.perf_counter()
+            rows = index.stats(metric, grouping, days, QUANTILES)
+            sketch_ms = (time.perf_counter() - began) * 1000
+
+            began = time.perf_counter()
+            values = exact(events, metric, grouping, window)
+            exact_answers = {
+                group: [group_values[int(q * (len(group_values) - 1))] for q in QUANTILES]
+                for group, group_values in values.items()
+            }
+            exact_ms = (time.perf_counter() - began) * 1000
+
+            worst = 0.0
+            for row in rows:
+                group_values = values[row["group"]]
+                assert row["count"] == len(group_values), (metric, grouping, row["group"])
+                assert math.isclose(row["mean"], sum(group_values) / len(group_values), rel_tol=1e-9)
+                for estimate, answer in zip(row["quantiles"].values(), exact_answers[row["group"]]):
+                    error = abs(estimate - answer) / abs(answer) if answer else abs(estimate)
+                    worst = max(worst, error)
+            assert worst <= RELATIVE_ACCURACY, (metric, grouping, worst)
+            print(f"{metric:<24} {grouping:<14} {len(rows):>6} {sketch_ms:>10.2f} {exact_ms:>10.1f} {worst:>12.4%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Segment storage benchmark.
+
+Writes synthetic events (benchmarks/synthetic_events.py) as day segments
+(backend/segments.py), then compares startup and reads with the in-memory
+EventStore built from the same events:
+
+- startup: mapping the segment directory vs decoding the events from NDJSON
+  into an EventStore with its label bitmaps, as a restart has to today;
+  with resident memory added by each
+- reads: first pages (all, a sentiment, a rare sentiment, a label filter),
+  a page 50 pages deep, one day's events (since=) and a get by request_id
+- sentiment counts for one day and for every day, from segment headers
+- ingest: live batches landing after the latest day's last row, each
+  written as a new run and merged into the day's earlier runs as
+  MERGE_RATIO allows; the time per batch and the day's runs afterwards
+
+Every segment read is checked against the store. The files were just
+written, so they are in the page cache: startup here excludes disk reads.
+
+    python benchmarks/segment_benchmark.py --events 170441
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from itertools import islice
+
+from synthetic_events import generate_events
+
+from bitmap_index import LabelIndex, LabelQuery  # noqa: E402
+from event_store import EventStore  # noqa: E402
+from segments import SegmentStore  # noqa: E402
+
+
+# Events per live ingest batch
+BATCH_EVENTS = 20
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def timed(fn, repeat=5):
+    """Best of `repeat` runs, in ms, and the last result"""
+    best = float("inf")
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - began)
+    return best * 1000, result
+
+
+def ids(events):
+    return [event["request_id"] for event in events]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=170_441)
+    parser.add_argument("--directory", help="Segment directory (default: a temporary one, removed afterwards)")
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp(prefix="segments-")
+    events = list(generate_events(args.events))
+    batch, events = events[-1000:], events[:-1000]
+    try:
+        began = time.perf_counter()
+        SegmentStore(directory).add_many(events)
+        elapsed = time.perf_counter() - began
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"wrote {len(events):,} events in {elapsed:.1f}s "
+              f"({elapsed / len(events) * 1e6:.0f} µs/event): {len(os.listdir(directory))} segments, {size / 1e6:.0f} MB")
+
+        ndjson = "\n".join(json.dumps(event) for event in events)
+        rss = rss_bytes()
+        began = time.perf_counter()
+        segments = SegmentStore(directory)
+        segment_ms = (time.perf_counter() - began) * 1000
+        segment_rss = rss_bytes() - rss
+
+        rss = rss_bytes()
+        began = time.perf_counter()
+        store = EventStore()
+        store.add_many([json.loads(line) for line in ndjson.split("\n")])
+        labels = LabelIndex()
+        store.attach(labels)
+        store_ms = (time.perf_counter() - began) * 1000
+        store_rss = rss_bytes() - rss
+        print(f"{'startup':<34} {'segments':>12} {'store':>12}")
+        print(f"{'  time':<34} {segment_ms:>10.1f}ms {store_ms:>10.0f}ms")
+        print(f"{'  resident memory added':<34} {segment_rss / 1e6:>10.1f}MB {store_rss / 1e6:>10.0f}MB")
+
+        last_day = segments.days[-1]
+        deep_events = list(islice(store.iter_events(), 50 * 20))
+        deep = (deep_events[-1]["event_timestamp"], deep_events[-1]["request_id"])
+        intent = LabelQuery({"user_intent": ["req_same_bug_fix"]}, {"work_category": ["design"]})
+        lookup = events[len(events) // 2]["request_id"]
+        cases = [
+            ("first page", lambda: segments.page(None, 20), lambda: store.page(None, 20)[0]),
+            ("first page, frustrated", lambda: segments.page("frustrated", 20),
+             lambda: store.page("frustrated", 20)[0]),
+            ("first page, excited", lambda: segments.page("excited", 20), lambda: store.page("excited", 20)[0]),
+            ("first page, intent and not category", lambda: segments.page(None, 20, labels=intent),
+             lambda: store.page(None, 20, matching=labels.match(intent))[0]),
+            ("page 50", lambda: segments.page(None, 20, before=deep), lambda: store.page(None, 20, before=deep)[0]),
+            ("latest day, excited (since=)", lambda: list(segments.iter_events("excited", since=last_day + " 00:00:00.000000 UTC")),
+             lambda: list(store.iter_events("excited", since=last_day + " 00:00:00.000000 UTC"))),
+            ("get by request_id", lambda: [segments.get(lookup)], lambda: [store.get(lookup)]),
+        ]
+        print(f"{'read':<34} {'segments':>12} {'store':>12}")
+        for name, segment_read, store_read in cases:
+            segment_time, segment_events = timed(segment_read)
+            store_time, store_events = timed(store_read)
+            assert segment_events == store_events, name
+            print(f"{'  ' + name:<34} {segment_time:>10.2f}ms {store_time:>10.2f}ms")
+
+        day_ms, day_counts = timed(lambda: segments.label_counts("user_sentiment", last_day))
+        all_ms, all_counts = timed(lambda: segments.label_counts("user_sentiment"))
+        assert sum(all_counts.values()) == sum(len(event["user_sentiment"]) for event in events)
+        print(f"{'  sentiment counts, latest day':<34} {day_ms:>10.2f}ms")
+        print(f"{'  sentiment counts, every day':<34} {all_ms:>10.2f}ms")
+
+        day = [event for event in batch if event["event_timestamp"][:10] == last_day]
+        latest = max((event["event_timestamp"] for event in events), default="")
+        day = sorted((event for event in day if event["event_timestamp"] > latest), key=lambda event: event["event_timestamp"])
+        times = []
+        for start in range(0, len(day), BATCH_EVENTS):
+            began = time.perf_counter()
+            segments.add_many(day[start:start + BATCH_EVENTS])
+            times.append((time.perf_counter() - began) * 1000)
+        runs = segments.runs(last_day)
+        assert ids(segments.page(None, len(day))) == ids(sorted(day, key=lambda event: event["event_timestamp"], reverse=True))
+        print(f"ingest {len(day)} events into {last_day} in {len(times)} batches of {BATCH_EVENTS}: "
+              f"median {sorted(times)[len(times) // 2]:.1f}ms, slowest {max(times):.0f}ms per batch; "
+              f"{len(runs)} runs after ({', '.join(f'{run.rows:,}' for run in runs)} rows)")
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
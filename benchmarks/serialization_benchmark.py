@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Serialisation and compression benchmark.
+
+Loads synthetic events (benchmarks/synthetic_events.py) whose agent messages
+are scaled up to several KB, then times the same 100-event page from
+/api/hitl-events through the default response path and the fast one
+(backend/fast_responses.py), in-process:
+
+- default: FastAPI's jsonable_encoder + json; gzip by Starlette's
+  GZipMiddleware (level 9, recompressed on every response)
+- fast: FastJSONResponse (orjson, no jsonable_encoder); gzip by
+  CompressionMiddleware (level 1), with compressed bodies memoised by ETag
+
+Uncached rows defeat the response cache with a unique query parameter;
+cached rows repeat the same request, so the body comes from the cache.
+
+    python benchmarks/serialization_benchmark.py --events 50000
+"""
+
+import argparse
+import time
+
+from starlette.middleware.gzip import GZipMiddleware
+
+from cache_benchmark import ASGIClient, timed
+from synthetic_events import generate_batches
+
+from fast_responses import COMPRESS_MIN_BYTES, CompressedCache, CompressionMiddleware, orjson  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--message-scale", type=int, default=4,
+                        help="Repeat each synthetic agent message this many times")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    client = ASGIClient()
+    import server
+
+    for batch in generate_batches(args.events):
+        for event in batch:
+            event["agent_prev_message"] = "\n\n".join([event["agent_prev_message"]] * args.message_scale)
+        server.EVENT_STORE.add_many(batch)
+    server.SEARCH_INDEXER.wait()
+    server.NEAR_DUPLICATE_INDEXER.wait()
+    server.RESPONSE_CACHE.invalidate()
+
+    app = server.app
+    setups = [
+        ("default", False, app),
+        ("fast", True, app),
+        ("default + GZipMiddleware", False, GZipMiddleware(app, minimum_size=COMPRESS_MIN_BYTES)),
+        ("fast + gzip, no memo", True, CompressionMiddleware(app, cache=CompressedCache(max_bytes=0))),
+        ("fast + gzip", True, CompressionMiddleware(app)),
+    ]
+    params = {"limit": args.limit}
+    gzip = {"Accept-Encoding": "gzip"}
+
+    print(f"{args.events:,} events, pages of {args.limit} from /api/hitl-events, "
+          f"JSON encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'':<28} {'bytes':>10} {'uncached ms':>12} {'cached ms':>10}")
+    for label, fast, wrapped in setups:
+        server.FAST_RESPONSES = fast
+        client.app = wrapped
+        headers = gzip if wrapped is not app else None
+        status, response_headers, body = client.get("/api/hitl-events", params, headers)
+        assert status == 200, status
+        uncached, _, _ = timed(client, "/api/hitl-events", lambda i: {**params, "nocache": f"{time.time()}-{i}"},
+                               args.rounds, headers)
+        cached, _, _ = timed(client, "/api/hitl-events", lambda i: params, args.rounds, headers)
+        print(f"{label:<28} {len(body):>10,} {uncached:>12.3f} {cached:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Synthetic HITL events at production volume.
+
+generate_events() builds events shaped like rows of
+agent_analytics.intent_classification_events:
+
+- user_sentiment follows SENTIMENT_CATEGORIES (the BigQuery counts), so the
+  default 170,441 events reproduce the production split. About 3% of events
+  carry a second sentiment
+- user_intent is drawn from the knowledge base taxonomy, conditioned on
+  sentiment (frustrated users re-report bugs, satisfied ones acknowledge
+  fixes, ...). A quarter of events carry two intents
+- events belong to jobs (sessions) of one user each, with a per-job
+  state_number, work_category / work_subcategory and a running
+  trajectory_ecu_consumed. Jobs lean towards one mood, so sentiment
+  clusters within a session as it does in real traffic
+- each event has a progress_outcome and a log-normal execution_time whose
+  median depends on the outcome (building a feature takes longer than
+  asking a question). These come from a second random stream, so the
+  other fields are the same as before they were added
+- message lengths are log-normal: user messages around 90 characters,
+  agent responses around 700 and up to 20,000. Text is cut from a corpus
+  built from the mock messages and the integration names, so search terms
+  have realistic frequencies
+
+Output is deterministic for a given seed.
+
+    python benchmarks/synthetic_events.py --events 170441 > events.ndjson
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Iterator, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from event_store import TIMESTAMP_FORMAT  # noqa: E402
+from server import HITL_EVENTS_BY_SENTIMENT, SENTIMENT_CATEGORIES  # noqa: E402
+
+PRODUCTION_EVENTS = sum(category["count"] for category in SENTIMENT_CATEGORIES)
+
+# Intent weights by sentiment (knowledge base "User Intent Categories")
+INTENTS_BY_SENTIMENT = {
+    "neutral": {
+        "provided_info": 20, "req_feature": 14, "req_improvement": 12, "asked_info": 10, "align_with_agent": 9,
+        "req_new_bugfix": 8, "provided_credentials": 6, "requested_integration": 5, "req_deployment": 5,
+        "asked_platform_info": 4, "req_testing": 3, "requested_credentials": 2, "security_concern": 1,
+        "req_same_bug_fix": 1,
+    },
+    "satisfied": {
+        "ack_bug_fixed": 22, "ack_feature_built": 18, "ack_improvement": 16, "align_with_agent": 14,
+        "req_feature": 10, "req_improvement": 10, "provided_info": 6, "req_deployment": 4,
+    },
+    "dissatisfied": {
+        "req_same_bug_fix": 30, "req_new_bugfix": 25, "req_improvement": 18, "credit_concern": 7,
+        "asked_info": 6, "req_feature": 6, "req_deployment": 4, "security_concern": 2, "req_testing": 2,
+    },
+    "frustrated": {
+        "req_same_bug_fix": 45, "req_new_bugfix": 20, "credit_concern": 18, "req_improvement": 8,
+        "security_concern": 4, "req_deployment": 3, "asked_platform_info": 2,
+    },
+    "excited": {
+        "ack_feature_built": 35, "ack_bug_fixed": 20, "ack_improvement": 18, "align_with_agent": 12,
+        "req_feature": 10, "requested_integration": 5,
+    },
+}
+
+WORK_CATEGORIES = {"functionality": 40, "design": 25, "integration": 15, "feature": 12, "deployment": 8}
+
+INTEGRATIONS = [
+    "GPT-5.2", "GPT-4o", "GPT-4o-mini", "Gemini-3-flash", "Gemini-3-pro", "Claude Sonnet 4.5", "DeepSeek-V3",
+    "OpenAI Whisper", "Stripe", "Razorpay", "PayPal", "Twilio SMS", "Telegram", "Slack", "Discord", "Gmail",
+    "Resend", "SendGrid", "WhatsApp", "YouTube", "Spotify", "ElevenLabs", "Cloudinary", "Web Scraper",
+    "CoinGecko", "Google Calendar", "Google Sheets", "Google OAuth", "Firebase", "Supabase Auth", "Pinecone",
+    "WebSockets", "MongoDB", "JWT", "OAuth",
+]
+SUBCATEGORIES = {
+    "functionality": ["api", "database", "validation", "business_logic", "authentication", "state_management"],
+    "design": ["layout", "styling", "responsive", "animation", "typography", "theme"],
+    "feature": ["new_page", "dashboard", "search", "notifications", "export", "admin_panel"],
+    "deployment": ["build", "hosting", "environment", "domain", "ci_cd"],
+}
+
+# Progress outcome (knowledge base "Progress Outcome Categories") -> (weight, median execution_time seconds)
+PROGRESS_OUTCOMES = {
+    "bug_fixed": (22, 95.0), "built_feature": (16, 240.0), "improvement": (15, 120.0), "provided_info": (12, 20.0),
+    "asked_clarification": (9, 12.0), "not_bug": (5, 25.0), "deployment_fixed": (5, 150.0),
+    "requested_deployment_fix": (3, 30.0), "integration_suggested": (3, 35.0), "testing_done": (4, 180.0),
+    "requested_credentials": (3, 15.0), "provided_credentials": (1, 15.0), "reverted_changes": (2, 60.0),
+}
+EXECUTION_TIME_SIGMA = 0.9
+
+# (median characters, sigma, minimum, maximum) of the log-normal lengths
+USER_MESSAGE_LENGTH = (90, 0.9, 5, 4_000)
+AGENT_MESSAGE_LENGTH = (700, 0.8, 40, 20_000)
+
+EVENTS_PER_JOB = 7
+JOBS_PER_USER = 3
+SECOND_SENTIMENT_RATE = 0.03
+SECOND_INTENT_RATE = 0.25
+# Chance that an event takes its job's mood rather than a fresh draw
+JOB_MOOD_WEIGHT = 0.4
+
+CORPUS_WORDS = 400_000
+
+
+class _Choice:
+    """Weighted random choice with precomputed cumulative weights"""
+
+    def __init__(self, weights: dict):
+        self.values = list(weights)
+        self.cumulative = list(accumulate(weights.values()))
+
+    def __call__(self, rng: random.Random) -> str:
+        return rng.choices(self.values, cum_weights=self.cumulative)[0]
+
+
+def _corpus(rng: random.Random) -> str:
+    words = []
+    for events in HITL_EVENTS_BY_SENTIMENT.values():
+        for event in events:
+            for field in ("user_curr_message", "agent_prev_message"):
+                words.extend(re.findall(r"\S+", event.get(field) or ""))
+    words.extend(INTEGRATIONS * 2)
+    return " ".join(rng.choices(words, k=CORPUS_WORDS))
+
+
+def _text(rng: random.Random, corpus: str, length: tuple) -> str:
+    median, sigma, low, high = length
+    size = min(high, max(low, int(rng.lognormvariate(math.log(median), sigma))))
+    start = corpus.find(" ", rng.randrange(len(corpus) - high)) + 1
+    end = corpus.rfind(" ", start, start + size)
+    return corpus[start:end if end > start else start + size]
+
+
+def generate_events(
+    count: int = PRODUCTION_EVENTS,
+    seed: int = 170,
+    end: datetime = datetime(2026, 1, 21, 12),
+    days: int = 30,
+) -> Iterator[dict]:
+    """Yield `count` synthetic events, oldest first, spread over the `days` before `end`"""
+    rng = random.Random(seed)
+    corpus = _corpus(rng)
+    sentiment_choice = _Choice({category["sentiment"]: category["count"] for category in SENTIMENT_CATEGORIES})
+    intent_choices = {sentiment: _Choice(weights) for sentiment, weights in INTENTS_BY_SENTIMENT.items()}
+    category_choice = _Choice(WORK_CATEGORIES)
+    outcome_choice = _Choice({outcome: weight for outcome, (weight, _) in PROGRESS_OUTCOMES.items()})
+    # Columns added later draw from here, leaving `rng`'s sequence unchanged
+    extra_rng = random.Random(seed + 1)
+
+    jobs = max(1, count // EVENTS_PER_JOB)
+    job_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(jobs)]
+    user_ids = [f"user_{rng.getrandbits(40):010x}" for _ in range(max(1, jobs // JOBS_PER_USER))]
+    job_users = [rng.choice(user_ids) for _ in range(jobs)]
+    job_moods = [sentiment_choice(rng) for _ in range(jobs)]
+    job_states = [0] * jobs
+    job_ecu = [0.0] * jobs
+
+    span = days * 86_400_000_000
+    start = end - timedelta(days=days)
+    offsets = sorted(rng.randrange(span) for _ in range(count))
+    for offset in offsets:
+        job = rng.randrange(jobs)
+        sentiment = job_moods[job] if rng.random() < JOB_MOOD_WEIGHT else sentiment_choice(rng)
+        sentiments = [sentiment]
+        if rng.random() < SECOND_SENTIMENT_RATE:
+            other = sentiment_choice(rng)
+            if other != sentiment:
+                sentiments.append(other)
+        intents = [intent_choices[sentiment](rng)]
+        if rng.random() < SECOND_INTENT_RATE:
+            other = intent_choices[sentiment](rng)
+            if other != intents[0]:
+                intents.append(other)
+        category = category_choice(rng)
+        subcategory = rng.choice(INTEGRATIONS) if category == "integration" else rng.choice(SUBCATEGORIES[category])
+        job_states[job] += 1
+        job_ecu[job] += round(rng.expovariate(1 / 2.5), 2)
+        outcome = outcome_choice(extra_rng)
+        median_seconds = PROGRESS_OUTCOMES[outcome][1]
+        yield {
+            "event_timestamp": (start + timedelta(microseconds=offset)).strftime(TIMESTAMP_FORMAT),
+            "request_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "user_curr_message": _text(rng, corpus, USER_MESSAGE_LENGTH),
+            "agent_prev_message": _text(rng, corpus, AGENT_MESSAGE_LENGTH),
+            "user_intent": intents,
+            "user_sentiment": sentiments,
+            "work_category": [category],
+            "work_subcategory": [subcategory],
+            "job_id": job_ids[job],
+            "user_id": job_users[job],
+            "state_number": job_states[job],
+            "trajectory_ecu_consumed": round(job_ecu[job], 2),
+            "progress_outcome": [outcome],
+            "execution_time": round(extra_rng.lognormvariate(math.log(median_seconds), EXECUTION_TIME_SIGMA), 2),
+        }
+
+
+def generate_batches(count: int = PRODUCTION_EVENTS, size: int = 5000, **kwargs) -> Iterator[List[dict]]:
+    batch = []
+    for event in generate_events(count, **kwargs):
+        batch.append(event)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=PRODUCTION_EVENTS)
+    parser.add_argument("--seed", type=int, default=170)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+    for event in generate_events(args.events, seed=args.seed, days=args.days):
+        sys.stdout.write(json.dumps(event) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Synthetic agent trajectories for the tool usage engine.
+
+generate_steps() builds steps shaped like rows of
+analytics.trajectories_full_view joined to analytics.jobs_full_view, for
+the tools of the knowledge base's "Tool Interpretation Guide":
+
+- each job has a model, agent, prompt and user, and starts at a uniformly
+  random time in the `days` before `end`
+- a job uses each tool with that tool's invoke probability, a geometric
+  number of times around its mean calls per job, and at positions around
+  its typical place in a trajectory (screenshot_tool late, view_file
+  early, finish last, ...)
+- env_success is the string 'true' or 'false' as in the view, drawn with
+  the tool's success rate
+- steps are a few seconds to a few minutes apart, and the whole dataset is
+  ordered by created_at, as steps arrive
+
+Output is deterministic for a given seed.
+
+    python benchmarks/synthetic_trajectories.py --jobs 10000 > steps.ndjson
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from event_store import TIMESTAMP_FORMAT  # noqa: E402
+
+# tool -> (jobs using it, mean calls when used, success rate, typical position in the trajectory: 0 first .. 1 last)
+TOOLS = {
+    "search_replace": (0.85, 12, 0.80, 0.55),
+    "create_file": (0.70, 4, 0.95, 0.30),
+    "bulk_file_writer": (0.50, 2, 0.92, 0.20),
+    "insert_text": (0.20, 2, 0.90, 0.50),
+    "view_file": (0.55, 5, 0.97, 0.25),
+    "view_bulk": (0.45, 2, 0.97, 0.15),
+    "execute_bash": (0.90, 8, 0.90, 0.50),
+    "screenshot_tool": (0.65, 3, 0.98, 0.75),
+    "PARALLEL_TOOLS": (0.50, 3, 0.95, 0.45),
+    "think": (0.60, 4, 1.00, 0.40),
+    "ask_human": (0.30, 1, 1.00, 0.70),
+    "auto_frontend_testing_agent": (0.35, 1, 0.85, 0.80),
+    "vision_expert_agent": (0.20, 1, 0.90, 0.80),
+    "deep_testing_backend_v2": (0.25, 1, 0.80, 0.85),
+    "lint_javascript": (0.30, 2, 0.50, 0.60),
+    "rollback": (0.08, 1, 0.90, 0.60),
+    "ENV_CREATION_FAILED": (0.01, 1, 0.00, 0.00),
+}
+# Jobs end with one of these, or with neither
+EXIT_TOOLS = {"finish": 0.55, "exit_cost_credit_limit_reached": 0.30, "exit_cost": 0.05}
+
+MODELS = {"claude-sonnet-4-5": 50, "claude-opus-4-1": 20, "gpt-5": 20, "gemini-2.5-pro": 10}
+AGENTS = {"EmergentAssistant": 70, "SkilledAssistant": 30}
+PROMPTS = {
+    "frontend_app_builder_cloud_v8": 45, "fullstack_app_builder_v5": 30, "mobile_app_builder_v2": 15,
+    "backend_api_builder_v3": 10,
+}
+
+# Seconds between a job's creation and its first step, and between steps
+ENV_SETUP_SECONDS = 30
+STEP_GAP_SECONDS = 25
+
+
+def _weighted(rng: random.Random, weights: dict) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _job_steps(rng: random.Random, job_id: str, start: datetime) -> List[dict]:
+    model_name = _weighted(rng, MODELS)
+    agent_name = _weighted(rng, AGENTS)
+    prompt_name = _weighted(rng, PROMPTS)
+    user_id = f"user_{rng.getrandbits(40):010x}"
+    calls = []
+    for tool, (invoke, mean_calls, success, position) in TOOLS.items():
+        if rng.random() >= invoke:
+            continue
+        count = 1
+        while rng.random() < 1 - 1 / mean_calls:
+            count += 1
+        for _ in range(count):
+            calls.append((min(max(rng.gauss(position, 0.2), 0.0), 0.999), tool, rng.random() < success))
+    calls.sort()
+    exit_tool = _weighted(rng, {**EXIT_TOOLS, None: 1 - sum(EXIT_TOOLS.values())})
+    if exit_tool is not None:
+        calls.append((1.0, exit_tool, True))
+
+    created_at = start + timedelta(seconds=rng.expovariate(1 / ENV_SETUP_SECONDS))
+    steps = []
+    for _, tool, succeeded in calls:
+        created_at += timedelta(seconds=rng.expovariate(1 / STEP_GAP_SECONDS))
+        steps.append({
+            "job_id": job_id,
+            "function_name": tool,
+            "created_at": created_at.strftime(TIMESTAMP_FORMAT),
+            "env_success": "true" if succeeded else "false",
+            "model_name": model_name,
+            "agent_name": agent_name,
+            "prompt_name": prompt_name,
+            "user_id": user_id,
+            "job_created_at": start.strftime(TIMESTAMP_FORMAT),
+        })
+    return steps
+
+
+def generate_steps(
+    jobs: int = 10_000,
+    seed: int = 2375,
+    end: datetime = datetime(2026, 1, 21, 12),
+    days: int = 30,
+) -> Iterator[dict]:
+    """Yield the steps of `jobs` synthetic jobs started in the `days` before `end`, oldest first"""
+    rng = random.Random(seed)
+    span = days * 86_400
+    steps = []
+    for job in range(jobs):
+        start = end - timedelta(days=days) + timedelta(seconds=rng.uniform(0, span))
+        steps.extend(_job_steps(rng, f"job-{seed}-{job:07d}", start))
+    steps.sort(key=lambda step: step["created_at"])
+    yield from steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=2375)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+    for step in generate_steps(args.jobs, seed=args.seed, days=args.days):
+        sys.stdout.write(json.dumps(step) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tool usage engine benchmark.
+
+Ingests synthetic trajectories (benchmarks/synthetic_trajectories.py) into
+ToolUsageEngine (backend/tool_usage.py) in batches, once in-process and once
+per --processes value, then runs the report for a few filter sets:
+
+- ingest: steps per second, batches of --batch steps in created_at order
+- report: time per report, best of 5
+- every engine must give the same report. Each report is also checked
+  against the query itself, evaluated step by step in one process as the
+  CTEs do it: counts and histograms exactly. The engine finds the P90 at
+  bucket resolution, so the P90-filtered first step and latency may keep a
+  few more jobs; their largest relative difference is printed
+
+Speedups need as many free cores as processes. Staging each batch on every
+shard before it is applied costs one more round trip per batch.
+
+    python benchmarks/tool_usage_benchmark.py --jobs 20000 --processes 2 4
+"""
+
+import argparse
+import os
+import time
+
+from synthetic_trajectories import generate_steps
+
+from event_columns import timestamp_micros  # noqa: E402
+from tool_usage import P90, POSITION_BINS, ToolUsageEngine  # noqa: E402
+
+REPORTS = {
+    "all jobs": {},
+    "last 7 days": {"start": "2026-01-14 12:00:00.000000 UTC"},
+    "claude-sonnet-4-5, frontend prompt": {
+        "model_names": ["claude-sonnet-4-5"], "prompt_names": ["frontend_app_builder_cloud_v8"],
+    },
+    "SkilledAssistant, users *0-*3": {"agent_name": "SkilledAssistant", "user_id_last_chars": ["0", "1", "2", "3"]},
+}
+
+
+def reference(steps, start=None, end=None, model_names=None, agent_name=None, prompt_names=None,
+              user_id_last_chars=None, min_calls=0):
+    """The report's CTEs, evaluated directly: rows keyed by tool"""
+    jobs = {}
+    for step in steps:
+        jobs.setdefault(step["job_id"], []).append(step)
+    selected = {}
+    for job_id, job_steps in jobs.items():
+        job_steps.sort(key=lambda step: (step["created_at"], step["function_name"]))
+        first = job_steps[0]
+        job_start = first["job_created_at"]
+        if (start and job_start < start) or (end and job_start >= end):
+            continue
+        if model_names and first["model_name"] not in model_names:
+            continue
+        if agent_name and first["agent_name"] != agent_name:
+            continue
+        if prompt_names and first["prompt_name"] not in prompt_names:
+            continue
+        if user_id_last_chars and first["user_id"][-1] not in user_id_last_chars:
+            continue
+        selected[job_id] = job_steps
+    total_calls = sum(len(job_steps) for job_steps in selected.values())
+    tools = {}
+    for job_steps in selected.values():
+        job_start = timestamp_micros(job_steps[0]["job_created_at"])
+        seen = set()
+        for number, step in enumerate(job_steps, 1):
+            tool = tools.setdefault(step["function_name"], {
+                "jobs": 0, "calls": 0, "successes": 0, "first": [], "positions": [0] * POSITION_BINS,
+            })
+            tool["calls"] += 1
+            tool["positions"][(number - 1) * POSITION_BINS // len(job_steps)] += 1
+            tool["successes"] += step["env_success"] == "true"
+            if step["function_name"] not in seen:
+                seen.add(step["function_name"])
+                tool["jobs"] += 1
+                latency = max(timestamp_micros(step["created_at"]) - job_start, 0) / 1_000_000
+                tool["first"].append((latency, number))
+    rows = {}
+    for name, tool in tools.items():
+        if tool["calls"] < min_calls:
+            continue
+        first = sorted(tool["first"])
+        threshold = first[int(P90 * (len(first) - 1))][0]
+        kept = [(latency, number) for latency, number in first if latency <= threshold]
+        rows[name] = {
+            "tool_jobs": tool["jobs"],
+            "invoke_pct": round(tool["jobs"] / len(selected) * 100, 2),
+            "total_tool_calls": tool["calls"],
+            "pct_tool_call": round(tool["calls"] / total_calls * 100, 2),
+            "success_calls": tool["successes"],
+            "p90_first_invocation_step": sum(number for _, number in kept) / len(kept),
+            "p90_invocation_latency": sum(latency for latency, _ in kept) / len(kept),
+            "position_histogram": tool["positions"],
+        }
+    return len(selected), rows
+
+
+def check(report, expected):
+    jobs, rows = expected
+    assert report["total_jobs"] == jobs
+    assert {row["tool"] for row in report["tools"]} == set(rows)
+    worst = 0.0
+    for row in report["tools"]:
+        want = rows[row["tool"]]
+        for field in ("tool_jobs", "invoke_pct", "total_tool_calls", "pct_tool_call", "success_calls", "position_histogram"):
+            assert row[field] == want[field], (row["tool"], field, row[field], want[field])
+        for field in ("p90_first_invocation_step", "p90_invocation_latency"):
+            error = abs(row[field] - want[field]) / want[field] if want[field] else abs(row[field])
+            worst = max(worst, error)
+    assert worst <= 0.05, worst
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=20_000)
+    parser.add_argument("--processes", type=int, nargs="*", default=[min(4, os.cpu_count() or 1)])
+    args = parser.parse_args()
+
+    steps = list(generate_steps(args.jobs))
+    print(f"{len(steps):,} steps of {args.jobs:,} jobs ({os.cpu_count()} cores); batches of {args.batch:,}")
+    expected = {name: reference(steps, **filters) for name, filters in REPORTS.items()}
+
+    baseline = {}
+    for processes in [0] + [count for count in args.processes if count]:
+        engine = ToolUsageEngine(processes)
+        try:
+            # Workers start before the clock, as the server starts them at startup
+            engine.start()
+            began = time.perf_counter()
+            for offset in range(0, len(steps), args.batch):
+                engine.add_many(steps[offset:offset + args.batch])
+            elapsed = time.perf_counter() - began
+            assert engine.stats()["steps"] == len(steps)
+            label = "in-process" if processes == 0 else f"{processes} process{'es' if processes > 1 else ''}"
+            print(f"{label}: ingest {elapsed:.1f}s ({len(steps) / elapsed:,.0f} steps/s)")
+            for name, filters in REPORTS.items():
+                best = float("inf")
+                for _ in range(5):
+                    began = time.perf_counter()
+                    report = engine.report(**filters)
+                    best = min(best, time.perf_counter() - began)
+                worst = check(report, expected[name])
+                if processes:
+                    assert report == baseline[name], name
+                else:
+                    baseline[name] = report
+                print(f"  {name:<38} {report['total_jobs']:>7,} jobs {best * 1000:>8.1f}ms  "
+                      f"P90 metrics within {worst:.2%}")
+        finally:
+            engine.close()
+
+
+if __name__ == "__main__":
+    main()
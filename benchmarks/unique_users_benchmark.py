@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Distinct-user sketch benchmark.
+
+Adds synthetic events (benchmarks/synthetic_events.py) to a UniqueUserIndex
+(backend/unique_users.py), then for every field answers per-label distinct
+users over 1-day, 7-day and 30-day windows twice:
+
+- sketches: merge the window's daily HyperLogLog sketches
+- exact: a set of user ids per label, from a scan of every event in the window
+
+and reports both times, the largest and the root-mean-square relative error
+of the estimates (labels with fewer than --min-users users are left out of
+the error, since a handful of users is estimated almost exactly anyway), and
+the sketches' memory against the exact sets'.
+
+    python benchmarks/unique_users_benchmark.py --events 170441
+"""
+
+import argparse
+import math
+import sys
+import time
+
+from synthetic_events import generate_events
+
+from unique_users import STANDARD_ERROR, UNIQUE_USER_FIELDS, UniqueUserIndex, _labels  # noqa: E402
+
+WINDOWS = (1, 7, 30)
+
+
+def exact(events, field, days):
+    """Per-label sets of user ids, by a scan of every event in `days`"""
+    users = {}
+    for event in events:
+        if event["event_timestamp"][:10] not in days:
+            continue
+        for event_field, label in _labels(event):
+            if event_field == field:
+                users.setdefault(label, set()).add(event["user_id"])
+    return users
+
+
+def sketch_bytes(index):
+    total = 0
+    for by_label in index._sketches.values():
+        for sketch in by_label.values():
+            total += len(sketch._registers) if sketch._registers is not None else len(sketch._sparse) * 4
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=170_441)
+    parser.add_argument("--min-users", type=int, default=100)
+    args = parser.parse_args()
+
+    events = list(generate_events(args.events))
+    index = UniqueUserIndex()
+    began = time.perf_counter()
+    for doc, event in enumerate(events):
+        index.add(doc, event)
+    elapsed = time.perf_counter() - began
+    all_days = sorted({event["event_timestamp"][:10] for event in events})
+    daily = [key for key in index._sketches if key[1] is not None]
+    print(f"{len(events):,} events, {len({event['user_id'] for event in events}):,} users: "
+          f"{elapsed / len(events) * 1e6:.1f} µs/event to index")
+    print(f"sketch registers: {sketch_bytes(index) / 1e6:.2f} MB over {len(daily):,} (field, day) "
+          f"and {len(index._sketches) - len(daily)} all-time label sets "
+          f"(standard error {STANDARD_ERROR:.2%})")
+    print(f"{'group_by':<18} {'days':>4} {'labels':>6} {'sketch ms':>10} {'exact ms':>10} "
+          f"{'rms err':>8} {'max err':>8} {'exact set MB':>13}")
+
+    for field in UNIQUE_USER_FIELDS:
+        for window in WINDOWS:
+            days = all_days[-window:]
+            began = time.perf_counter()
+            estimates = index.count(field, days)
+            sketch_ms = (time.perf_counter() - began) * 1000
+
+            began = time.perf_counter()
+            users = exact(events, field, set(days))
+            exact_ms = (time.perf_counter() - began) * 1000
+
+            assert set(estimates) == set(users), (field, window)
+            errors = [
+                (estimates[label] - len(ids)) / len(ids) for label, ids in users.items() if len(ids) >= args.min_users
+            ]
+            rms = math.sqrt(sum(error * error for error in errors) / len(errors)) if errors else 0.0
+            worst = max(map(abs, errors), default=0.0)
+            set_mb = sum(sys.getsizeof(ids) + sum(map(sys.getsizeof, ids)) for ids in users.values()) / 1e6
+            print(f"{field:<18} {window:>4} {len(users):>6} {sketch_ms:>10.2f} {exact_ms:>10.1f} "
+                  f"{rms:>8.2%} {worst:>8.2%} {set_mb:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import axios from 'axios';
 import {
   MessageSquare, User, Bot, Clock, Hash, Loader2, 
@@ -7,6 +7,10 @@ import {
 import './App.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || '';
+const PAGE_SIZE = 20;
+// Long messages arrive cut to about this many characters; a card fetches
+// the full event only when it is expanded
+const PREVIEW_CHARS = 320;
 
 // =============================================================================
 // UTILITY FUNCTIONS
@@ -30,6 +34,10 @@ const formatCount = (num) => {
   return num.toString();
 };
 
+const eventsEndpoint = (sentiment) => sentiment === 'all'
+  ? `${BACKEND_URL}/api/hitl-events`
+  : `${BACKEND_URL}/api/hitl-events/${sentiment}`;
+
 // Sentiment icons
 const getSentimentIcon = (sentiment, size = 16) => {
   switch (sentiment) {
@@ -102,7 +110,48 @@ const Sidebar = ({ sentiments, selectedSentiment, onSelectSentiment }) => {
 };
 
 // HITL Event Card Component
-const HITLEventCard = ({ event }) => {
+const HITLEventCard = ({ event: preview }) => {
+  const [fullEvent, setFullEvent] = useState(null);
+  const [expanded, setExpanded] = useState(false);
+  const [expanding, setExpanding] = useState(false);
+  const [session, setSession] = useState(null);
+  const [showSession, setShowSession] = useState(false);
+  const [loadingSession, setLoadingSession] = useState(false);
+  const isTruncated = preview.truncated?.length > 0;
+  const event = expanded && fullEvent ? fullEvent : preview;
+
+  const toggleSession = () => {
+    if (showSession || session) {
+      setShowSession(!showSession);
+      return;
+    }
+    setLoadingSession(true);
+    axios.get(`${BACKEND_URL}/api/hitl-event/${encodeURIComponent(preview.request_id)}/session`, {
+      params: { fields: 'user_curr_message,user_sentiment', preview_chars: 120 }
+    })
+      .then(res => {
+        setSession(res.data);
+        setShowSession(true);
+      })
+      .catch(err => console.error('Failed to fetch session:', err))
+      .finally(() => setLoadingSession(false));
+  };
+
+  const toggleExpanded = () => {
+    if (expanded || fullEvent) {
+      setExpanded(!expanded);
+      return;
+    }
+    setExpanding(true);
+    axios.get(`${BACKEND_URL}/api/hitl-event/${encodeURIComponent(preview.request_id)}`)
+      .then(res => {
+        setFullEvent(res.data);
+        setExpanded(true);
+      })
+      .catch(err => console.error('Failed to fetch full event:', err))
+      .finally(() => setExpanding(false));
+  };
+
   const sentimentClass = Array.isArray(event.user_sentiment) 
     ? event.user_sentiment[0]?.replace(/[\[\]]/g, '') 
     : event.user_sentiment;
@@ -150,6 +199,50 @@ const HITLEventCard = ({ event }) => {
           </div>
         </div>
 
+        {isTruncated && (
+          <button
+            className="text-xs font-medium text-slate-500 hover:text-slate-800 flex items-center gap-1"
+            onClick={toggleExpanded}
+            disabled={expanding}
+            data-testid="expand-event-btn"
+          >
+            {expanding && <Loader2 size={12} className="animate-spin" />}
+            {expanded ? 'Show less' : 'Show full messages'}
+          </button>
+        )}
+
+        {preview.job_id && (
+          <button
+            className="text-xs font-medium text-slate-500 hover:text-slate-800 flex items-center gap-1 mt-2"
+            onClick={toggleSession}
+            disabled={loadingSession}
+            data-testid="view-session-btn"
+          >
+            {loadingSession && <Loader2 size={12} className="animate-spin" />}
+            {showSession ? 'Hide session' : 'View session'}
+          </button>
+        )}
+
+        {showSession && session && (
+          <div className="mt-2 border-l-2 border-slate-200 pl-3 space-y-2" data-testid="session-timeline">
+            <div className="text-xs text-slate-400">
+              {session.total_events} events · {session.total_states ?? '?'} states · {session.total_ecu_consumed ?? '?'} ECU
+            </div>
+            {session.events.map((step) => (
+              <div
+                key={step.request_id}
+                className={`text-xs ${step.request_id === preview.request_id ? 'font-semibold text-slate-800' : 'text-slate-500'}`}
+              >
+                <span className="text-slate-400 mr-2">{formatTimestamp(step.event_timestamp)}</span>
+                {(step.user_sentiment || []).map((sentiment) => (
+                  <span key={sentiment} className={`sentiment-dot ${sentiment} inline-block mr-1`} title={sentiment} />
+                ))}
+                {step.user_curr_message}
+              </div>
+            ))}
+          </div>
+        )}
+
         {/* Tags */}
         <div className="flex flex-wrap items-center gap-2 mt-4 pt-4 border-t border-slate-100">
           {/* Intent tags */}
@@ -240,6 +333,13 @@ function App() {
   const [loading, setLoading] = useState(true);
   const [eventsLoading, setEventsLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // Bumped to refetch the first page when the live feed reports missed events
+  const [reloadSeq, setReloadSeq] = useState(0);
+  const sentinelRef = useRef(null);
+  // Bumped on every sentiment switch so late responses for the old list are ignored
+  const requestSeq = useRef(0);
 
   // Fetch sentiment categories on mount
   useEffect(() => {
@@ -259,23 +359,75 @@ function App() {
   useEffect(() => {
     if (!selectedSentiment) return;
 
+    const seq = ++requestSeq.current;
     setEventsLoading(true);
-    const endpoint = selectedSentiment === 'all' 
-      ? `${BACKEND_URL}/api/hitl-events`
-      : `${BACKEND_URL}/api/hitl-events/${selectedSentiment}`;
+    setLoadingMore(false);
+    setNextCursor(null);
 
-    axios.get(endpoint)
+    axios.get(eventsEndpoint(selectedSentiment), { params: { limit: PAGE_SIZE, preview_chars: PREVIEW_CHARS } })
       .then(res => {
+        if (seq !== requestSeq.current) return;
         setEvents(res.data.events || []);
+        setNextCursor(res.data.next_cursor || null);
         setEventsLoading(false);
       })
       .catch(err => {
+        if (seq !== requestSeq.current) return;
         console.error('Failed to fetch events:', err);
         setEvents([]);
         setEventsLoading(false);
       });
+  }, [selectedSentiment, reloadSeq]);
+
+  // Live updates: newly ingested events for the selected sentiment are pushed
+  // over Server-Sent Events and added to the top of the list
+  useEffect(() => {
+    if (!selectedSentiment) return;
+
+    const params = new URLSearchParams({ preview_chars: PREVIEW_CHARS });
+    if (selectedSentiment !== 'all') params.append('sentiment', selectedSentiment);
+    const source = new EventSource(`${BACKEND_URL}/api/live/hitl-events?${params}`);
+    source.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      setEvents(prev => prev.some(e => e.request_id === event.request_id) ? prev : [event, ...prev]);
+    };
+    // The backend dropped events this tab was too slow to take: reload instead of patching the list
+    source.addEventListener('dropped', () => setReloadSeq(seq => seq + 1));
+    return () => source.close();
   }, [selectedSentiment]);
 
+  // Fetch the page after the last loaded event (keyset cursor from the backend)
+  const loadMore = useCallback(() => {
+    if (!nextCursor || loadingMore) return;
+
+    const seq = requestSeq.current;
+    setLoadingMore(true);
+    axios.get(eventsEndpoint(selectedSentiment), { params: { limit: PAGE_SIZE, preview_chars: PREVIEW_CHARS, cursor: nextCursor } })
+      .then(res => {
+        if (seq !== requestSeq.current) return;
+        setEvents(prev => [...prev, ...(res.data.events || [])]);
+        setNextCursor(res.data.next_cursor || null);
+        setLoadingMore(false);
+      })
+      .catch(err => {
+        if (seq !== requestSeq.current) return;
+        console.error('Failed to fetch more events:', err);
+        setLoadingMore(false);
+      });
+  }, [selectedSentiment, nextCursor, loadingMore]);
+
+  // Infinite scroll: load the next page when the sentinel below the list comes into view
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !nextCursor) return;
+
+    const observer = new IntersectionObserver(entries => {
+      if (entries[0].isIntersecting) loadMore();
+    }, { rootMargin: '400px' });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [nextCursor, loadMore]);
+
   // Get total count for selected sentiment
   const getSelectedCount = () => {
     if (selectedSentiment === 'all') {
@@ -334,6 +486,12 @@ function App() {
               {events.map((event, idx) => (
                 <HITLEventCard key={event.request_id || idx} event={event} />
               ))}
+              <div ref={sentinelRef} data-testid="events-sentinel" />
+              {loadingMore && (
+                <div className="flex justify-center py-6">
+                  <Loader2 size={20} className="animate-spin text-indigo-500" />
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Load / latency tests for the HITL endpoints
+
+Ingests a synthetic production-sized dataset (benchmarks/synthetic_events.py,
+170,441 events by default) into the app in-process, through the ingest
+endpoint. Then, for each scenario, a fixed number of concurrent clients
+issue requests for a fixed time. Requests go straight to the ASGI app, with
+no sockets, so the numbers are server time and are comparable between runs
+on the same machine.
+
+Each scenario reports requests/s and p50/p95/p99 latency, and is checked
+against test_reports/load_baselines.json. It fails when p95 latency or
+throughput has regressed by more than the tolerance, or when any request
+fails. Results are saved like backend_test.py's, in
+test_reports/load_test_results.json.
+
+    python load_test.py                      # run and compare with the baselines
+    python load_test.py --update-baselines   # record this run as the new baselines
+    python load_test.py --events 20000 --duration 2 --no-baselines
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+from backend_test import LLMTracingAPITester
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic_events import INTEGRATIONS, PRODUCTION_EVENTS, generate_batches  # noqa: E402
+
+BASELINES_PATH = os.path.join(ROOT, "test_reports", "load_baselines.json")
+RESULTS_PATH = os.path.join(ROOT, "test_reports", "load_test_results.json")
+
+# How far a run may fall behind its baseline before it counts as a regression
+LATENCY_TOLERANCE = 0.5
+THROUGHPUT_TOLERANCE = 0.33
+
+# Settings that must match for a baseline to be comparable
+BASELINE_SETTINGS = ("events", "concurrency", "cached")
+
+SENTIMENTS = ["neutral", "satisfied", "dissatisfied", "frustrated", "excited"]
+INTENTS = ["req_same_bug_fix", "req_new_bugfix", "req_feature", "ack_bug_fixed", "credit_concern"]
+SEARCH_TERMS = ["payment", "login error", '"not working"', "deploy", "Stripe integration", "database", "cart"]
+
+# name -> (rng, sample request_ids) -> (path, params)
+SCENARIOS = {
+    "sentiments": lambda rng, ids: ("/api/sentiments", {}),
+    "events_by_sentiment": lambda rng, ids: (
+        f"/api/hitl-events/{rng.choice(SENTIMENTS)}", {"limit": 20, "preview_chars": 320}
+    ),
+    "events_all": lambda rng, ids: ("/api/hitl-events", {"limit": 20, "preview_chars": 320}),
+    "events_label_filter": lambda rng, ids: (
+        "/api/hitl-events", {"limit": 20, "intent": rng.choice(INTENTS), "not_sentiment": "neutral"}
+    ),
+    "events_search": lambda rng, ids: (
+        "/api/hitl-events", {"limit": 20, "q": rng.choice(SEARCH_TERMS + INTEGRATIONS)}
+    ),
+    "event_detail": lambda rng, ids: (f"/api/hitl-event/{rng.choice(ids)}", {}),
+    "trends_hourly": lambda rng, ids: ("/api/trends", {"granularity": "hour", "sentiment": rng.choice(SENTIMENTS)}),
+}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(q * len(sorted_values) + 0.5) - 1))]
+
+
+class InProcessClient:
+    """Drives the ASGI app directly from the caller's event loop"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, params=None, body=b"", headers=None):
+        scope = {
+            "type": "http", "http_version": "1.1", "method": method, "scheme": "http", "root_path": "",
+            "path": path, "raw_path": path.encode(), "query_string": urlencode(params or {}, doseq=True).encode(),
+            "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+            "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+        }
+        response = {"status": None, "body": []}
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return response["status"], b"".join(response["body"])
+
+
+class LoadTester(LLMTracingAPITester):
+    def __init__(self, events, concurrency, duration, cached, seed=170):
+        super().__init__(base_url="in-process")
+        import server
+
+        self.server = server
+        self.client = InProcessClient(server.app)
+        self.events = events
+        self.concurrency = concurrency
+        self.duration = duration
+        self.cached = cached
+        self.rng = random.Random(seed)
+        self.request_ids = []
+        self.scenario_results = {}
+
+    def settings(self):
+        return {"events": self.events, "concurrency": self.concurrency, "cached": self.cached}
+
+    async def load(self):
+        """Ingest the synthetic dataset through POST /api/ingest/hitl-events"""
+        started = time.perf_counter()
+        for batch in generate_batches(self.events):
+            body = "\n".join(json.dumps(event) for event in batch).encode()
+            status, response = await self.client.request(
+                "POST", "/api/ingest/hitl-events", body=body, headers={"Content-Type": "application/x-ndjson"}
+            )
+            if status != 200:
+                raise RuntimeError(f"Ingest failed with {status}: {response[:200]!r}")
+            self.request_ids.extend(self.rng.sample([event["request_id"] for event in batch], 20))
+        ingested = time.perf_counter() - started
+        await asyncio.to_thread(self.server.SEARCH_INDEXER.wait)
+        print(f"📥 Ingested {self.events:,} events in {ingested:.1f}s "
+              f"(search indexed after {time.perf_counter() - started:.1f}s)")
+
+    async def run_scenario(self, name, make_request):
+        latencies = []
+        errors = 0
+        counter = 0
+
+        async def client():
+            nonlocal errors, counter
+            while time.perf_counter() < deadline:
+                path, params = make_request(self.rng, self.request_ids)
+                if not self.cached:
+                    counter += 1
+                    params = {**params, "nocache": counter}
+                started = time.perf_counter()
+                status, _ = await self.client.request("GET", path, params)
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors += 1
+
+        # Warm up (first search of a term, first rollup window, ...) before measuring
+        deadline = time.perf_counter() + min(1.0, self.duration / 5)
+        await asyncio.gather(*(client() for _ in range(self.concurrency)))
+        latencies.clear()
+        errors = 0
+
+        started = time.perf_counter()
+        deadline = started + self.duration
+        await asyncio.gather(*(client() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        }
+
+    def check_scenario(self, name, stats, baselines):
+        """Log one test result per scenario: errors, then regression against the baseline"""
+        summary = f"{stats['rps']:.0f} req/s, p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms, p99 {stats['p99_ms']}ms"
+        if stats["errors"]:
+            self.log_test(f"Load {name}", False, f"{stats['errors']} of {stats['requests']} requests failed")
+            return
+        baseline = (baselines or {}).get("scenarios", {}).get(name)
+        if baseline is None:
+            self.log_test(f"Load {name}", True, f"{summary} (no baseline)")
+            return
+        problems = []
+        if stats["p95_ms"] > baseline["p95_ms"] * (1 + LATENCY_TOLERANCE):
+            problems.append(f"p95 {stats['p95_ms']}ms vs baseline {baseline['p95_ms']}ms")
+        if stats["rps"] < baseline["rps"] * (1 - THROUGHPUT_TOLERANCE):
+            problems.append(f"{stats['rps']:.0f} req/s vs baseline {baseline['rps']:.0f}")
+        if problems:
+            self.log_test(f"Load {name}", False, "Regressed: " + "; ".join(problems))
+        else:
+            self.log_test(f"Load {name}", True, f"{summary} (baseline p95 {baseline['p95_ms']}ms)")
+
+    async def run_all_tests_async(self, scenarios, baselines):
+        print(f"🚀 Load testing {len(scenarios)} scenarios: {self.concurrency} concurrent clients, "
+              f"{self.duration:g}s each, response cache {'on' if self.cached else 'bypassed'}")
+        await self.load()
+        if baselines is not None:
+            mismatched = {key: (baselines["settings"].get(key), value) for key, value in self.settings().items()
+                          if key in BASELINE_SETTINGS and baselines["settings"].get(key) != value}
+            if mismatched:
+                self.log_test("Load Baseline Settings", False, f"Baseline recorded with other settings: {mismatched}")
+                baselines = None
+        print("=" * 60)
+        for name in scenarios:
+            stats = await self.run_scenario(name, SCENARIOS[name])
+            self.scenario_results[name] = stats
+            self.check_scenario(name, stats, baselines)
+        print("=" * 60)
+        print(f"📊 Load tests: {self.tests_passed}/{self.tests_run} passed")
+        return self.tests_passed == self.tests_run
+
+    def report(self):
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "settings": {**self.settings(), "duration_seconds": self.duration},
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "total_tests": self.tests_run,
+            "passed_tests": self.tests_passed,
+            "success_rate": (self.tests_passed / self.tests_run * 100) if self.tests_run > 0 else 0,
+            "results": self.test_results,
+            "scenarios": self.scenario_results,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=PRODUCTION_EVENTS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario")
+    parser.add_argument("--cached", action="store_true", help="Let the response cache serve repeated requests")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--update-baselines", action="store_true", help="Record this run as the baselines")
+    parser.add_argument("--no-baselines", action="store_true", help="Report only; do not compare")
+    args = parser.parse_args()
+
+    baselines = None
+    if not args.update_baselines and not args.no_baselines and os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+    tester = LoadTester(args.events, args.concurrency, args.duration, args.cached)
+    success = asyncio.run(tester.run_all_tests_async(args.scenario or list(SCENARIOS), baselines))
+    report = tester.report()
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.update_baselines:
+        with open(BASELINES_PATH, "w") as f:
+            json.dump({key: report[key] for key in ("timestamp", "settings", "machine", "scenarios")}, f, indent=2)
+        print(f"📝 Baselines written to {os.path.relpath(BASELINES_PATH, ROOT)}")
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())